@@ -90,7 +90,9 @@ class Environment(object):
         return os.access(path, os.X_OK)  
     
     def _is_valid_exe(self, exe):
-        return _is_executable(expand_filepath(exe))
+        if not exe:
+            return False
+        return self._is_executable(expand_filepath(exe))
     
     def check_environment(self, keys=ENVVARS):
         is_okay = True
@@ -109,4 +111,18 @@ class Environment(object):
     def validate_executables(self):
         return (self._is_valid_exe(self.leed_exe) and 
                 self._is_valid_exe(self.rfac_exe) and 
-                self._is_valid_exe(self.search_exe))
\ No newline at end of file
+                self._is_valid_exe(self.search_exe))
+    
+    def runner(self, workers=None, **kwargs):
+        '''
+        Returns a :class:`jobs.JobRunner` executing jobs in this environment.
+        
+        Parameters
+        ----------
+        workers : int, optional
+            Maximum number of concurrent jobs; defaults to the number of CPUs.
+        **kwargs :
+            Passed to :class:`jobs.JobRunner`.
+        '''
+        from jobs import JobRunner
+        return JobRunner(self, workers=workers, **kwargs)
\ No newline at end of file
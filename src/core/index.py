@@ -32,21 +32,128 @@
 from __future__ import print_function, unicode_literals
 from __future__ import absolute_import, division, with_statement
 
+from fractions import Fraction
+
+import numpy as np
+
+_PARSED_INDICES = {}
+_PARSED_INDICES_MAXSIZE = 4096
+
+
+def parse_index(string):
+    '''
+    Parses a Miller index string such as ``'(1, 0)'`` or ``'[1/2 1/2 1]'``.
+    
+    Parameters
+    ----------
+    string : str
+        Comma or whitespace separated components, optionally surrounded by
+        round or square brackets. Components may be written as fractions.
+    
+    Returns
+    -------
+    tuple :
+        The components as floats.
+    
+    Raises
+    ------
+    ValueError
+        If `string` is not a Miller index.
+    
+    Notes
+    -----
+    Results are memoised, so repeatedly looking up the same strings (e.g. 
+    from a GUI or a control file) costs a single dictionary access. The 
+    string is never passed to :func:`eval`.
+    '''
+    try:
+        return _PARSED_INDICES[string]
+    except KeyError:
+        pass
+    
+    text = string.strip()
+    if text[:1] + text[-1:] in ('()', '[]'):
+        text = text[1:-1]
+    tokens = text.replace(',', ' ').split()
+    if not 2 <= len(tokens) <= 3:
+        raise ValueError("'{}' is not a Miller index".format(string))
+    try:
+        index = tuple(float(Fraction(token)) for token in tokens)
+    except (ValueError, ZeroDivisionError):
+        raise ValueError("'{}' is not a Miller index".format(string))
+    
+    if len(_PARSED_INDICES) >= _PARSED_INDICES_MAXSIZE:
+        _PARSED_INDICES.clear()
+    _PARSED_INDICES[string] = index
+    return index
+
+
+def _round(value):
+    ''' Rounds an index component to the precision used when printing '''
+    return None if value is None else round(value, 3) + 0.
+
+
 class MillerIndex(object):
+    '''
+    Miller index of a beam or plane.
+    
+    Notes
+    -----
+    Instances store their components in slots and cache their hash, which 
+    is computed on first use from the components rounded to three 
+    decimals. Use 
+    :meth:`MillerIndex.intern` to share one instance between many 
+    references to the same index; such shared instances are read-only.
+    '''
+    __slots__ = ('_miller_h', '_miller_k', '_miller_l', '_miller_hash',
+                 '_miller_frozen')
+    
+    _interned = {}
+    _INTERNED_MAXSIZE = 65536
+    
     def __init__(self, h, k, l=None):
-        self.h = h
-        self.k = k
-        self.l = l
+        self._miller_h = float(h)
+        self._miller_k = float(k)
+        self._miller_l = float(l) if l is not None else None
+        self._miller_hash = None
+        self._miller_frozen = False
+    
+    def _reset_hash(self):
+        if self._miller_frozen:
+            raise AttributeError('shared MillerIndex instances returned by '
+                                 'MillerIndex.intern() are read-only')
+        self._miller_hash = None
+    
+    @classmethod
+    def intern(cls, h, k, l=None):
+        '''
+        Returns a shared instance for the index (h, k, l).
+        
+        Indices which agree to three decimals, e.g. ``(1/3, 1/3)`` and 
+        ``(0.333, 0.333)``, return the same object, which is therefore
+        read-only: setting `h`, `k` or `l` raises AttributeError.
+        '''
+        key = (cls, _round(float(h)), _round(float(k)), 
+               _round(float(l)) if l is not None else None)
+        try:
+            return MillerIndex._interned[key]
+        except KeyError:
+            if len(MillerIndex._interned) >= cls._INTERNED_MAXSIZE:
+                MillerIndex._interned.clear()
+            index = MillerIndex._interned[key] = cls(h, k, l)
+            index._miller_frozen = True
+            return index
     
     def __eq__(self, other):
-        return (self.h == other.h and 
-                self.k == other.k and
-                self.l == other.l)
+        if not isinstance(other, MillerIndex):
+            return NotImplemented
+        return (self._miller_h == other._miller_h and 
+                self._miller_k == other._miller_k and
+                self._miller_l == other._miller_l)
     
     def __ne__(self, other):
-        return not (self.h == other.h and 
-                    self.k == other.k and
-                    self.l == other.l)
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
     
     def __gt__(self, other):
         return self.order() > other.order()
@@ -78,7 +185,11 @@ class MillerIndex(object):
                                                                    l=self.l)
     
     def __hash__(self):
-        return hash(self.__repr__())
+        if self._miller_hash is None:
+            self._miller_hash = hash((_round(self._miller_h), 
+                                      _round(self._miller_k), 
+                                      _round(self._miller_l)))
+        return self._miller_hash
     
     @property
     def h(self):
@@ -94,14 +205,17 @@ class MillerIndex(object):
     
     @h.setter
     def h(self, h):
+        self._reset_hash()
         self._miller_h = float(h)
         
     @k.setter
     def k(self, k):
+        self._reset_hash()
         self._miller_k = float(k)
         
     @l.setter
     def l(self, l):
+        self._reset_hash()
         if l is not None:
             self._miller_l = float(l)
         else:
@@ -109,7 +223,9 @@ class MillerIndex(object):
             
     def index(self):
         ''' Returns the Miller indices as a tuple '''
-        return eval(self.__str__())
+        values = ((self.h, self.k) if self.l is None
+                  else (self.h, self.k, self.l))
+        return tuple(_round(value) for value in values)
     
     def order(self, round=False):
         ''' Returns the order of the diffraction spot '''
@@ -118,42 +234,132 @@ class MillerIndex(object):
 
 
 class MillerDirection(MillerIndex):
+    __slots__ = ()
+    
     def __str__(self):
-        MillerIndex.__str__().replace('(', '[').replace(')', ']')
+        return MillerIndex.__str__(self).replace('(', '[').replace(')', ']')
 
         
 class MillerPlane(MillerIndex):
+    __slots__ = ()
+    
     def __repr__(self):
-        pass
+        return MillerIndex.__repr__(self).replace('MillerIndex', 
+                                                  'MillerPlane', 1)
 
 
 class MillerIndexSet(object):
     '''
     Convenience class for handling MillerIndex lists 
+    
+    Notes
+    -----
+    The unique indices are held as an (n, 3) array of h, k and l (NaN where 
+    l is undefined) in the order first given. Orders, membership and 
+    equality are evaluated on the whole array at once, so large sets of 
+    fractional-order indices never need a MillerIndex per entry. Indices 
+    are compared to three decimals.
     '''
     def __init__(self, indices=[]):
         self.indices = indices
         
     def __str__(self):
-        return '+'.join([str(index) for index in set(self.indices) 
-                         if isinstance(index, MillerIndex)])
-
+        return '+'.join([str(index) for index in self])
+    
+    def __len__(self):
+        return len(self._array)
+    
+    def __iter__(self):
+        for h, k, l in self._array.tolist():
+            yield MillerIndex.intern(h, k, l if l == l else None)
+    
+    def __contains__(self, index):
+        try:
+            return bool(MillerIndexSet([index]).isin(self)[0])
+        except (TypeError, ValueError, IndexError):
+            return False
+    
+    def __eq__(self, other):
+        if not isinstance(other, MillerIndexSet):
+            return NotImplemented
+        return len(self) == len(other) and bool(np.all(self.isin(other)))
+    
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+    
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self._keys.tolist()))
+        return self._hash
+    
+    @staticmethod
+    def _as_keys(array):
+        ''' Returns one comparable record per (rounded) row of `array` '''
+        keys = np.round(array, 3) + 0.
+        keys[np.isnan(keys)] = np.inf
+        return np.ascontiguousarray(keys).view([('h', float), ('k', float), 
+                                                ('l', float)]).ravel()
+    
+    @property
+    def array(self):
+        ''' Returns the read-only (n, 3) array of h, k and l values '''
+        return self._array
+    
     @property
     def indices(self):
-        return set(self._indices)
+        return set(self)
     
     @indices.setter
     def indices(self, indices):
-        values = []
-        for ind in indices:
-            if isinstance(ind, str):
-                index = eval(ind)
-            elif isinstance(ind, MillerIndex):
-                pass
-            else:
-                index = MillerIndex(*ind)
-            values.append(index)
-        self._indices = values
+        if isinstance(indices, MillerIndexSet):
+            array = indices.array
+        elif isinstance(indices, np.ndarray):
+            array = np.array(indices, dtype=float, ndmin=2)
+        else:
+            rows = []
+            for ind in indices:
+                if isinstance(ind, str) or isinstance(ind, unicode):
+                    ind = parse_index(ind)
+                elif isinstance(ind, MillerIndex):
+                    ind = (ind.h, ind.k, ind.l)
+                ind = tuple(ind)
+                rows.append((ind[0], ind[1], 
+                             ind[2] if len(ind) > 2 and ind[2] is not None 
+                             else np.nan))
+            array = np.array(rows, dtype=float).reshape(-1, 3)
+        
+        if not array.size:
+            array = np.empty((0, 3), dtype=float)
+        elif array.ndim == 2 and array.shape[1] == 2:
+            array = np.column_stack((array, np.full(len(array), np.nan)))
+        elif array.ndim != 2 or array.shape[1] != 3:
+            raise ValueError('indices must have a shape of (n, 2) or (n, 3)')
+        
+        keys = self._as_keys(array)
+        first = np.sort(np.unique(keys, return_index=True)[1])
+        self._array = array[first]
+        self._array.flags.writeable = False
+        self._keys = keys[first]
+        self._hash = None
+    
+    def order(self, round=False):
+        ''' Returns an array with the order of each diffraction spot '''
+        order = np.abs(self._array[:, 0]) + np.abs(self._array[:, 1])
+        return order.astype(int) if round else order
+    
+    def isin(self, indices):
+        ''' Returns a boolean array marking which indices are in `indices` '''
+        if not isinstance(indices, MillerIndexSet):
+            indices = MillerIndexSet(indices)
+        return np.isin(self._keys, indices._keys)
+    
+    def subset(self, mask):
+        ''' 
+        Returns a new MillerIndexSet of the indices selected by `mask`, 
+        e.g. ``indices.subset(indices.order() <= 2)``.
+        '''
+        return MillerIndexSet(self._array[mask])
 
 if __name__ == '__main__':
     miller = MillerIndex(0., 0.5)
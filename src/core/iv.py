@@ -34,23 +34,43 @@ from __future__ import absolute_import, division, with_statement
 
 import os.path
 import sys
-from copy import deepcopy
-from index import MillerIndex, MillerIndexSet
+from copy import copy, deepcopy
+from index import MillerIndex, MillerIndexSet, parse_index
+from smoothing import lorentz, fft_lowpass, buckets
+from smoothing import METHODS as SMOOTHING_METHODS
+import rfactor as rf
+from theory import load_theory, beam_key
+from ivcache import IVCache
 from collections import OrderedDict, MutableMapping
 
+import numpy as np
+
 class IVCurve(object):
-    EXPERIMENTAL_IV, THEORETICAL_IV, UNKNOWN_IV = ('expt', 'theory', None)
+    '''
+    Container for a single LEED IV curve.
+
+    Notes
+    -----
+    The energies and intensities are held together as one contiguous
+    float64 array of shape (2, N) so that :attr:`x` and :attr:`y` are cheap
+    views and all queries on the curve can be vectorized.
     
-    def __init__(self, path=None, data=[], **kwargs):
-        # crudely mangle load_data function to instance method  
-        self._data = []
-        
+    Every change of the data increments :attr:`version`, which keys the 
+    caches derived from the curve. Code writing to :attr:`x` or :attr:`y` 
+    directly must call :meth:`modified` afterwards.
+    '''
+    EXPERIMENTAL_IV, THEORETICAL_IV, UNKNOWN_IV = ('expt', 'theory', None)
+
+    def __init__(self, path=None, data=None, **kwargs):
+        self._data = np.empty((2, 0), dtype=float)
+        self._version = 0
+
         self.type = kwargs.pop('type', self.UNKNOWN_IV)
         self.path = path
 
-        if path and (data == [] or data == None or len(data)):
+        if path and (data is None or not len(data)):
             try:
-                self.data = self._load_data()
+                self._load_data()
             except:
                 self.data = data
         else:
@@ -71,37 +91,62 @@ class IVCurve(object):
     
     def __len__(self):
         ''' Returns the number of energy values for the IVCurve '''
-        return len(self.x)
-    
+        return self._data.shape[1]
+
     def __eq__(self, other):
-        return self.data == other.data
-    
+        return np.array_equal(self.data, other.data)
+
     def __ne__(self, other):
-        return self.data != other.data
-    
+        return not np.array_equal(self.data, other.data)
+
     def __getitem__(self, i):
         if isinstance(i, int):
             return self._data[i]
         elif isinstance(i, float):
             # try to get intensity for given energy value
-            try:
-                return self.y[self.x.index(i)]
-            except AttributeError:
-                try:
-                    from numpy import where
-                    return self.y[where(self.x == i)[0][0]]
-                except:
-                    return None
-            except ValueError:
-                return None
+            i = self.energy_index(i)
+            return self.y[i] if i is not None else None
     
-    def __delitem__(self, i):
-        del self._data[i]
-        
     def __setitem__(self, i, val):
         self._data[i] = val
+        self.modified()
         return self._data[i]
     
+    def delete_point(self, i):
+        '''
+        Removes data points from the curve.
+        
+        Integer items of the curve are the rows of :attr:`data` (i.e. 
+        ``curve[0]`` are the energies), so points are removed with this 
+        method rather than ``del``.
+        
+        Parameters
+        ----------
+        i : int, float or array_like of int
+            Position(s) of the points, or the energy of a single point.
+        
+        Raises
+        ------
+        KeyError
+            If `i` is an energy not found in the curve.
+        '''
+        if isinstance(i, float):
+            index = self.energy_index(i)
+            if index is None:
+                raise KeyError(i)
+            i = index
+        self._data = np.delete(self._data, i, axis=1)
+        self.modified()
+    
+    @property
+    def version(self):
+        ''' Counter incremented by every change of the data '''
+        return self._version
+    
+    def modified(self):
+        ''' Marks the data as changed, e.g. after writing to :attr:`y` '''
+        self._version += 1
+    
     @property
     def type(self):
         return self._iv_type
@@ -138,51 +183,40 @@ class IVCurve(object):
     
     @data.setter
     def data(self, data):
-        if data == [] or data == None or not len(data):
+        if data is None or not len(data):
             return  # shortcut data assignment if no data
-        
+
         if isinstance(data, dict):
-            self.data = (data['x'], data['y'])
-        else:
-            try:
-                self._data = data[0:2]
-            except:
-                import sys
-                sys.stderr.write("Could not allocate data '{}' to {}\n"
-                                 "".format(repr(data), repr(self)))
-    
+            data = (data['x'], data['y'])
+        try:
+            data = np.array(data[0:2], dtype=float, order='C')
+            if data.ndim != 2 or data.shape[0] != 2:
+                raise ValueError('data must have a (2, N) shape')
+            self._data = data
+            self.modified()
+        except (TypeError, ValueError, IndexError):
+            sys.stderr.write("Could not allocate data '{}' to {}\n"
+                             "".format(repr(data), repr(self)))
+
     @property
     def x(self):
-        return self.data[0]
-    
+        return self._data[0]
+
     @property
     def y(self):
-        return self.data[1]
-    
+        return self._data[1]
+
     @classmethod
     def load_data(cls, path=None):
+        ''' Returns a (2, N) array of energies and intensities from `path` '''
         if not path:
-            return []
+            return np.empty((2, 0), dtype=float)
 
         try:
-            import numpy as np
-            
-            data = np.genfromtxt(path, dtype=float, comments='#', delimiter=' ')
-            data = data.transpose()
-            
-        except (ImportError, ValueError):
-            with open(path, 'r') as f:
-                lines = [line.lstrip().rstrip('#').rstrip() for line in f
-                         if not line.lstrip().startswith('#')]
-                x = [0] * len(lines)
-                y = [0] * len(lines)
-                for i, line in enumerate(lines):
-                    x[i], y[i], = [t(s) for (t, s) in zip((float, float), 
-                                                          line.split())] 
-            data = (x, y)
+            data = np.loadtxt(path, dtype=float, comments='#', usecols=(0, 1))
         except IOError:
-            raise IOError("Unable to open IV file: '%s'" % filename) 
-        return data
+            raise IOError("Unable to open IV file: '%s'" % path)
+        return np.ascontiguousarray(np.atleast_2d(data).T)
     
     def _load_data(self, path=None):
         '''load iv data from file'''
@@ -193,138 +227,201 @@ class IVCurve(object):
     
     def smooth(self, method=None, *args, **kwargs):
         '''Returns a smoothed version of the IV curve'''
-        smoothed_iv = deepcopy(self)
-        x, y = smoothed_iv.data
+        smoothed_iv = copy(self)
+        smoothed_iv._data = self._data.copy()
+
+        method = (method or 'fft').lower()
+        if method == 'lorentz':
+            smoothed_iv._lorentz_smooth(*args, **kwargs)
+        else:
+            smoother = SMOOTHING_METHODS.get(method, fft_lowpass)
+            smoothed_iv._data[1] = smoother(self.y, *args, **kwargs)
+            smoothed_iv.modified()
+            smoothed_iv.smoothed = True
 
-        method = method or 'fft'      
-        try:
-            if method.lower() == 'savitzky-golay':
-                from scipy.signal import savgol_filter
-                y_smoothed = savgol_filter(y, *args, **kwargs)
-            elif method.lower() == 'lorentz':
-                self._lorentz_smooth(*args, **kwargs)
-            else:
-                import numpy as np
-            
-                rft = np.fft.rfft(y)
-                fft_cutoff = 4
-                fft_tailoff = 0
-                rft[fft_cutoff:len(rft) - fft_tailoff] = 0  # frequencies above cutoff are not included
-                y_smooth = np.fft.irfft(rft)
-            
-                smoothed_iv.data = (x, y_smooth)
-                smoothed.smoothed = True
-                
-        except ImportError:
-            raise NotImplementedError
-        
         return smoothed_iv
-    
-    def _lorentz_smooth(self, vi=4.0):
-        import numpy as np
-        from math import min, max, sqrt
-        
-        intbuf = np.copy(self.y)
-        prefac = [e_step * vi / ((e_step * i)**2 + vi**2) 
-                  for i in range(len(self.y))]
 
-        # First check if vi is nonzero
-        if vi < 0.001:
-            raise ValueError('vi is too small')
+    def _lorentz_smooth(self, vi=4.0, fft=None, inplace=True):
+        '''
+        Smooths the curve by convolution with a Lorentzian of width `vi`.
+
+        Parameters
+        ----------
+        vi : float
+            Imaginary part of the optical potential (eV).
+        fft : bool, optional
+            Force or forbid the FFT convolution (see
+            :func:`smoothing.lorentz`).
+        inplace : bool
+            If True the intensities of this curve are overwritten, otherwise
+            only the smoothed intensities are returned.
 
+        Returns
+        -------
+        ndarray :
+            The smoothed intensities.
+        '''
         # Sort IV curve if not yet done
         if not self.sorted:
             self.sort()
 
-        # smooth IV curve 
-        if self.equidistant:
-  
-            e_step = self.x[1] - self.x[0]
+        if len(self) < 2 or not self.equidistant:
+            raise ValueError('Lorentzian smoothing requires equidistant '
+                             'energies')
 
-            if e_step == 0.:
-              raise ValueError("energy step is too small")
-            
-        
-            # Find energy range for integral 
-            n_range = vi * sqrt((1. / 0.001) - 1.) / e_step
-        
-            # scan over all energies 
-            for i in range(len(self.y)):
-                # store original intensities and calculate 
-                # first element of integral sum
-                self._data[1][i] *= prefac[0]
-                norm_sum = prefac[0]
-        
-                # upper branch: 
-                i_hi = min(i+n_range, len(self.x))
-                for i_sum in range(i+1 , i_hi):
-                    self._data[1][i] += self.y[i_sum] * prefac[i_sum-i]
-                    norm_sum += prefac[i_sum-i]
-        
-                # lower branch: 
-                i_lo = max(i - n_range + 1, 0)
-                for i_sum in range(i_lo, i):
-                    self._data[1][i] += intbuf[i_sum] * prefac[i-i_sum]
-                    norm_sum += prefac[i-i_sum] 
-        
-                # normalize intensity 
-                self._data[1][i] /= norm_sum 
-        
-            # set smooth flag 
+        e_step = self.x[1] - self.x[0]
+        y = lorentz(self.y, e_step, vi, fft=fft, 
+                    out=self.y if inplace else None)
+        if inplace:
+            self.modified()
             self.smoothed = True
-    
+        return y
+
     def sort(self):
         ''' Sorts an IV curve according to ascending x '''
-        try:
-            import numpy as np
-            T = np.array(data).transpose()
-            ordered = T[np.lexsort((T[:, 0], ))]
-            self.data = ordered.transpose()
-        except:
-            f = lambda x,y: (x, y)
-            xy = [f(self.x[i], self.y[i]) for i in range(len(self.data[0]))]
-            ordered = sorted(b, key=lambda x:x[0])
-            self.data = ([x[0] for x in ordered], [y[1] for y in ordered])
-    
+        if not self.sorted:
+            self._data = self._data[:, np.argsort(self.x, kind='mergesort')]
+            self.modified()
+
     @property
     def equidistant(self):
-        diff = lambda x,y: y - x
-        x = self.x
-        try:
-            from numpy import isclose
-        except ImportError:
-            from is_close import isclose
-            
-        return all(isclose(diff(x[i], x[i+1]), 
-                           diff(x[i+1], x[i+2])) 
-                   for i in range(len(x)-2))
-    
+        ''' Returns True if the energies are evenly spaced '''
+        dx = np.diff(self.x)
+        return len(dx) < 2 or bool(np.allclose(dx, dx[0]))
+
     @property
     def sorted(self):
-         f = lambda x,y: x <= y
-         x = self.x
-         return all(f(x[i], x[i+1]) for i in range(len(x)-1))
-    
+        ''' Returns True if the energies are in ascending order '''
+        return bool(np.all(self.x[1:] >= self.x[:-1]))
+
     @property
     def smoothed(self):
         return self._smoothed
-    
+
     @smoothed.setter
     def smoothed(self, smoothed):
         self._smoothed = bool(smoothed)
-    
+
     @property
     def max_intensity(self):
-        try:
-            from numpy import max
-            return max(self.y)
-        except ImportError:
-            from math import max
-            maximum = 0.
-            for i in self.y:
-                maximum = max(maximum, i)
-            return maximum
+        return self.y.max() if len(self) else 0.
+
+    def energy_index(self, energy, atol=1e-6):
+        '''
+        Returns the position of `energy` in the curve or None if absent.
+
+        Parameters
+        ----------
+        energy : float
+            Energy to look up.
+        atol : float
+            Absolute tolerance used when matching energies.
+        '''
+        x = self.x
+        if self.sorted:
+            i = np.searchsorted(x, energy - atol)
+            if i < len(x) and abs(x[i] - energy) <= atol:
+                return int(i)
+            return None
+        matches = np.flatnonzero(np.abs(x - energy) <= atol)
+        return int(matches[0]) if len(matches) else None
+
+    def peaks(self, threshold=0.):
+        '''
+        Returns the (energy, intensity) of each local maximum in the curve.
+
+        Parameters
+        ----------
+        threshold : float
+            Fraction of :attr:`max_intensity` which a peak must exceed.
+
+        Returns
+        -------
+        ndarray :
+            Array of shape (2, n_peaks).
+        '''
+        y = self.y
+        if len(y) < 3:
+            return np.empty((2, 0), dtype=float)
+        mask = (y[1:-1] > y[:-2]) & (y[1:-1] >= y[2:])
+        mask &= y[1:-1] > threshold * self.max_intensity
+        return self._data[:, 1:-1][:, mask]
+
+    @property
+    def peak_energy(self):
+        ''' Returns the energy of the most intense point in the curve '''
+        return self.x[np.argmax(self.y)] if len(self) else None
+
+
+def _load_curve(path):
+    '''returns (data, error) so that one bad file does not stop a bulk load'''
+    try:
+        return (IVCurve.load_data(os.path.expandvars(os.path.expanduser(path))),
+                None)
+    except Exception as err:
+        return (None, err)
+
+
+def load_curves(paths, workers=None, processes=False, progress=None):
+    '''
+    Reads many IV files concurrently.
     
+    Parameters
+    ----------
+    paths : list of str
+        IV files to read.
+    workers : int, optional
+        Number of concurrent readers. Defaults to four per CPU (reading many
+        small files is latency bound), capped at the number of files; with 
+        one worker the files are read serially in the calling thread.
+    processes : bool
+        Use a process pool rather than a thread pool, e.g. when parsing 
+        rather than waiting for storage dominates.
+    progress : callable, optional
+        Called as ``progress(n_done, n_total, path)`` after each file, in the
+        order of `paths`. An exception raised by it cancels the load.
+    
+    Returns
+    -------
+    tuple :
+        ``(data, errors)`` where `data` lists the (2, N) array of each file 
+        in the order of `paths` (None if it could not be read) and `errors`
+        is an OrderedDict mapping each failed path to its exception.
+    '''
+    from multiprocessing import cpu_count, Pool
+    from multiprocessing.pool import ThreadPool
+    
+    paths = list(paths)
+    total = len(paths)
+    if workers is None:
+        workers = min(total, 4 * cpu_count())
+    
+    pool = None
+    if workers > 1 and total > 1:
+        pool = (Pool if processes else ThreadPool)(workers)
+        results = pool.imap(_load_curve, paths)
+    else:
+        results = (_load_curve(path) for path in paths)
+    
+    data = []
+    errors = OrderedDict()
+    try:
+        for i, (curve, error) in enumerate(results):
+            data.append(curve)
+            if error is not None:
+                errors[paths[i]] = error
+            if progress is not None:
+                progress(i + 1, total, paths[i])
+    except:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return (data, errors)
+
 
 class IVCurvePair(object):
     def __init__(self, 
@@ -336,6 +433,7 @@ class IVCurvePair(object):
                  used=True):
         self.experiment = experiment if isinstance(experiment, IVCurve) else IVCurve()
         self.theory = theory
+        self.rfactor = None
         self.id = id
         self.weight = weight
         self.used = used
@@ -358,15 +456,18 @@ class IVCurvePair(object):
                                                     repr(self.used)))
     
     def to_control_string(self):
-        return ('{}ef:{ef}:ti={ti}:id={id}:wt={wt}'
-                ''.format('#' if self.used else '',
+        return ('{}ef={ef}:ti={ti}:id={id}:wt={wt}'
+                ''.format('' if self.used else '#',
                           ef=self.experiment.path, 
                           ti=self.index,
                           id=self.id,
                           wt=self.weight))
     
     @classmethod
-    def from_control_string(cls, ctr_line, ctr_file=None):
+    def from_control_string(cls, ctr_line, ctr_file=None, load=True):
+        ''' Returns an IVCurvePair parsed from a control file line or None.
+        If `load` is False the experimental data is not read from disk 
+        and only the path of the experimental IV curve is set. '''
         from leed import BeamSet
         ctr_file = os.path.expanduser(os.path.expandvars(ctr_file or ''))
         expand_path  = (lambda x: 
@@ -374,8 +475,16 @@ class IVCurvePair(object):
                                                 os.path.expandvars(str(x))))
                         else os.path.join(os.path.dirname(ctr_file),
                                           os.path.basename(str(x))))) 
-        funcs = {'ef': (lambda x: IVCurve(path=expand_path(x), 
-                                          type=IVCurve.EXPERIMENTAL_IV)), 
+        
+        def experiment(x):
+            if load:
+                return IVCurve(path=expand_path(x), 
+                               type=IVCurve.EXPERIMENTAL_IV)
+            curve = IVCurve(type=IVCurve.EXPERIMENTAL_IV)
+            curve.path = expand_path(x)
+            return curve
+        
+        funcs = {'ef': experiment, 
                  'ti': (lambda x: BeamSet(x)), 
                  'id': (lambda x: int(x)), 
                  'wt': (lambda x: float(x))}
@@ -393,8 +502,8 @@ class IVCurvePair(object):
 
         
 
-        used = ctr_line.startswith("#")
-        args = ctr_line[used:].split(':')
+        commented = ctr_line.startswith("#")
+        args = ctr_line[commented:].split(':')
         kwargs = {}
         for arg in args:
             var, value = arg.split('=')[:2]
@@ -402,7 +511,7 @@ class IVCurvePair(object):
             value = value.lstrip()
             kwargs[mapper[var]] = funcs[var](value)
 
-        return IVCurvePair(**kwargs) 
+        return IVCurvePair(used=not commented, **kwargs) 
         
     @property
     def index(self):
@@ -460,7 +569,7 @@ class IVCurvePair(object):
     
     @property
     def uniform(self):
-        if not self.experiment.data or not self.theory.data:
+        if not len(self.experiment) or not len(self.theory):
             return False
         #if not self.experiment.equidistant or self.theory.equidistant:
         #    return False  # shortcircuit further checks
@@ -470,10 +579,7 @@ class IVCurvePair(object):
         if len(expt[0]) != len(theory[0]): 
             return False  # short-circuit further checks
         
-        dx = lambda x, y: y - x
-        uniform = lambda x, y: all(dx(x[i], x[i+1]) == dx(y[i], y[i+1])
-                                   for i in range(len(x)-1))
-        return uniform(theory[0], expt[0])
+        return bool(np.array_equal(np.diff(theory[0]), np.diff(expt[0])))
     
     @property
     def rfactor(self):
@@ -481,28 +587,61 @@ class IVCurvePair(object):
     
     @rfactor.setter
     def rfactor(self, value):
-        if value >= 0. and value <= 1.:
+        if value is None:
+            self._rfactor = None
+        elif value >= 0.:
             self._rfactor = float(value)
         else:
-            raise ValueError('RFactor must have a value between 0 and 1') 
+            raise ValueError('RFactor must not be negative') 
     
     @property
     def energy_overlap(self):
         '''Returns a (start energy, final energy) tuple representing the
         energy overlap between the IV curves '''
-        overlap = list(set(self.experiment.x) & set(self.theory.x))
-        overlap.sort()
-        return (overlap[0], overlap[len(overlap)-1])
+        return (max(self.experiment.x.min(), self.theory.x.min()),
+                min(self.experiment.x.max(), self.theory.x.max()))
     
     def data_overlap(self):
         '''Returns a dictionary containing the overlapping theory 
         and experiment data'''
-        e0, ef = self.energy_overlap()
-        expt_data = [iv for iv in self.experiment.data 
-                     if iv[0] <= ef and iv[0] >= e0]
-        theory_data = [iv for iv in self.theory.data 
-                       if iv[0] <= ef and iv[0] >= e0]
-        return {'theory': theory_data, 'experiment': expt_data}
+        e0, ef = self.energy_overlap
+        overlap = {}
+        for key in ('theory', 'experiment'):
+            data = getattr(self, key).data
+            overlap[key] = data[:, (data[0] >= e0) & (data[0] <= ef)]
+        return overlap
+    
+    def theory_spline(self, s=0):
+        '''
+        Returns the B-spline representation of the theoretical IV curve.
+        
+        Parameters
+        ----------
+        s : float
+            Smoothing condition passed to :func:`scipy.interpolate.splrep`.
+        
+        Returns
+        -------
+        tuple :
+            The (t, c, k) spline tuple.
+        
+        Notes
+        -----
+        The spline is cached and only rebuilt when the theory curve, its 
+        :attr:`IVCurve.version` or `s` change, so that repeated 
+        interpolation (e.g. when scanning the inner potential) does not 
+        refit it.
+        '''
+        from scipy import interpolate
+        
+        self.theory.sort()
+        data = self.theory.data
+        key = (self.theory.version, s)
+        cache = getattr(self, '_spline_cache', None)
+        if cache is None or cache[0] is not data or cache[1] != key:
+            tck = interpolate.splrep(data[0], data[1], s=s)
+            cache = self._spline_cache = (data, key, tck)
+        return cache[2]
     
     def interpolate_overlap(self, s=0, der=0):
         ''' Returns an IVCurvePair where only the overlapped and 
@@ -523,17 +662,40 @@ class IVCurvePair(object):
         '''
         from scipy import interpolate
         
-        overlap = deepcopy(self)
-        data_overlap = self.data_overlap()
-        theory, expt = (data_overlap['theory'], data_overlap['experiment']) 
-        tck = interpolate.splrep(theory[0], theory[1], s)
-        theory[1] = interpolate.splev(expt[0], tck, der)
-        
-        overlap.experiment.data = expt
-        overlap.theory.data = theory
+        expt = self.data_overlap()['experiment']
+        theory = (expt[0], interpolate.splev(expt[0], 
+                                             self.theory_spline(s), der))
         
+        overlap = copy(self)
+        overlap.experiment = IVCurve(path=self.experiment.path, data=expt,
+                                     type=IVCurve.EXPERIMENTAL_IV)
+        overlap.theory = IVCurve(path=self.theory.path, data=theory,
+                                 type=IVCurve.THEORETICAL_IV)
         return overlap
     
+    def calculate_rfactor(self, method='rp', **kwargs):
+        '''
+        Calculates the R-factor between the experimental and theoretical
+        IV curves over their common energy range.
+        
+        Parameters
+        ----------
+        method : str
+            One of 'rp' (Pendry), 'r1', 'r2' or 'rb' (Zanazzi-Jona).
+        **kwargs :
+            Passed to the R-factor function, e.g. `vi`.
+            
+        Returns
+        -------
+        float :
+            The R-factor, which is also stored in :attr:`rfactor`.
+        '''
+        overlap = self.interpolate_overlap()
+        self.rfactor = rf.compare(overlap.experiment.x, 
+                                  overlap.experiment.y, 
+                                  overlap.theory.y, method, **kwargs)
+        return self.rfactor
+    
 
 class IVCurveGroup(MutableMapping):
     def __init__(self, 
@@ -545,7 +707,9 @@ class IVCurveGroup(MutableMapping):
         self.theta = theta
         self.phi = phi
         self._datasets = OrderedDict()
+        self._index = {}
         self.datasets = datasets
+        self.load_errors = OrderedDict()
         self.id = group_id
         self.name = group_name
     
@@ -578,53 +742,75 @@ class IVCurveGroup(MutableMapping):
     def __ge__(self, other):
         return len(self.id) >= len(other.id)
 
-    def __contains__(self, key):
-        if isinstance(key, str) or isinstance(key, unicode):
+    def _index_keys(self, key):
+        ''' Yields the lookup keys under which the dataset `key` is found '''
+        yield str(key)
+        members = getattr(key, 'indices', key)
+        if isinstance(key, tuple) or hasattr(key, 'h'):
+            members = [key]
+        try:
+            members = iter(members)
+        except TypeError:
+            return
+        for member in members:
             try:
-                # search each keys' beams for matching index 
-                keys = [index for index in self._datasets.keys()]
-                key_str = str(key)
-                found = False 
-                for index in keys:
-                    if key_str in str(index):
-                        key = index
-                        found = True
-                        break
-                if not found:
-                    raise KeyError()
-            except:
-                key = eval(key)  # probably just a simple tuple
-        elif hasattr(key, 'index'):
-            if callable(key.index):
-                key = key.index()
-            else:
-                key = key.index
-        return self._datasets.__contains__(key)
+                yield beam_key(member)
+            except (TypeError, ValueError):
+                pass
+    
+    def _resolve(self, key, position=True):
+        '''
+        Returns the dataset key referred to by `key`.
+        
+        Besides the dataset keys themselves, any Miller index of a beam 
+        within a key (as a tuple, string or object with `h` and `k`) or the 
+        string of a key are resolved through a secondary index, so lookups 
+        take constant time. An integer `key` refers to the dataset position 
+        if `position` is True.
+        '''
+        if isinstance(key, int) and position:
+            return list(self._datasets.keys())[key]
+        try:
+            if key in self._datasets:
+                return key
+            if isinstance(key, str) or isinstance(key, unicode):
+                if key in self._index:
+                    return self._index[key]
+                key = parse_index(key)
+            return self._index[beam_key(key)]
+        except (TypeError, ValueError):
+            raise KeyError(key)
+    
+    def reindex(self):
+        '''
+        Rebuilds the lookup index of the group, which is needed only if the 
+        beam sets used as keys have been modified in place.
+        '''
+        self._index = {}
+        for key in self._datasets:
+            for index_key in self._index_keys(key):
+                self._index.setdefault(index_key, key)
+    
+    def __contains__(self, key):
+        try:
+            self._resolve(key, position=False)
+            return True
+        except KeyError:
+            return False
     
     def __len__(self):
         return len(self._datasets)
     
     def __delitem__(self, key):
-        if isinstance(key, str) or isinstance(key, unicode):
-            key = eval(key)
-        elif isinstance(key, int):
-            key = self._datasets.keys()[key]
-        elif hasattr(key, 'index'):
-            try:
-                if callable(key.index):
-                    key = key.index()
-                else:
-                    key = key.index
-            except TypeError:
-                pass
-        del self._datasets[key]
+        del self._datasets[self._resolve(key)]
+        self.reindex()
         
     def __iter__(self):
         return iter(self._datasets)
     
     def __setitem__(self, key, value):
         if isinstance(key, str) or isinstance(key, unicode):
-            key = eval(key)
+            key = parse_index(key)
         elif hasattr(key, 'index'):
             try:
                 if callable(key.index):
@@ -634,47 +820,121 @@ class IVCurveGroup(MutableMapping):
             except TypeError:
                 pass
         self._datasets[key] = value
+        for index_key in self._index_keys(key):
+            self._index.setdefault(index_key, key)
     
     def __getitem__(self, key):
-        if isinstance(key, str) or isinstance(key, unicode):
-            try:
-                # search each keys' beams for matching index 
-                keys = self._datasets.keys()
-                key_str = str(key)
-                found = False 
-                for index in keys:
-                    if key_str in str(index):
-                        key = index
-                        found = True
-                        break
-                if not found:
-                    raise KeyError
-            except:
-                key = eval(key)  # probably just a simple tuple
-        elif isinstance(key, int):
-            key = self._datasets.keys()[key]
-        elif isinstance(key, tuple):
-            for beam_set in self._datasets.keys():
-                if key in beam_set:
-                    key = beam_set
-        elif hasattr(key, 'index'):
-            try:
-                if callable(key.index):
-                    key = key.index()
-                else:
-                    key = key.index
-            except TypeError:
-                pass 
-        return self._datasets.__getitem__(key)
+        return self._datasets[self._resolve(key)]
     
     def __hash__(self):
         return self._datasets.__hash__()
     
     def clear(self):
         self._datasets.clear()
+        self._index = {}
 
     def keys(self):
-        self._datasets.keys()
+        return self._datasets.keys()
+
+    def _pairs(self):
+        ''' Returns the unique IVCurvePairs of the group in insertion order '''
+        seen = set()
+        pairs = []
+        for pair in self._datasets.values():
+            if id(pair) not in seen:
+                seen.add(id(pair))
+                pairs.append(pair)
+        return pairs
+
+    def smooth(self, method=None, which='experiment', inplace=False, 
+               **kwargs):
+        '''
+        Smooths the IV curves of all datasets in the group.
+
+        Parameters
+        ----------
+        method : str, optional
+            One of 'fft' (default), 'savitzky-golay' or 'lorentz'.
+        which : str
+            Which curve of each :class:`IVCurvePair` to smooth, i.e. 
+            'experiment' or 'theory'.
+        inplace : bool
+            If True the curves of this group are overwritten, otherwise a new
+            group sharing the unsmoothed data is returned.
+        **kwargs :
+            Passed on to the smoothing function in :mod:`smoothing`, e.g. 
+            `vi` for 'lorentz' or `window_length` for 'savitzky-golay'.
+
+        Returns
+        -------
+        IVCurveGroup :
+            The smoothed group (`self` if `inplace` is True).
+
+        Raises
+        ------
+        ValueError
+            If `method` is unknown, or Lorentzian smoothing is applied to 
+            curves with unevenly spaced energies.
+
+        Notes
+        -----
+        Curves are stacked into 2-D arrays and each stack is smoothed with a
+        single vectorized call. Equal length curves share a stack; for 
+        Lorentzian smoothing curves with the same energy step are zero padded
+        into one stack, which does not alter the result as padded points are
+        masked out of the normalisation.
+        '''
+        method = (method or 'fft').lower()
+        if method not in SMOOTHING_METHODS:
+            raise ValueError("method must be one of {} - got '{}'"
+                             "".format(', '.join(sorted(SMOOTHING_METHODS)), 
+                                       method))
+        pairs = [pair for pair in self._pairs() 
+                 if getattr(pair, which) is not None and 
+                    len(getattr(pair, which))]
+        curves = [getattr(pair, which) for pair in pairs]
+        if not inplace:
+            curves = [copy(curve) for curve in curves]
+
+        lorentzian = method == 'lorentz'
+        if lorentzian:
+            for curve in curves:
+                curve.sort()
+
+        for members, e_step, y, mask in buckets(curves, pad=lorentzian):
+            if lorentzian:
+                if not e_step or not all(curves[i].equidistant 
+                                         for i in members):
+                    raise ValueError('Lorentzian smoothing requires '
+                                     'equidistant energies')
+                y = lorentz(y, e_step, mask=mask, out=y, **kwargs)
+            else:
+                y = SMOOTHING_METHODS[method](y, **kwargs)
+
+            for row, i in enumerate(members):
+                curve = curves[i]
+                if inplace:
+                    curve.y[:] = y[row, :len(curve)]
+                    curve.modified()
+                else:
+                    curve._data = np.vstack((curve.x, y[row, :len(curve)]))
+                    curve.modified()
+                curve.smoothed = True
+
+        if inplace:
+            return self
+
+        smoothed_pairs = {}
+        for pair, curve in zip(pairs, curves):
+            smoothed_pairs[id(pair)] = copy(pair)
+            setattr(smoothed_pairs[id(pair)], which, curve)
+
+        group = copy(self)
+        group._datasets = OrderedDict((key, smoothed_pairs.get(id(pair), pair))
+                                      for key, pair 
+                                      in self._datasets.items())
+        group._index = dict(self._index)
+        return group
 
     @property
     def name(self):
@@ -711,28 +971,55 @@ class IVCurveGroup(MutableMapping):
     @datasets.setter
     def datasets(self, iv_pairs):
         self.clear()
-        for iv_pair in iv_pairs:
-            if isinstance(iv_pair, IVCurvePair):
-                self.__set_item(str(iv_pair.index), iv_pair)
-                if (isinstance(iv_pair.index, set) or 
-                    isinstance(iv_pair.index, BeamSet)):
-                    for index in iv_pair.index: 
-                        self.__setitem__(index, iv_pair)        
-            elif isinstance(iv_pair,_tuple):
-                self.__setitem__(iv_pair, iv_pairs[iv_pair])
+        if hasattr(iv_pairs, 'items'):
+            for key, iv_pair in iv_pairs.items():
+                self[key] = iv_pair
+        else:
+            for iv_pair in iv_pairs:
+                self[iv_pair.index] = iv_pair
     @name.setter
     def name(self, name):
         self._group_name = name or "group_{}".format(self._group_id)
         
     @classmethod
-    def load(cls, ctr_file, res_file=None, **group_kwargs):
+    def load(cls, ctr_file, res_file=None, cache=False, workers=None, 
+             progress=None, **group_kwargs):
+        '''
+        Returns an IVCurveGroup read from a CLEED control file.
+        
+        Parameters
+        ----------
+        ctr_file : str
+            Path to the *.ctr file.
+        res_file : str, optional
+            Path to the theoretical results; by default it is derived from
+            `ctr_file`.
+        cache : bool
+            If True the experimental IV curves are read through the binary
+            sidecar cache of :mod:`ivcache`, which is updated as needed.
+        workers : int, optional
+            Number of threads reading the experimental IV files (see 
+            :func:`load_curves`).
+        progress : callable, optional
+            Called as ``progress(n_done, n_total, path)`` after each 
+            experimental IV file has been read; files found in the cache 
+            are reported first.
+        **group_kwargs :
+            Passed to the :class:`IVCurveGroup` constructor.
+        
+        Notes
+        -----
+        Experimental IV files which cannot be read do not stop the load; 
+        their datasets are left empty and the exceptions are collected in 
+        the :attr:`load_errors` dictionary of the returned group.
+        '''
         lines = []
         try:
             with open(ctr_file, 'r') as f:
                 lines = [line.lstrip() for line in f]
         except IOError:
             raise IOError("Failed to read from control file '{}'"
-                          "".format(group))
+                          "".format(ctr_file))
 
         # read beam information from LEED theoretical result file
         if res_file == None:
@@ -748,51 +1035,82 @@ class IVCurveGroup(MutableMapping):
         except IOError:
             theory_beams = {}
         
+        iv_cache = IVCache.for_control(ctr_file) if cache else None
+        
+        pairs = [IVCurvePair.from_control_string(line, ctr_file, load=False)
+                 for line in lines]
+        pairs = [iv for iv in pairs if isinstance(iv, IVCurvePair)]
+        
+        # read all experimental curves which are not cached concurrently
+        paths = [iv.experiment.path for iv in pairs]
+        datasets = [iv_cache.get(path) if iv_cache is not None else None
+                    for path in paths]
+        missing = [i for i, data in enumerate(datasets) if data is None]
+        n_cached = len(paths) - len(missing)
+        if progress is not None:
+            cached = [path for path, data in zip(paths, datasets) 
+                      if data is not None]
+            for n_done, path in enumerate(cached, 1):
+                progress(n_done, len(paths), path)
+            
+            def loading(n_done, n_total, path):
+                progress(n_cached + n_done, n_cached + n_total, path)
+        else:
+            loading = None
+        loaded, errors = load_curves([paths[i] for i in missing], 
+                                     workers=workers, progress=loading)
+        for i, data in zip(missing, loaded):
+            datasets[i] = data
+            if data is not None and iv_cache is not None:
+                iv_cache.put(paths[i], data)
+        
         ivs = IVCurveGroup(**group_kwargs)
-        for line in lines:
-            iv = IVCurvePair.from_control_string(line, ctr_file)
-            if isinstance(iv, IVCurvePair):
-                for beam in iv.index.beams:
-                    beam.data = theory_beams[beam.index()]
-                iv.theory = iv.index.get_combined_IV()
-                iv.theory.path = res_file
-                ivs[iv.index] = iv
+        ivs.load_errors = errors
+        for iv, data in zip(pairs, datasets):
+            iv.experiment.data = data
+            ivs[iv.index] = iv
+        ivs.set_theory(theory_beams, res_file)
+        
+        if iv_cache is not None:
+            iv_cache.prune(pair.experiment.path for pair in ivs._pairs())
+            try:
+                iv_cache.save()
+            except (IOError, OSError):
+                pass  # e.g. read-only directory: the cache is optional
         return ivs
 
-    @classmethod
-    def read_theory(cls, filename):
-        with open(filename, 'r') as f:
-            lines = [line.lstrip() for line in f if line.lstrip() != '']
-        
-        beam_info = {}
-        data = []
-        for line in lines:
-            if line.startswith('#bn'):
-                n_beams = int(line.split()[1])
-            elif line.startswith('#en'):
-                en, ei, ef, es, = [eval(val) for val in line.split()[1:5]]
-            elif line.startswith('#bi'):
-                vars = [eval(var) for var in line.split()[1:]]
-                beam_info[tuple(vars[1:3])] = (vars[0], vars[3])
-            elif line.startswith('#'):
-                continue  # skip general comment
-            else:
-                data.append([eval(var) for var in line.split()])
+    def set_theory(self, table, path=None):
+        '''
+        Replaces the theoretical IV curve of every dataset.
         
-        from numpy import loadtxt
-        data = loadtxt(filename, dtype=float).transpose()
-        x, data = data[0], data[1:]
-        if len(data) != n_beams:
-            f = lambda x,y: len(x) == len(y)
-            if not all(f(y[i], y[i+1]) for i in range(len(data)-1)):
-                raise ValueError("LEED theory data has different "
-                                 "numbers of datapoints")
+        Parameters
+        ----------
+        table : theory.BeamTable or dict
+            Theoretical intensities keyed on (h, k), e.g. as returned by 
+            :func:`theory.read_res`.
+        path : str, optional
+            File the intensities were read from.
         
-        for beam in beam_info:
-            i, j = beam_info[beam]
-            beam_info[beam] = (x, data[i])
+        Notes
+        -----
+        The experimental curves are left untouched, so one group can be 
+        compared against the results of many trial structures without 
+        re-reading the control file.
+        '''
+        for pair in self._pairs():
+            pair.index.set_data(table)
+            pair.theory = pair.index.get_combined_IV()
+            pair.theory.path = path
+    
+    @classmethod
+    def read_theory(cls, filename, cache=True):
+        '''
+        Returns a :class:`theory.BeamTable` read from a *.res file. 
         
-        return beam_info
+        Unless `cache` is False the table is shared through
+        :data:`theory.THEORY_CACHE`.
+        '''
+        return load_theory(filename, cache)
 
     def write(self, ctr_file, res_file):
         from numpy import transpose
@@ -806,9 +1124,141 @@ class IVCurveGroup(MutableMapping):
                             str(beam) + '\n')
                  
             
+    def calculate_rfactor(self, method='rp', **kwargs):
+        '''
+        Calculates the R-factor of every used dataset and their weighted 
+        average.
+        
+        Parameters
+        ----------
+        method : str
+            One of 'rp' (Pendry), 'r1', 'r2' or 'rb' (Zanazzi-Jona).
+        **kwargs :
+            Passed to the R-factor function, e.g. `vi`.
+        
+        Returns
+        -------
+        float :
+            Average R-factor, weighting each dataset by its weight and 
+            energy overlap. The per-beam values are stored in the 
+            :attr:`IVCurvePair.rfactor` of each dataset.
+        '''
+        rfactors, weights, energy_ranges = [], [], []
+        for pair in self._pairs():
+            if not pair.used or pair.theory is None or not len(pair.theory):
+                continue
+            rfactors.append(pair.calculate_rfactor(method, **kwargs))
+            weights.append(pair.weight)
+            e0, ef = pair.energy_overlap
+            energy_ranges.append(ef - e0)
+        if not rfactors:
+            raise ValueError('no datasets with theoretical IV curves')
+        return float(rf.average(rfactors, weights, energy_ranges))
+    
+    def shift_scan(self, shifts, method='rp', **kwargs):
+        '''
+        Returns the average R-factor for each trial energy shift.
+        
+        Parameters
+        ----------
+        shifts : array_like
+            Shifts (eV) applied to the theoretical energy axis, i.e. the 
+            theoretical intensity at energy E is taken from E - shift. This 
+            corresponds to a change of the real part of the inner potential.
+        method : str
+            One of 'rp' (Pendry), 'r1', 'r2' or 'rb' (Zanazzi-Jona).
+        **kwargs :
+            Passed to the R-factor function, e.g. `vi`.
+        
+        Returns
+        -------
+        ndarray :
+            Weighted average R-factor for each shift; infinite where no 
+            dataset overlaps with the shifted theory.
+        
+        Notes
+        -----
+        The theory splines are cached on each :class:`IVCurvePair`, and each
+        beam is evaluated for all shifts at once.
+        '''
+        from scipy import interpolate
+        
+        rfactor = rf.get_rfactor(method)
+        shifts = np.atleast_1d(np.asarray(shifts, dtype=float))
+        numerator = np.zeros(len(shifts))
+        total_weight = np.zeros(len(shifts))
+        for pair in self._pairs():
+            if not pair.used or pair.theory is None or not len(pair.theory):
+                continue
+            pair.experiment.sort()
+            tck = pair.theory_spline()
+            x, ie = pair.experiment.x, pair.experiment.y
+            if len(x) < 2:
+                continue
+            e_step = x[1] - x[0]
+            
+            energies = x[np.newaxis, :] - shifts[:, np.newaxis]
+            mask = ((energies >= pair.theory.x[0]) & 
+                    (energies <= pair.theory.x[-1]))
+            it = interpolate.splev(energies.ravel(), tck).reshape(mask.shape)
+            dit = interpolate.splev(energies.ravel(), tck, 
+                                    1).reshape(mask.shape)
+            die = np.gradient(ie, e_step)
+            r = rfactor(ie[np.newaxis, :], it, e_step=e_step, mask=mask, 
+                        die=die[np.newaxis, :], dit=dit, **kwargs)
+            
+            valid = mask.sum(axis=-1) > 1
+            e0 = np.where(mask, x, np.inf).min(axis=-1)
+            ef = np.where(mask, x, -np.inf).max(axis=-1)
+            weight = np.where(valid, pair.weight * (ef - e0), 0.)
+            numerator += np.where(valid, r, 0.) * weight
+            total_weight += weight
+        
+        return np.where(total_weight > 0., 
+                        numerator / np.where(total_weight > 0., 
+                                             total_weight, 1.), np.inf)
+    
+    def optimise_shift(self, bounds=(-10., 10.), step=1., method='rp', 
+                       **kwargs):
+        '''
+        Finds the energy shift which minimises the average R-factor.
+        
+        Parameters
+        ----------
+        bounds : tuple
+            Lower and upper limits (eV) of the shift.
+        step : float
+            Step (eV) of the initial grid scan. The best grid point is then
+            refined by a bounded Brent minimisation; if `step` is None only 
+            the Brent minimisation over `bounds` is performed.
+        method : str
+            One of 'rp' (Pendry), 'r1', 'r2' or 'rb' (Zanazzi-Jona).
+        **kwargs :
+            Passed to the R-factor function, e.g. `vi`.
+        
+        Returns
+        -------
+        tuple :
+            (shift, R-factor) at the minimum.
+        '''
+        from scipy.optimize import minimize_scalar
+        
+        lower, upper = bounds
+        if step:
+            grid = np.arange(lower, upper + 0.5*step, step)
+            r = self.shift_scan(grid, method, **kwargs)
+            best = grid[np.argmin(r)]
+            lower, upper = max(lower, best - step), min(upper, best + step)
+        
+        func = lambda shift: self.shift_scan(shift, method, **kwargs)[0]
+        result = minimize_scalar(func, bounds=(lower, upper), 
+                                 method='bounded')
+        return (float(result.x), float(result.fun))
+    
     @property
     def rfactor(self):
-        rf = 0.
+        ''' Returns the Pendry R-factor of the group '''
+        return self.calculate_rfactor()
 
 if __name__ == '__main__':
     filename = os.path.expandvars("%Dropbox%"
@@ -0,0 +1,207 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**ivcache.py** - binary sidecar cache for experimental IV curves.
+
+Parsing hundreds of text IV files each time a project is opened is slow, so
+the curves of an :class:`iv.IVCurveGroup` can be kept in a single NPZ file
+next to its control file. Each curve is stored together with the
+modification time and size of its source file and is only read from the
+text file again once that file has changed.
+
+The archive is read into memory in one pass rather than memory-mapped:
+``np.load`` cannot memory-map the members of an NPZ file, and the curves
+of a project are small enough that the single read dominates anyway.
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import threading
+
+import numpy as np
+
+CACHE_SUFFIX = '.ivcache.npz'
+CACHE_VERSION = 1
+
+
+def cache_filename(ctr_file):
+    ''' Returns the path of the sidecar cache belonging to `ctr_file` '''
+    return ctr_file + CACHE_SUFFIX
+
+
+def _normpath(path):
+    return os.path.abspath(os.path.expanduser(os.path.expandvars(path)))
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return (stat.st_mtime, stat.st_size)
+
+
+class IVCache(object):
+    '''
+    Sidecar cache holding the data of many IV files in one NPZ archive.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the NPZ archive. It is read on creation if it exists.
+
+    Notes
+    -----
+    All curves are stored back to back in one (2, N_total) float64 array
+    alongside the offsets of each curve, so reading the archive costs a
+    single read regardless of the number of curves. Archives written by a
+    different :data:`CACHE_VERSION` or that cannot be read are ignored and
+    rebuilt.
+    '''
+    def __init__(self, filename):
+        self.filename = filename
+        self.dirty = False
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._read()
+
+    def __repr__(self):
+        return ("IVCache(filename='{}', n_curves={})"
+                "".format(self.filename, len(self)))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+    @classmethod
+    def for_control(cls, ctr_file):
+        ''' Returns the cache belonging to the control file `ctr_file` '''
+        return cls(cache_filename(ctr_file))
+
+    def _read(self):
+        if not os.path.isfile(self.filename):
+            return
+        try:
+            with np.load(self.filename, allow_pickle=False) as archive:
+                if int(archive['version']) != CACHE_VERSION:
+                    return
+                paths = archive['paths']
+                mtimes = archive['mtimes']
+                sizes = archive['sizes']
+                offsets = archive['offsets']
+                data = archive['data']
+        except (IOError, OSError, KeyError, ValueError):
+            return
+
+        for i, path in enumerate(paths):
+            self._entries[str(path)] = (float(mtimes[i]), int(sizes[i]),
+                                        data[:, offsets[i]:offsets[i+1]])
+
+    def get(self, path):
+        '''
+        Returns the cached (2, N) data of `path` or None if it is missing or
+        the file has changed since it was cached.
+        '''
+        path = _normpath(path)
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        try:
+            if _stat(path) != entry[:2]:
+                return None
+        except OSError:
+            return None
+        return entry[2]
+
+    def put(self, path, data):
+        '''
+        Stores the (2, N) `data` read from `path`; nothing is cached if 
+        `path` cannot be accessed.
+        '''
+        path = _normpath(path)
+        try:
+            mtime, size = _stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._entries[path] = (mtime, size,
+                                   np.array(data, dtype=float).reshape(2, -1))
+            self.dirty = True
+
+    def load_data(self, path, loader):
+        '''
+        Returns the data of `path` from the cache, or reads it with
+        ``loader(path)`` and caches the result.
+        '''
+        data = self.get(path)
+        if data is None:
+            data = loader(path)
+            self.put(path, data)
+        return data
+
+    def prune(self, keep):
+        ''' Removes all entries whose path is not in `keep` '''
+        keep = set(_normpath(path) for path in keep)
+        with self._lock:
+            for path in [p for p in self._entries if p not in keep]:
+                del self._entries[path]
+                self.dirty = True
+
+    def save(self, force=False):
+        '''
+        Writes the cache to disk if it has changed (or `force` is True).
+
+        The archive is written to a temporary file first and then moved
+        into place, so an interrupted save never leaves a corrupt cache.
+        '''
+        if not (self.dirty or force):
+            return
+        with self._lock:
+            paths = sorted(self._entries)
+            entries = [self._entries[path] for path in paths]
+            lengths = [entry[2].shape[1] for entry in entries]
+            offsets = np.concatenate(([0], np.cumsum(lengths))).astype(int)
+            data = (np.hstack([entry[2] for entry in entries]) if entries
+                    else np.empty((2, 0)))
+
+            tmp = self.filename + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.savez(f, version=CACHE_VERSION,
+                         paths=np.array(paths, dtype='U'),
+                         mtimes=np.array([e[0] for e in entries], dtype=float),
+                         sizes=np.array([e[1] for e in entries], dtype=int),
+                         offsets=offsets, data=data)
+            try:
+                os.replace(tmp, self.filename)
+            except AttributeError:
+                # Python 2 has no atomic replace on every platform
+                if os.path.exists(self.filename):
+                    os.remove(self.filename)
+                os.rename(tmp, self.filename)
+            self.dirty = False
@@ -0,0 +1,472 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**jobs.py** - concurrent execution of CLEED programs.
+
+A :class:`Job` describes one run of an external program (``cleed``, 
+``crfac``, ...) together with the files it needs and the result files it 
+produces. A :class:`JobRunner` executes jobs on a bounded pool of worker 
+threads, each job in its own temporary working directory, capturing its 
+standard output and error, killing it once it exceeds its timeout and 
+collecting its result files, e.g.::
+
+    env = Environment(leed_exe='cleed_nsym', rfac_exe='crfac')
+    runner = env.runner(workers=8, output_dir='scan')
+    jobs = [leed_job(env, inp, 'model.bul', name=name) for name, inp in inputs]
+    for result in runner.run(jobs):
+        print(result.job.name, result.returncode, result.files)
+
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from glob import glob
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+
+class Job(object):
+    '''
+    Run of an external program in an isolated working directory.
+    
+    Parameters
+    ----------
+    args : list of str
+        Command line; relative file names refer to the working directory.
+    inputs : list or dict, optional
+        Files copied into the working directory before the run; a dict maps
+        the name within the working directory to the source path.
+    texts : dict, optional
+        Files written into the working directory before the run, mapping 
+        each name to its text (e.g. a rewritten control file).
+    outputs : list of str, optional
+        Glob patterns of the result files to collect after the run.
+    name : str, optional
+        Job name, also used for its result directory.
+    timeout : float, optional
+        Seconds after which the program is killed.
+    env : dict, optional
+        Additional environment variables.
+    stdin : str, optional
+        Text passed to the standard input of the program.
+    '''
+    _count = 0
+    _lock = threading.Lock()
+    
+    def __init__(self, args, inputs=None, outputs=None, name=None, 
+                 timeout=None, env=None, stdin=None, texts=None):
+        self.args = [str(arg) for arg in args]
+        if inputs is None:
+            inputs = {}
+        elif not isinstance(inputs, dict):
+            inputs = dict((os.path.basename(path), path) for path in inputs)
+        self.inputs = inputs
+        self.texts = dict(texts or {})
+        self.outputs = list(outputs or [])
+        self.timeout = timeout
+        self.env = dict(env or {})
+        self.stdin = stdin
+        with Job._lock:
+            Job._count += 1
+            self.name = name or 'job{:04d}'.format(Job._count)
+    
+    def __repr__(self):
+        return 'Job(name={!r}, args={!r})'.format(self.name, self.args)
+
+
+class JobResult(object):
+    '''
+    Outcome of a :class:`Job`.
+    
+    Attributes
+    ----------
+    job : Job
+        The job run.
+    returncode : int or None
+        Exit status of the program (None if it could not be started).
+    stdout, stderr : str
+        Captured output of the program.
+    files : dict
+        Collected result files, mapping each file name to its path.
+    workdir : str
+        Working directory of the run (removed unless kept).
+    elapsed : float
+        Wall time of the run in seconds.
+    timed_out : bool
+        True if the program was killed because it exceeded its timeout.
+    error : Exception or None
+        Error raised while preparing or starting the job.
+    '''
+    def __init__(self, job, returncode=None, stdout='', stderr='', files=None,
+                 workdir=None, elapsed=0., timed_out=False, error=None):
+        self.job = job
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.files = dict(files or {})
+        self.workdir = workdir
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+        self.error = error
+    
+    def __repr__(self):
+        return ('JobResult(name={!r}, returncode={}, timed_out={}, files={})'
+                ''.format(self.job.name, self.returncode, self.timed_out, 
+                          sorted(self.files)))
+    
+    @property
+    def ok(self):
+        ''' True if the program ran to completion with a zero exit status '''
+        return (self.error is None and not self.timed_out and 
+                self.returncode == 0)
+
+
+class JobRunner(object):
+    '''
+    Runs :class:`Job` instances concurrently on a bounded worker pool.
+    
+    Parameters
+    ----------
+    environment : environ.Environment, optional
+        Supplies the environment variables (e.g. ``CLEED_PHASE``) of every 
+        job.
+    workers : int, optional
+        Maximum number of concurrent jobs; defaults to the number of CPUs.
+    root : str, optional
+        Directory in which the temporary working directories are created.
+    output_dir : str, optional
+        If given, the result files of each job are moved into 
+        ``output_dir/<job name>`` and its working directory is removed 
+        (unless `keep` is True). Otherwise the working directories are kept
+        so that the result files remain available.
+    keep : bool
+        Keep the working directories in any case, e.g. for debugging.
+    timeout : float, optional
+        Default timeout for jobs without their own.
+    '''
+    def __init__(self, environment=None, workers=None, root=None, 
+                 output_dir=None, keep=False, timeout=None):
+        self.environment = environment
+        self.workers = int(workers or cpu_count())
+        self.root = root
+        self.output_dir = output_dir
+        self.keep = keep
+        self.timeout = timeout
+        self._pool = None
+        self._processes = set()
+        self._lock = threading.Lock()
+        self._cancelled = False
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+    
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(self.workers)
+        return self._pool
+    
+    def close(self):
+        ''' Waits for the submitted jobs and shuts down the worker pool '''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+    
+    def terminate(self):
+        ''' Kills all running jobs and skips those not yet started '''
+        self._cancelled = True
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            _kill(process)
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+    
+    def execute(self, job):
+        '''
+        Runs `job` in the calling thread.
+        
+        Returns
+        -------
+        JobResult :
+            The outcome of the job; errors are recorded rather than raised.
+        '''
+        result = JobResult(job)
+        if self._cancelled:
+            result.error = RuntimeError('job runner was terminated')
+            return result
+        
+        start = time.time()
+        try:
+            result.workdir = prepare_workdir(job, self.root)
+            self._run_process(job, result)
+            result.files = collect_results(job, result.workdir, 
+                                           self.output_dir)
+        except (OSError, IOError) as err:
+            result.error = err
+        finally:
+            result.elapsed = time.time() - start
+            if (result.workdir and self.output_dir and not self.keep and 
+                    os.path.isdir(result.workdir)):
+                shutil.rmtree(result.workdir, ignore_errors=True)
+        return result
+    
+    def _run_process(self, job, result):
+        stdin = subprocess.PIPE if job.stdin is not None else None
+        process = subprocess.Popen(job.args, cwd=result.workdir, 
+                                   env=job_environment(job, self.environment),
+                                   stdin=stdin,
+                                   stdout=subprocess.PIPE, 
+                                   stderr=subprocess.PIPE,
+                                   **_process_group())
+        with self._lock:
+            self._processes.add(process)
+        
+        timer = None
+        timeout = job.timeout if job.timeout is not None else self.timeout
+        if timeout is not None:
+            def expire():
+                result.timed_out = True
+                _kill(process)
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+        try:
+            stdout, stderr = process.communicate(
+                job.stdin.encode() if job.stdin is not None else None)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with self._lock:
+                self._processes.discard(process)
+        
+        result.returncode = process.returncode
+        result.stdout = stdout.decode('utf-8', 'replace')
+        result.stderr = stderr.decode('utf-8', 'replace')
+    
+    def submit(self, job, callback=None):
+        '''
+        Queues `job` on the worker pool.
+        
+        Returns
+        -------
+        multiprocessing.pool.AsyncResult :
+            Handle whose ``get()`` returns the :class:`JobResult`; 
+            `callback` is called with the result as soon as it is available.
+        '''
+        return self.pool.apply_async(self.execute, (job,), callback=callback)
+    
+    def run(self, jobs, progress=None):
+        '''
+        Runs `jobs` concurrently and waits for all of them.
+        
+        Parameters
+        ----------
+        jobs : list of Job
+            Jobs to run.
+        progress : callable, optional
+            Called as ``progress(n_done, n_total, result)`` as each job 
+            finishes (in order of completion).
+        
+        Returns
+        -------
+        list :
+            The :class:`JobResult` of each job in the order of `jobs`.
+        '''
+        jobs = list(jobs)
+        results = [None] * len(jobs)
+        done = 0
+        for i, result in self.pool.imap_unordered(self._execute_indexed, 
+                                                  list(enumerate(jobs))):
+            results[i] = result
+            done += 1
+            if progress is not None:
+                progress(done, len(jobs), result)
+        return results
+    
+    def _execute_indexed(self, item):
+        return (item[0], self.execute(item[1]))
+
+
+def prepare_workdir(job, root=None):
+    '''
+    Returns a new temporary working directory for `job` (within `root`) 
+    holding copies of its input files and its texts.
+    '''
+    if root and not os.path.isdir(root):
+        os.makedirs(root)
+    workdir = tempfile.mkdtemp(prefix=job.name + '-', dir=root)
+    for name, source in job.inputs.items():
+        shutil.copy2(source, os.path.join(workdir, name))
+    for name, text in job.texts.items():
+        with open(os.path.join(workdir, name), 'w') as f:
+            f.write(text)
+    return workdir
+
+
+def collect_results(job, workdir, output_dir=None):
+    '''
+    Returns the result files of `job` found in `workdir`.
+    
+    If `output_dir` is given the files are moved into 
+    ``output_dir/<job name>`` first.
+    
+    Returns
+    -------
+    dict :
+        Maps each file name to its path.
+    '''
+    paths = []
+    for pattern in job.outputs:
+        paths.extend(path for path in sorted(glob(os.path.join(workdir, 
+                                                                pattern)))
+                     if path not in paths)
+    if not output_dir:
+        return dict((os.path.basename(path), path) for path in paths)
+    
+    destination = os.path.join(output_dir, job.name)
+    if paths and not os.path.isdir(destination):
+        os.makedirs(destination)
+    files = {}
+    for path in paths:
+        name = os.path.basename(path)
+        files[name] = os.path.join(destination, name)
+        shutil.move(path, files[name])
+    return files
+
+
+def job_environment(job, environment=None):
+    '''
+    Returns the environment variables for running `job`: those of the 
+    current process updated with the ``envvars`` of `environment` and the 
+    job's own.
+    '''
+    env = dict(os.environ)
+    if environment is not None:
+        env.update((str(key), str(value)) for key, value 
+                   in environment.envvars.items())
+    env.update((str(key), str(value)) for key, value in job.env.items())
+    return env
+
+
+def _process_group():
+    '''
+    Returns the :class:`subprocess.Popen` arguments starting a program in 
+    its own process group, so that :func:`_kill` also reaches the programs
+    it starts itself (e.g. a shell script wrapping ``cleed``).
+    '''
+    if os.name != 'posix':
+        return {}
+    if sys.version_info >= (3, 2):
+        return {'start_new_session': True}
+    return {'preexec_fn': os.setsid}
+
+
+def _kill(process):
+    ''' Kills `process` together with its process group '''
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass  # already finished
+
+
+def leed_job(environment, inp_file, bul_file, name=None, **kwargs):
+    '''
+    Returns a :class:`Job` running the CLEED executable of `environment`.
+    
+    Parameters
+    ----------
+    environment : environ.Environment
+        Provides ``leed_exe``.
+    inp_file, bul_file : str
+        Parameter (overlayer) and bulk input files.
+    name : str, optional
+        Job name; also the stem of the ``*.res`` and ``*.pro`` result 
+        files. Defaults to the stem of `inp_file`.
+    **kwargs :
+        Passed to :class:`Job` (e.g. `timeout`).
+    '''
+    name = name or os.path.splitext(os.path.basename(inp_file))[0]
+    inp = os.path.basename(inp_file)
+    bul = os.path.basename(bul_file)
+    args = [environment.leed_exe, '-i', inp, '-b', bul, '-o', name + '.res']
+    return Job(args, inputs={inp: inp_file, bul: bul_file}, 
+               outputs=kwargs.pop('outputs', ['*.res', '*.pro']), 
+               name=name, **kwargs)
+
+
+def rfac_job(environment, ctr_file, res_file, name=None, **kwargs):
+    '''
+    Returns a :class:`Job` running the CRFAC executable of `environment`.
+    
+    The R-factor is printed by CRFAC, i.e. found in the ``stdout`` of the 
+    :class:`JobResult`. The control file is rewritten into the working 
+    directory with absolute ``ef=`` paths (relative paths being taken from 
+    the directory of `ctr_file`), so that the experimental IV files are 
+    read from their original locations.
+    '''
+    ctr_file = os.path.abspath(os.path.expanduser(os.path.expandvars(
+                                                                ctr_file)))
+    ctr = os.path.basename(ctr_file)
+    res = os.path.basename(res_file)
+    name = name or os.path.splitext(res)[0] + '_rfac'
+    with open(ctr_file, 'r') as f:
+        text = absolute_control_paths(f.read(), os.path.dirname(ctr_file))
+    args = [environment.rfac_exe, '-c', ctr, '-t', res]
+    return Job(args, inputs={res: res_file}, texts={ctr: text}, 
+               outputs=kwargs.pop('outputs', []), name=name, **kwargs)
+
+
+def absolute_control_paths(text, directory):
+    '''
+    Returns the CRFAC control file `text` with each ``ef=`` path made 
+    absolute, relative paths being taken from `directory`.
+    '''
+    def absolute(match):
+        path = os.path.expanduser(os.path.expandvars(match.group(2)))
+        return match.group(1) + os.path.abspath(os.path.join(directory, 
+                                                             path))
+    return re.sub(r'(ef=\s*)([^:\s]+)', absolute, text)
@@ -41,8 +41,11 @@ except:
 
 from collections import MutableMapping
 
-from index import MillerIndex
+import numpy as np
+
+from index import MillerIndex, parse_index
 from iv import IVCurve, IVCurveGroup
+from theory import load_theory, beam_key
 
 class Beam(MillerIndex, IVCurve):
     def __init__(self, *args, **kwargs):
@@ -121,9 +124,19 @@ class BeamSet(MutableMapping):
     >>> beams = BeamSet(beams="(0, 0)+0.5*(1, 0)")
     >>> beams["(0, 0)"]
     
+    The intensities of all beams are also available as a single 
+    (n_beams, n_energies) array on a shared energy axis (see 
+    :meth:`BeamSet.matrix`), so that combining the beams reduces to a 
+    matrix-vector product with the scale factors. The array is cached and 
+    rebuilt only once beams are added or removed or their data changed 
+    (see :attr:`iv.IVCurve.version`).
+    
     '''
+    MERGE_METHODS = ('union', 'interpolate')
+    
     def __init__(self, beams=[], theory_file=None):
         self._beams = OrderedDict()
+        self._matrix_cache = None
         self.set_beams(beams, theory_file)
         
     def __str__(self):
@@ -199,69 +212,48 @@ class BeamSet(MutableMapping):
     def __ge__(self, other):
         return len(self._beams) >= len(other._beams)
 
+    def _key(self, key, position=True):
+        '''
+        Returns the dictionary key of the beam referred to by `key`, which 
+        may be a string, tuple, Miller index or (if `position`) an integer 
+        position. Keys are normalised with :func:`theory.beam_key` so that 
+        every form of the same index resolves to one dictionary entry.
+        '''
+        if isinstance(key, int) and position:
+            return list(self._beams.keys())[key]
+        try:
+            if isinstance(key, str) or isinstance(key, unicode):
+                key = parse_index(key)
+            return beam_key(key)
+        except (TypeError, ValueError):
+            raise KeyError(key)
+    
     def __contains__(self, key):
-        if isinstance(key, str) or isinstance(key, unicode):
-            key = eval(key)
-        elif isinstance(key, tuple):
-            key = key[0:2]
-        elif hasattr(key, 'index'):
-            if callable(key.index):
-                key = key.index()
-            else:
-                key = key.index
-        return self._beams.__contains__(key)
+        try:
+            return self._key(key, position=False) in self._beams
+        except KeyError:
+            return False
     
     def __len__(self):
         return len(self._beams)
     
     def __delitem__(self, key):
-        if isinstance(key, str) or isinstance(key, unicode):
-            key = eval(key)
-        elif isinstance(key, int):
-            key = self._beams.keys()[key]
-        elif hasattr(key, 'index'):
-            try:
-                if callable(key.index):
-                    key = key.index()
-                else:
-                    key = key.index
-            except TypeError:
-                pass
-        del self._beams[key]
+        del self._beams[self._key(key)]
+        self._matrix_cache = None
         
     def __iter__(self):
         return iter(self._beams)
     
     def __setitem__(self, key, value):
-        if isinstance(key, str) or isinstance(key, unicode):
-            key = eval(key)
-        elif hasattr(key, 'index'):
-            try:
-                if callable(key.index):
-                    key = key.index()
-                else:
-                    key = key.index
-            except TypeError:
-                pass
+        key = self._key(key, position=False)
         if key not in self._beams:
             self._beams[key] = value
+            self._matrix_cache = None
         else:
             raise KeyError('{} already in beam set'.format(key)) 
     
     def __getitem__(self, key):
-        if isinstance(key, str) or isinstance(key, unicode):
-            key = eval(key)
-        elif isinstance(key, int):
-            key = self._beams.keys()[key]
-        elif hasattr(key, 'index'):
-            try:
-                if callable(key.index):
-                    key = key.index()
-                else:
-                    key = key.index
-            except TypeError:
-                pass 
-        return self._beams.__getitem__(key)
+        return self._beams[self._key(key)]
     
     def __reversed__(self):
         return reversed(self._beams)
@@ -273,9 +265,11 @@ class BeamSet(MutableMapping):
         return self._beams.keys()
     
     def popitem(self):
-        return self._beams.pop()
+        self._matrix_cache = None
+        return self._beams.popitem()
     
     def clear(self):
+        self._matrix_cache = None
         return self._beams.clear()
     
     @property
@@ -295,8 +289,8 @@ class BeamSet(MutableMapping):
         beam_data = {}
         if theory_file:
             try:
-                beam_data = IVCurveGroup.read_theory(theory_file)
-            except:
+                beam_data = load_theory(theory_file)
+            except (IOError, ValueError):
                 pass
 
         i_beam = n = 0            
@@ -314,7 +308,7 @@ class BeamSet(MutableMapping):
             i = n
             n = string.find(')', i)+1
             
-            index = eval(string[i:n])
+            index = beam_key(parse_index(string[i:n]))
             beam = Beam(h=index[0], k=index[1], scaling=sf)
             
             try:
@@ -338,20 +332,22 @@ class BeamSet(MutableMapping):
         if isinstance(beams, str) or isinstance(beams, unicode):
             # parse control line
             self._beams = self.eval(beams, theory_file)
+            self._matrix_cache = None
         else:
             self.clear()
             
+            beam_data = {}
             if theory_file:
                 try:
-                    beam_data = IVCurveGroup.read_theory(theory_file)
-                except:
-                    beam_data = {}
+                    beam_data = load_theory(theory_file)
+                except (IOError, ValueError):
+                    pass
             
             for beam in beams:
                 if isinstance(beam, str) or isinstance(beams, unicode):
-                    beam = Beam(*eval(beam))
+                    beam = Beam(*parse_index(beam))
                 elif isinstance(beam, Beam):
-                    if beam.data:
+                    if len(beam):
                         self[beam.index()] = beam
                         continue
                 elif isinstance(beam, MillerIndex):
@@ -371,51 +367,129 @@ class BeamSet(MutableMapping):
     
     def has_index(self, index):
         ''' Returns true if index in beam set '''
-        return not all([beam.index() == index for beam in self.beams])
+        return index in self
+    
+    def set_data(self, table):
+        '''
+        Assigns the intensities of each beam from `table`.
+        
+        Parameters
+        ----------
+        table : theory.BeamTable or dict
+            Theoretical intensities keyed on (h, k), e.g. as returned by 
+            :func:`theory.load_theory`. Beams missing from `table` are left 
+            unchanged.
+        
+        Notes
+        -----
+        When every beam is found in a :class:`theory.BeamTable` the beam 
+        matrix is taken directly from the rows of the table rather than 
+        being rebuilt from the individual beams.
+        '''
+        found = []
+        for beam in self.beams:
+            try:
+                beam.data = table[beam_key(beam)]
+                found.append(beam)
+            except KeyError:
+                pass
+        
+        self._matrix_cache = None
+        if (found and len(found) == len(self) and 
+                hasattr(table, 'rows') and hasattr(table, 'intensities')):
+            rows = table.rows(found)
+            matrix = (table.energies, table.intensities[rows])
+            self._matrix_cache = (self._matrix_key('union'), matrix)
+    
+    def _matrix_key(self, merge):
+        return (merge, tuple((id(beam), beam.version) for beam in self.beams))
+    
+    def matrix(self, merge='union'):
+        '''
+        Returns the intensities of all beams on a shared energy axis.
+        
+        Parameters
+        ----------
+        merge : str
+            How beams with differing energy grids are combined:
+            
+            - ``'union'`` - the axis holds every energy of any beam and beams
+              lacking an energy contribute zero intensity there.
+            - ``'interpolate'`` - the axis holds every energy within the 
+              range common to all beams and each beam is linearly 
+              interpolated onto it.
+            
+            Both give identical results when the grids already agree.
+        
+        Returns
+        -------
+        tuple :
+            ``(energies, intensities)`` where `intensities` has a shape of 
+            (n_beams, n_energies) with rows in the order of 
+            :attr:`BeamSet.beams`.
+        '''
+        if merge not in self.MERGE_METHODS:
+            raise ValueError("merge must be one of {}".format(
+                             ', '.join(repr(m) for m in self.MERGE_METHODS)))
+        
+        key = self._matrix_key(merge)
+        if self._matrix_cache is not None and self._matrix_cache[0] == key:
+            return self._matrix_cache[1]
+        
+        xs = [beam.x for beam in self.beams]
+        ys = [beam.y for beam in self.beams]
+        if not xs:
+            energies = np.empty(0, dtype=float)
+            intensities = np.empty((0, 0), dtype=float)
+        elif all(np.array_equal(xs[0], x) for x in xs[1:]):
+            # common grid - simply stack the beams
+            energies = np.array(xs[0], dtype=float)
+            intensities = np.vstack(ys)
+        elif merge == 'union':
+            energies = np.unique(np.concatenate(xs))
+            intensities = np.zeros((len(xs), len(energies)), dtype=float)
+            for row, (x, y) in enumerate(zip(xs, ys)):
+                np.add.at(intensities[row], 
+                          np.searchsorted(energies, x), y)
+        else:
+            lower = max(x.min() if len(x) else np.inf for x in xs)
+            upper = min(x.max() if len(x) else -np.inf for x in xs)
+            energies = np.unique(np.concatenate(xs))
+            energies = energies[(energies >= lower) & (energies <= upper)]
+            intensities = np.empty((len(xs), len(energies)), dtype=float)
+            for row, (x, y) in enumerate(zip(xs, ys)):
+                order = np.argsort(x, kind='mergesort')
+                intensities[row] = np.interp(energies, x[order], y[order])
+        
+        self._matrix_cache = (key, (energies, intensities))
+        return (energies, intensities)
     
-    def get_combined_IV(self):
+    @property
+    def scale_factors(self):
+        ''' Returns an array with the scale factor of each beam '''
+        return np.array([beam.scale_factor for beam in self.beams], 
+                        dtype=float)
+    
+    def get_combined_IV(self, merge='union'):
         """ Returns an IVCurve with weighted intensities as a result of 
         the combined beams.
         
+        Parameters
+        ----------
+        merge : str
+            How beams on differing energy grids are combined, either 
+            'union' or 'interpolate' (see :meth:`BeamSet.matrix`).
+        
         See
         ---
         BeamSet.__str__() : 
             States how the weighted intensities are calculated for the 
             set of beams.
         """
-        f = lambda x, y: len(x.y) == len(y.y)
-        if all(f(self[i], self[i+1]) for i in range(len(self)-1)):
-            try: 
-                import numpy as np
-                shape = np.shape(self.beams[0].y)
-                y = np.zeros(shape)
-                for beam in self.beams:
-                    y += beam.scale_factor*np.array(beam.y)
-                x = self[0].x
-            except:
-                raise
-            iv = IVCurve(data=np.array((x, y)).copy(), 
-                           type=IVCurve.THEORETICAL_IV)
-            return iv
-        else:
-            # get unique energies 
-            x = []
-            for beam in self.beams:
-                x += list(beam.x)
-            x.sort()
-            x = set(x)
-            energies = OrderedDict()
-            for xi in x:
-                energies[xi] = 0.
-                
-            # now add each beams scaled intensities to dictionary's values
-            for beam in self.beams:
-                for i, x in enumerate(beam.x):
-                    energies[x] = energies[x] + beam.y[i]*beam.scale_factor
-                    
-            x, y = (energies.keys(), energies.values())
-             
-        return IVCurve(data=(x, y), type=IVCurve.THEORETICAL_IV)
+        energies, intensities = self.matrix(merge)
+        y = (self.scale_factors.dot(intensities) if len(intensities) 
+             else np.zeros_like(energies))
+        return IVCurve(data=(energies, y), type=IVCurve.THEORETICAL_IV)
             
 
 class Params(object):
@@ -0,0 +1,309 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**leedcache.py** - content-addressed cache of LEED calculations.
+
+The theoretical intensities of a structure depend only on its input files 
+(atoms, unit cells, optical potential, energy range, ...) and the phase 
+shifts used. A :class:`LEEDCache` stores the beam table of each 
+calculation under a hash of exactly these inputs, so that restarted searches
+and repeated parameter scans never calculate the same structure twice::
+
+    cache = LEEDCache('~/.cleed/cache', maxsize=2 * 2**30)
+    key = cache.key(inp_file, bul_file)
+    table = cache.get(key)
+    if table is None:
+        ...  # run CLEED
+        cache.put(key, read_res(res_file))
+
+The key ignores comments, the order of the atoms and the formatting of 
+numbers, which are compared to :data:`PRECISION` decimals. The cache is 
+bounded in size: once it exceeds `maxsize` bytes the least recently used 
+entries are removed.
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from theory import BeamTable
+
+CACHE_VERSION = 1
+PRECISION = 6
+
+# commands of CLEED input files describing atoms
+ATOM_COMMANDS = ('po', 'pb')
+
+
+def _number(token):
+    ''' Returns `token` formatted canonically if it is a number '''
+    try:
+        value = round(float(token), PRECISION) + 0.  # no negative zero
+    except ValueError:
+        return token
+    return '{:.{}f}'.format(value, PRECISION)
+
+
+def canonical_lines(lines):
+    '''
+    Returns the canonical form of the lines of a CLEED input file.
+    
+    Comments and blank lines are dropped and numbers are reformatted; the 
+    atom lines are sorted since their order does not affect the result.
+    '''
+    commands, atoms = [], []
+    for line in lines:
+        line = line.split('#')[0].strip()
+        if ':' not in line:
+            continue
+        cmd, args = line.split(':', 1)
+        cmd = cmd.strip()
+        if not cmd or cmd == 'c':
+            continue
+        record = ' '.join([cmd + ':'] + [_number(arg) for arg in args.split()])
+        (atoms if cmd in ATOM_COMMANDS else commands).append(record)
+    return commands + sorted(atoms)
+
+
+def phase_tags(lines):
+    ''' Returns the sorted phase shift tags of the atoms in `lines` '''
+    tags = set()
+    for line in canonical_lines(lines):
+        cmd, args = line.split(':', 1)
+        if cmd in ATOM_COMMANDS and args.split():
+            tags.add(args.split()[0])
+    return sorted(tags)
+
+
+def phase_file(tag, phase_dir=None):
+    ''' Returns the phase shift file of the atom `tag` in `phase_dir` '''
+    phase_dir = phase_dir or os.environ.get('CLEED_PHASE', '')
+    return os.path.join(os.path.expanduser(phase_dir), tag + '.phs')
+
+
+def _digest(records, phase_shifts):
+    sha = hashlib.sha1()
+    sha.update('version: {}\n'.format(CACHE_VERSION).encode('utf-8'))
+    for record in records:
+        sha.update(record.encode('utf-8') + b'\n')
+    for tag in sorted(phase_shifts):
+        sha.update('phs: {} {}\n'.format(tag, 
+                                         phase_shifts[tag]).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def file_digest(filename, blocksize=1 << 16):
+    ''' Returns the SHA-1 digest of the contents of `filename` '''
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class LEEDCache(object):
+    '''
+    Size-bounded on-disk cache of theoretical beam tables.
+    
+    Parameters
+    ----------
+    directory : str
+        Cache directory; created if needed. It may be shared by several 
+        processes.
+    maxsize : int
+        Maximum total size of the cached tables in bytes.
+    phase_dir : str, optional
+        Directory of the phase shift files (default: ``$CLEED_PHASE``).
+    
+    Notes
+    -----
+    Each table is stored as an NPZ file named after its key. Reading an 
+    entry updates its modification time, which orders the entries for the 
+    least recently used eviction, so the recency survives restarts. The 
+    directory is scanned again before each eviction so that the entries 
+    written by other processes count towards `maxsize`.
+    '''
+    def __init__(self, directory, maxsize=1 << 30, phase_dir=None):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.maxsize = int(maxsize)
+        self.phase_dir = phase_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._phase_digests = {}
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+    
+    def __repr__(self):
+        return ("LEEDCache(directory='{}', n_entries={}, size={})"
+                "".format(self.directory, len(self), self.size))
+    
+    def __len__(self):
+        return len(self._index())
+    
+    def __contains__(self, key):
+        return os.path.isfile(self._path(key))
+    
+    @property
+    def size(self):
+        ''' Total size of the cached tables in bytes '''
+        return sum(size for _, size in self._index().values())
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.npz')
+    
+    def _index(self):
+        # {path: (access time, size)} of all entries currently on disk, 
+        # including those written by other processes
+        entries = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.npz'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue  # evicted by another process meanwhile
+                    entries[path] = (stat.st_mtime, stat.st_size)
+        return entries
+    
+    def phase_digest(self, tag):
+        ''' Returns the digest of the phase shift file of `tag` '''
+        path = phase_file(tag, self.phase_dir)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise IOError("phase shift file '{}' not found".format(path))
+        stamp = (stat.st_mtime, stat.st_size)
+        cached = self._phase_digests.get(path)
+        if cached is None or cached[0] != stamp:
+            cached = self._phase_digests[path] = (stamp, file_digest(path))
+        return cached[1]
+    
+    def key(self, inp_file, bul_file):
+        '''
+        Returns the cache key of a CLEED calculation of the parameter 
+        (overlayer) file `inp_file` and bulk file `bul_file`.
+        
+        Raises
+        ------
+        IOError
+            If an input or phase shift file cannot be read.
+        '''
+        lines = []
+        for filename in (bul_file, inp_file):
+            with open(filename, 'r') as f:
+                lines.extend(f.readlines())
+        records = canonical_lines(lines)
+        digests = dict((tag, self.phase_digest(tag)) 
+                       for tag in phase_tags(lines))
+        return _digest(records, digests)
+    
+    def get(self, key):
+        ''' Returns the cached :class:`theory.BeamTable` of `key` or None '''
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                if int(archive['version']) != CACHE_VERSION:
+                    raise ValueError('cache version mismatch')
+                table = BeamTable(archive['energies'], archive['intensities'],
+                                  [tuple(index) for index 
+                                   in archive['indices']],
+                                  sets=archive['sets'],
+                                  header=dict(zip(archive['header_keys'], 
+                                                  archive['header_values'])))
+        except (IOError, OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass  # evicted by another process meanwhile
+        return table
+    
+    def put(self, key, table):
+        '''
+        Stores the :class:`theory.BeamTable` `table` under `key` and evicts
+        the least recently used entries if the cache has grown too large.
+        
+        The table is written to a temporary file first and then moved into
+        place, so readers never see a partial entry.
+        '''
+        path = self._path(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        header = sorted(table.header.items())
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.savez(f, version=CACHE_VERSION, energies=table.energies,
+                     intensities=table.intensities, 
+                     indices=np.array(table.indices, 
+                                      dtype=float).reshape(-1, 2),
+                     sets=table.sets,
+                     header_keys=np.array([k for k, _ in header], dtype='U'),
+                     header_values=np.array([v for _, v in header], 
+                                            dtype='U'))
+        try:
+            os.replace(tmp, path)
+        except AttributeError:
+            # Python 2 has no atomic replace on every platform
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp, path)
+        self.evict()
+    
+    def evict(self, maxsize=None):
+        '''
+        Removes the least recently used entries until the cache holds at 
+        most `maxsize` bytes (default: :attr:`maxsize`).
+        '''
+        maxsize = self.maxsize if maxsize is None else maxsize
+        with self._lock:
+            entries = self._index()
+            total = sum(size for _, size in entries.values())
+            if total <= maxsize:
+                return
+            for path in sorted(entries, key=lambda p: entries[p][0]):
+                total -= entries.pop(path)[1]
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                if total <= maxsize:
+                    break
+    
+    def clear(self):
+        ''' Removes all entries '''
+        self.evict(0)
@@ -0,0 +1,938 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**optimise.py** - batch-parallel structural search.
+
+The optimisers minimise an R-factor (or any other objective) over a box of
+trial parameters. Unlike the sequential simplex of ``csearch`` each 
+iteration proposes a whole batch of trial points which are evaluated 
+together, so that every core of a node is kept busy:
+
+ - :class:`NelderMead`: parallel simplex, reflecting the `parallel` worst 
+   vertices at once.
+ - :class:`DifferentialEvolution`: ``rand/1/bin`` or ``best/1/bin`` 
+   differential evolution.
+ - :class:`ParticleSwarm`: global-best particle swarm.
+
+An objective is either a callable taking one parameter vector, in which 
+case batches are mapped over an optional worker pool, or an object with an
+``evaluate(points)`` method returning the values of a whole batch at once.
+:class:`LEEDObjective` is of the latter kind: it runs CLEED for each trial 
+structure through a :class:`jobs.JobRunner` and calculates the R-factors 
+in-process with :mod:`rfactor`, e.g.::
+
+    objective = LEEDObjective(InputTemplate('model.inp.tmpl'), 'model.bul',
+                              'model.ctr', env.runner(workers=16))
+    result = minimise(objective, bounds, method='de', seed=1)
+    print(result.x, result.fun)
+
+Long searches can be checkpointed: with ``checkpoint='search.npz'`` the 
+complete state of the optimiser - simplex or population, every evaluated 
+point, the best R-factors, the state of the random number generator and 
+the trial counter of the objective - is written after each iteration, and 
+a run given an existing checkpoint resumes exactly where the previous one 
+stopped.
+
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from iv import IVCurveGroup
+from jobs import leed_job
+from theory import beam_key, read_res
+
+CHECKPOINT_VERSION = 1
+
+
+class OptimiseResult(object):
+    '''
+    Outcome of an optimisation.
+    
+    Attributes
+    ----------
+    x : ndarray
+        Best parameter vector found.
+    fun : float
+        Objective value at `x`.
+    nfev : int
+        Number of objective evaluations.
+    nit : int
+        Number of iterations.
+    converged : bool
+        True if the convergence criterion was met.
+    history : ndarray
+        Best objective value after each iteration.
+    '''
+    def __init__(self, x, fun, nfev=0, nit=0, converged=False, history=None):
+        self.x = x
+        self.fun = fun
+        self.nfev = nfev
+        self.nit = nit
+        self.converged = converged
+        self.history = np.asarray(history if history is not None else [], 
+                                  dtype=float)
+    
+    def __repr__(self):
+        return ('OptimiseResult(fun={!r}, nfev={!r}, nit={!r}, converged={!r})'
+                ''.format(self.fun, self.nfev, self.nit, self.converged))
+
+
+class Optimiser(object):
+    '''
+    Base class of the batch-parallel optimisers.
+    
+    Parameters
+    ----------
+    func : callable or object
+        Objective; either called with one parameter vector or providing 
+        ``evaluate(points)`` for a whole (n_points, n_parameters) batch.
+    bounds : array_like
+        (lower, upper) limits of each parameter, of shape (n_parameters, 2).
+    seed : int or RandomState, optional
+        Seed of the random number generator.
+    workers : int, optional
+        Number of workers over which single-point objectives are mapped;
+        batch objectives parallelise themselves.
+    processes : bool
+        Map over a process pool rather than a thread pool (the objective 
+        must then be picklable).
+    pool : object, optional
+        Existing pool providing ``map``; overrides `workers`.
+    max_iter : int
+        Maximum number of iterations of :meth:`run`.
+    tol : float
+        Tolerance of the convergence criterion.
+    
+    Attributes
+    ----------
+    x_best, f_best :
+        Best point and value found so far.
+    points, values : ndarray
+        Every point evaluated and its objective value.
+    '''
+    name = None
+    
+    # attributes holding the simplex or population
+    _state = ()
+    
+    def __init__(self, func, bounds, seed=None, workers=None, processes=False,
+                 pool=None, max_iter=1000, tol=1e-4):
+        self.func = func
+        self.bounds = np.array(bounds, dtype=float).reshape(-1, 2)
+        if np.any(self.bounds[:, 0] > self.bounds[:, 1]):
+            raise ValueError('lower bounds must not exceed upper bounds')
+        if isinstance(seed, np.random.RandomState):
+            self.random_state = seed
+        else:
+            self.random_state = np.random.RandomState(seed)
+        self.workers = workers
+        self.processes = processes
+        self.pool = pool
+        self._pool = pool
+        self.max_iter = max_iter
+        self.tol = tol
+        
+        self.nit = 0
+        self.nfev = 0
+        self.x_best = None
+        self.f_best = np.inf
+        self.history = []
+        self.initialised = False
+        self._points = []
+        self._values = []
+    
+    def __repr__(self):
+        return ('{}(n_parameters={}, nit={}, nfev={}, f_best={!r})'
+                ''.format(self.__class__.__name__, self.n_parameters, 
+                          self.nit, self.nfev, self.f_best))
+    
+    @property
+    def n_parameters(self):
+        return len(self.bounds)
+    
+    @property
+    def lower(self):
+        return self.bounds[:, 0]
+    
+    @property
+    def upper(self):
+        return self.bounds[:, 1]
+    
+    @property
+    def points(self):
+        ''' Returns an array of all points evaluated so far '''
+        if not self._points:
+            return np.empty((0, self.n_parameters))
+        return np.concatenate(self._points)
+    
+    @property
+    def values(self):
+        ''' Returns the objective values of :attr:`points` '''
+        if not self._values:
+            return np.empty(0)
+        return np.concatenate(self._values)
+    
+    def clip(self, points):
+        ''' Returns `points` limited to the bounds '''
+        return np.clip(points, self.lower, self.upper)
+    
+    def uniform(self, n):
+        ''' Returns `n` random points distributed uniformly within bounds '''
+        return (self.lower + self.random_state.rand(n, self.n_parameters) * 
+                (self.upper - self.lower))
+    
+    def evaluate(self, points):
+        '''
+        Returns the objective values of a batch of `points`.
+        
+        Non-finite values are replaced by infinity, and the best point 
+        and the record of evaluated points are updated.
+        '''
+        points = self.clip(np.atleast_2d(np.asarray(points, dtype=float)))
+        if not len(points):
+            return np.empty(0)
+        if hasattr(self.func, 'evaluate'):
+            values = self.func.evaluate(points)
+        elif self._pool is not None:
+            values = self._pool.map(self.func, list(points))
+        else:
+            values = [self.func(x) for x in points]
+        values = np.array(values, dtype=float).reshape(len(points))
+        values[~np.isfinite(values)] = np.inf
+        
+        self.nfev += len(points)
+        self._points.append(points)
+        self._values.append(values.copy())  # callers may modify `values`
+        best = np.argmin(values)
+        if values[best] < self.f_best:
+            self.x_best = points[best].copy()
+            self.f_best = float(values[best])
+        return values
+    
+    def initialise(self):
+        ''' Creates and evaluates the initial simplex or population '''
+        raise NotImplementedError
+    
+    def step(self):
+        ''' Performs one iteration '''
+        raise NotImplementedError
+    
+    def converged(self):
+        ''' Returns True once the convergence criterion is met '''
+        raise NotImplementedError
+    
+    def _open_pool(self):
+        self._pool = self.pool
+        if self._pool is None and self.workers and self.workers > 1:
+            if hasattr(self.func, 'evaluate'):
+                return None
+            pool_type = Pool if self.processes else ThreadPool
+            self._pool = pool_type(self.workers)
+            return self._pool
+        return None
+    
+    def get_state(self):
+        '''
+        Returns the complete state of the optimiser as a dictionary of 
+        arrays (see :meth:`save_checkpoint`).
+        '''
+        n = self.n_parameters
+        rng = self.random_state.get_state()
+        state = {'version': CHECKPOINT_VERSION, 
+                 'method': self.name,
+                 'bounds': self.bounds,
+                 'nit': self.nit,
+                 'nfev': self.nfev,
+                 'initialised': self.initialised,
+                 'x_best': (np.full(n, np.nan) if self.x_best is None 
+                            else self.x_best),
+                 'f_best': self.f_best,
+                 'history': np.asarray(self.history, dtype=float),
+                 'points': self.points,
+                 'values': self.values,
+                 'rng_name': rng[0],
+                 'rng_keys': rng[1],
+                 'rng_pos': rng[2],
+                 'rng_has_gauss': rng[3],
+                 'rng_gauss': rng[4]}
+        for attr in self._state:
+            value = getattr(self, attr)
+            state[attr] = np.empty(0) if value is None else value
+        if hasattr(self.func, 'get_state'):
+            for key, value in self.func.get_state().items():
+                state['objective_' + key] = value
+        return state
+    
+    def set_state(self, state):
+        '''
+        Restores a state returned by :meth:`get_state`.
+        
+        Raises
+        ------
+        ValueError
+            If the state belongs to a different method or bounds, or its 
+            simplex or population has a different size.
+        '''
+        if int(state['version']) != CHECKPOINT_VERSION:
+            raise ValueError('unsupported checkpoint version {}'
+                             ''.format(state['version']))
+        if str(state['method']) != self.name:
+            raise ValueError("checkpoint of method '{}' cannot be restored "
+                             "by '{}'".format(state['method'], self.name))
+        if not np.allclose(state['bounds'], self.bounds):
+            raise ValueError('checkpoint bounds differ from the bounds of '
+                             'the optimiser')
+        shapes = self._state_shapes()
+        for attr in self._state:
+            shape = np.shape(state[attr])
+            if np.size(state[attr]) and shape != shapes[attr]:
+                raise ValueError('checkpoint {} has shape {} - expected {} '
+                                 '(e.g. a different population size)'
+                                 ''.format(attr, shape, shapes[attr]))
+        
+        self.nit = int(state['nit'])
+        self.nfev = int(state['nfev'])
+        self.initialised = bool(state['initialised'])
+        x_best = np.array(state['x_best'], dtype=float)
+        self.x_best = x_best if np.all(np.isfinite(x_best)) else None
+        self.f_best = float(state['f_best'])
+        self.history = [float(f) for f in state['history']]
+        points = np.array(state['points'], dtype=float)
+        self._points = [points] if len(points) else []
+        self._values = ([np.array(state['values'], dtype=float)] 
+                        if len(points) else [])
+        self.random_state.set_state((str(state['rng_name']), 
+                                     np.array(state['rng_keys']),
+                                     int(state['rng_pos']), 
+                                     int(state['rng_has_gauss']), 
+                                     float(state['rng_gauss'])))
+        for attr in self._state:
+            value = np.array(state[attr], dtype=float)
+            setattr(self, attr, value if value.size else None)
+        if hasattr(self.func, 'set_state'):
+            self.func.set_state(dict((key[len('objective_'):], value) 
+                                     for key, value in state.items() 
+                                     if key.startswith('objective_')))
+    
+    def _state_shapes(self):
+        ''' Returns the expected shape of each attribute in :attr:`_state` '''
+        return {}
+    
+    def save_checkpoint(self, filename):
+        '''
+        Writes the state of the optimiser to the NPZ file `filename`.
+        
+        The checkpoint is written to a temporary file first and then moved 
+        into place, so an interruption never leaves a corrupt checkpoint.
+        '''
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **self.get_state())
+        try:
+            os.replace(tmp, filename)
+        except AttributeError:
+            # Python 2 has no atomic replace on every platform
+            if os.path.exists(filename):
+                os.remove(filename)
+            os.rename(tmp, filename)
+    
+    def load_checkpoint(self, filename):
+        ''' Restores the state saved by :meth:`save_checkpoint` '''
+        with np.load(filename, allow_pickle=False) as archive:
+            self.set_state(dict((key, archive[key]) for key in archive.files))
+    
+    def run(self, max_iter=None, callback=None, checkpoint=None, 
+            checkpoint_every=1):
+        '''
+        Iterates until convergence or `max_iter` iterations in total.
+        
+        Parameters
+        ----------
+        max_iter : int, optional
+            Overrides :attr:`max_iter`.
+        callback : callable, optional
+            Called as ``callback(optimiser)`` after each iteration; the run
+            stops if it returns True.
+        checkpoint : str, optional
+            Checkpoint file. If it exists when a new optimiser is run the 
+            search resumes from it; it is rewritten after the initial 
+            evaluations, every `checkpoint_every` iterations and at the end.
+        checkpoint_every : int
+            Number of iterations between checkpoints.
+        
+        Returns
+        -------
+        OptimiseResult
+        '''
+        max_iter = self.max_iter if max_iter is None else max_iter
+        if (checkpoint is not None and not self.initialised and 
+                os.path.isfile(checkpoint)):
+            self.load_checkpoint(checkpoint)
+        own_pool = self._open_pool()
+        try:
+            if not self.initialised:
+                self.initialise()
+                self.initialised = True
+                if checkpoint is not None:
+                    self.save_checkpoint(checkpoint)
+            while self.nit < max_iter and not self.converged():
+                self.step()
+                self.nit += 1
+                self.history.append(self.f_best)
+                if checkpoint is not None and not self.nit % checkpoint_every:
+                    self.save_checkpoint(checkpoint)
+                if callback is not None and callback(self):
+                    break
+            if checkpoint is not None:
+                self.save_checkpoint(checkpoint)
+        finally:
+            if own_pool is not None:
+                own_pool.close()
+                own_pool.join()
+            self._pool = self.pool
+        return self.result()
+    
+    def result(self):
+        ''' Returns an :class:`OptimiseResult` of the current state '''
+        return OptimiseResult(self.x_best, self.f_best, self.nfev, self.nit,
+                              self.initialised and self.converged(), 
+                              self.history)
+
+
+class NelderMead(Optimiser):
+    '''
+    Parallel Nelder-Mead simplex.
+    
+    Each iteration reflects the `parallel` worst vertices through the 
+    centroid of the others and evaluates the reflections as one batch, 
+    followed by one batch of the expansions and contractions they call for
+    (Lee and Wiswall, Comput. Econ. 30, 171 (2007)). With ``parallel=1`` 
+    this is the classical simplex of ``csearch``.
+    
+    Parameters
+    ----------
+    x0 : array_like, optional
+        Starting point; defaults to the centre of the bounds.
+    step : float
+        Size of the initial simplex as a fraction of the bound widths.
+    parallel : int, optional
+        Number of vertices updated per iteration; defaults to half the 
+        number of parameters (but at most `workers`), since the simplex 
+        degenerates as it approaches the number of parameters.
+    xtol : float
+        Convergence threshold for the simplex size, as a fraction of the 
+        bound widths.
+    **kwargs :
+        Passed to :class:`Optimiser`.
+    '''
+    name = 'nelder-mead'
+    _state = ('simplex', 'fsim')
+    alpha, gamma, rho, sigma = 1., 2., 0.5, 0.5
+    
+    def __init__(self, func, bounds, x0=None, step=0.1, parallel=None, 
+                 xtol=1e-4, **kwargs):
+        super(NelderMead, self).__init__(func, bounds, **kwargs)
+        self.x0 = (self.lower + self.upper) / 2. if x0 is None else x0
+        self.step_size = step
+        if parallel is None:
+            parallel = max(1, self.n_parameters // 2)
+            if self.workers:
+                parallel = min(parallel, self.workers)
+        self.parallel = int(min(max(1, parallel), self.n_parameters))
+        self.xtol = xtol
+        self.simplex = None
+        self.fsim = None
+    
+    def initialise(self):
+        x0 = self.clip(np.asarray(self.x0, dtype=float))
+        steps = self.step_size * (self.upper - self.lower)
+        steps[steps == 0] = self.step_size
+        # step towards the further bound so that no vertex is clipped
+        steps = np.where(x0 + steps <= self.upper, steps, -steps)
+        self.simplex = np.vstack([x0, x0 + np.diag(steps)])
+        self.simplex = self.clip(self.simplex)
+        self.fsim = self.evaluate(self.simplex)
+        self._sort()
+    
+    def _state_shapes(self):
+        n = self.n_parameters
+        return {'simplex': (n + 1, n), 'fsim': (n + 1, )}
+    
+    def _sort(self):
+        order = np.argsort(self.fsim, kind='mergesort')
+        self.simplex = self.simplex[order]
+        self.fsim = self.fsim[order]
+    
+    def step(self):
+        n, p = self.n_parameters, self.parallel
+        worst = np.arange(n + 1 - p, n + 1)
+        centroid = self.simplex[:n + 1 - p].mean(axis=0)
+        xr = self.clip(centroid + self.alpha * (centroid - self.simplex[worst]))
+        fr = self.evaluate(xr)
+        
+        f_best, f_kept = self.fsim[0], self.fsim[n - p]
+        expand = fr < f_best
+        accept = ~expand & (fr < f_kept)
+        outside = ~expand & ~accept & (fr < self.fsim[worst])
+        inside = ~expand & ~accept & ~outside
+        
+        trial = np.where(expand[:, np.newaxis], 
+                         centroid + self.gamma * (xr - centroid),
+                         np.where(outside[:, np.newaxis],
+                                  centroid + self.rho * (xr - centroid),
+                                  centroid + self.rho * 
+                                  (self.simplex[worst] - centroid)))
+        second = ~accept
+        ft = np.full(p, np.inf)
+        ft[second] = self.evaluate(self.clip(trial[second]))
+        trial = self.clip(trial)
+        
+        new_x, new_f = xr.copy(), fr.copy()
+        better = (expand & (ft < fr)) | ((outside | inside) & 
+                                         (ft <= np.minimum(fr, 
+                                              self.fsim[worst])))
+        new_x[better], new_f[better] = trial[better], ft[better]
+        replaced = expand | accept | better
+        
+        if replaced.any():
+            self.simplex[worst[replaced]] = new_x[replaced]
+            self.fsim[worst[replaced]] = new_f[replaced]
+        else:
+            # shrink towards the best vertex
+            self.simplex[1:] = self.clip(self.simplex[0] + self.sigma * 
+                                         (self.simplex[1:] - self.simplex[0]))
+            self.fsim[1:] = self.evaluate(self.simplex[1:])
+        self._sort()
+    
+    def converged(self):
+        if self.simplex is None:
+            return False
+        widths = np.where(self.upper > self.lower, self.upper - self.lower, 1.)
+        size = np.max(np.abs(self.simplex[1:] - self.simplex[0]) / widths)
+        spread = np.max(np.abs(self.fsim[1:] - self.fsim[0]))
+        return bool(size <= self.xtol and spread <= self.tol)
+
+
+class DifferentialEvolution(Optimiser):
+    '''
+    Differential evolution, evaluating each generation as one batch.
+    
+    Parameters
+    ----------
+    popsize : int
+        Population size as a multiple of the number of parameters.
+    mutation : float or tuple
+        Differential weight; a (min, max) tuple draws a new weight for 
+        each generation (dithering).
+    recombination : float
+        Crossover probability.
+    strategy : str
+        Either 'rand1bin' or 'best1bin'.
+    atol : float
+        Absolute tolerance of the convergence criterion.
+    **kwargs :
+        Passed to :class:`Optimiser`.
+    
+    Notes
+    -----
+    The run has converged once the standard deviation of the population 
+    values falls below ``atol + tol * |mean|``.
+    '''
+    name = 'de'
+    _state = ('population', 'fitness')
+    STRATEGIES = ('rand1bin', 'best1bin')
+    
+    def __init__(self, func, bounds, popsize=15, mutation=(0.5, 1.), 
+                 recombination=0.7, strategy='rand1bin', atol=0., **kwargs):
+        super(DifferentialEvolution, self).__init__(func, bounds, **kwargs)
+        if strategy not in self.STRATEGIES:
+            raise ValueError("strategy must be one of {} - got '{}'"
+                             "".format(', '.join(self.STRATEGIES), strategy))
+        self.popsize = max(5, int(popsize * self.n_parameters))
+        self.mutation = mutation
+        self.recombination = recombination
+        self.strategy = strategy
+        self.atol = atol
+        self.population = None
+        self.fitness = None
+    
+    def initialise(self):
+        self.population = self.uniform(self.popsize)
+        self.fitness = self.evaluate(self.population)
+    
+    def _state_shapes(self):
+        return {'population': (self.popsize, self.n_parameters), 
+                'fitness': (self.popsize, )}
+    
+    def _mutants(self):
+        size, rs = self.popsize, self.random_state
+        weight = self.mutation
+        if np.iterable(weight):
+            weight = rs.uniform(*weight)
+        # three distinct partners per member, none of them the member itself
+        partners = np.argsort(rs.rand(size, size - 1), axis=1)[:, :3]
+        partners += partners >= np.arange(size)[:, np.newaxis]
+        r1, r2, r3 = partners.T
+        pop = self.population
+        if self.strategy == 'best1bin':
+            base = pop[np.argmin(self.fitness)]
+            return base + weight * (pop[r1] - pop[r2])
+        return pop[r1] + weight * (pop[r2] - pop[r3])
+    
+    def step(self):
+        size, n, rs = self.popsize, self.n_parameters, self.random_state
+        mutants = self._mutants()
+        cross = rs.rand(size, n) < self.recombination
+        cross[np.arange(size), rs.randint(n, size=size)] = True
+        trials = np.where(cross, mutants, self.population)
+        
+        # redraw components leaving the bounds
+        outside = (trials < self.lower) | (trials > self.upper)
+        trials = np.where(outside, self.uniform(size), trials)
+        
+        values = self.evaluate(trials)
+        improved = values <= self.fitness
+        self.population[improved] = trials[improved]
+        self.fitness[improved] = values[improved]
+    
+    def converged(self):
+        if self.fitness is None or not np.all(np.isfinite(self.fitness)):
+            return False
+        return bool(np.std(self.fitness) <= 
+                    self.atol + self.tol * abs(np.mean(self.fitness)))
+
+
+class ParticleSwarm(Optimiser):
+    '''
+    Global-best particle swarm, evaluating each iteration as one batch.
+    
+    Parameters
+    ----------
+    swarmsize : int
+        Number of particles as a multiple of the number of parameters.
+    inertia : float
+        Inertia weight of the velocities.
+    cognitive, social : float
+        Acceleration towards the best point of each particle and of the 
+        swarm respectively.
+    max_velocity : float
+        Velocity limit as a fraction of the bound widths.
+    **kwargs :
+        Passed to :class:`Optimiser`.
+    
+    Notes
+    -----
+    The run has converged once the personal best values of all particles 
+    agree to within ``tol``.
+    '''
+    name = 'pso'
+    _state = ('positions', 'velocities', 'best_positions', 'best_values')
+    
+    def __init__(self, func, bounds, swarmsize=10, inertia=0.7298, 
+                 cognitive=1.49618, social=1.49618, max_velocity=0.2, 
+                 **kwargs):
+        super(ParticleSwarm, self).__init__(func, bounds, **kwargs)
+        self.swarmsize = max(5, int(swarmsize * self.n_parameters))
+        self.inertia = inertia
+        self.cognitive = cognitive
+        self.social = social
+        self.max_velocity = max_velocity
+        self.positions = None
+        self.velocities = None
+        self.best_positions = None
+        self.best_values = None
+    
+    def initialise(self):
+        v_max = self.max_velocity * (self.upper - self.lower)
+        self.positions = self.uniform(self.swarmsize)
+        self.velocities = v_max * (2. * self.random_state.rand(
+                                            self.swarmsize, 
+                                            self.n_parameters) - 1.)
+        self.best_values = self.evaluate(self.positions)
+        self.best_positions = self.positions.copy()
+    
+    def _state_shapes(self):
+        shape = (self.swarmsize, self.n_parameters)
+        return {'positions': shape, 'velocities': shape, 
+                'best_positions': shape, 'best_values': (self.swarmsize, )}
+    
+    def step(self):
+        rs = self.random_state
+        shape = self.positions.shape
+        v_max = self.max_velocity * (self.upper - self.lower)
+        self.velocities = (self.inertia * self.velocities + 
+                           self.cognitive * rs.rand(*shape) * 
+                           (self.best_positions - self.positions) + 
+                           self.social * rs.rand(*shape) * 
+                           (self.x_best - self.positions))
+        self.velocities = np.clip(self.velocities, -v_max, v_max)
+        positions = self.positions + self.velocities
+        
+        # particles stop at the bounds
+        outside = (positions < self.lower) | (positions > self.upper)
+        self.velocities[outside] = 0.
+        self.positions = self.clip(positions)
+        
+        values = self.evaluate(self.positions)
+        improved = values < self.best_values
+        self.best_positions[improved] = self.positions[improved]
+        self.best_values[improved] = values[improved]
+    
+    def converged(self):
+        if self.best_values is None or not np.all(np.isfinite(
+                                                    self.best_values)):
+            return False
+        return bool(np.ptp(self.best_values) <= self.tol)
+
+
+OPTIMISERS = {'nelder-mead': NelderMead, 'simplex': NelderMead, 
+              'de': DifferentialEvolution, 'pso': ParticleSwarm}
+
+
+def get_optimiser(method='de'):
+    ''' Returns the optimiser class for the `method` name '''
+    try:
+        return OPTIMISERS[method.lower()]
+    except KeyError:
+        raise ValueError("method must be one of {} - got '{}'"
+                         "".format(', '.join(sorted(OPTIMISERS)), method))
+
+
+def minimise(func, bounds, method='de', callback=None, checkpoint=None,
+             **options):
+    '''
+    Minimises `func` within `bounds`.
+    
+    Parameters
+    ----------
+    func : callable or object
+        Objective (see :class:`Optimiser`).
+    bounds : array_like
+        (lower, upper) limits of each parameter.
+    method : str
+        One of 'nelder-mead' (or 'simplex'), 'de' or 'pso'.
+    callback : callable, optional
+        Called as ``callback(optimiser)`` after each iteration.
+    checkpoint : str, optional
+        Checkpoint file from which to resume and to which the state is 
+        written (see :meth:`Optimiser.run`).
+    **options :
+        Passed to the optimiser class.
+    
+    Returns
+    -------
+    OptimiseResult
+    '''
+    optimiser = get_optimiser(method)(func, bounds, **options)
+    return optimiser.run(callback=callback, checkpoint=checkpoint)
+
+
+class InputTemplate(object):
+    '''
+    CLEED parameter file with placeholders for the search parameters.
+    
+    The template is formatted with :meth:`str.format`, the parameter vector
+    supplying the positional fields, e.g. ``po: O_H 0.0 0.0 {0:.4f} dr1``.
+    
+    Parameters
+    ----------
+    template : str
+        Path of the template file, or the template text itself.
+    '''
+    def __init__(self, template):
+        if os.path.isfile(template):
+            with open(template, 'r') as f:
+                template = f.read()
+        self.template = template
+    
+    def __call__(self, x, filename):
+        ''' Writes the parameter file for vector `x` to `filename` '''
+        with open(filename, 'w') as f:
+            f.write(self.template.format(*x))
+
+
+class LEEDObjective(object):
+    '''
+    R-factor of trial structures calculated with CLEED.
+    
+    Parameters
+    ----------
+    write_input : callable
+        Called as ``write_input(x, filename)`` to write the parameter 
+        (overlayer) file of the trial structure `x`, e.g. an 
+        :class:`InputTemplate`.
+    bul_file : str
+        Bulk input file shared by all trial structures.
+    ctr_file : str
+        Control file naming the experimental IV curves.
+    runner : jobs.JobRunner
+        Runs the CLEED jobs of each batch concurrently.
+    method : str
+        R-factor ('rp', 'r1', 'r2' or 'rb').
+    shift : tuple, optional
+        (lower, upper) bounds of an energy shift optimised for each trial 
+        structure (see :meth:`iv.IVCurveGroup.optimise_shift`).
+    penalty : float
+        Value of trial structures whose calculation fails.
+    scratch : str, optional
+        Directory for the parameter files (default: a temporary directory).
+    cache : leedcache.LEEDCache, optional
+        Cache of the beam tables of previous calculations; trial structures
+        found in it are not calculated again.
+    **kwargs :
+        Passed to the R-factor function, e.g. `vi`.
+    
+    Notes
+    -----
+    The experimental IV curves are read once; each result file is then 
+    compared in-process, so no ``crfac`` run is needed.
+    '''
+    def __init__(self, write_input, bul_file, ctr_file, runner, method='rp',
+                 shift=None, penalty=2., scratch=None, cache=None, 
+                 **kwargs):
+        self.write_input = write_input
+        self.bul_file = os.path.abspath(bul_file)
+        self.ctr_file = os.path.abspath(ctr_file)
+        self.runner = runner
+        self.method = method
+        self.shift = shift
+        self.penalty = penalty
+        self.scratch = scratch or tempfile.mkdtemp(prefix='leed-search-')
+        self.cache = cache
+        self.rfactor_kwargs = kwargs
+        self.group = IVCurveGroup.load(self.ctr_file)
+        self.count = 0
+    
+    def __call__(self, x):
+        return self.evaluate([x])[0]
+    
+    def get_state(self):
+        '''
+        Returns the trial counter, which is saved in the checkpoints of an 
+        optimiser so that a resumed search never reuses the names (and 
+        result directories) of earlier trials.
+        '''
+        return {'count': self.count}
+    
+    def set_state(self, state):
+        ''' Restores the state returned by :meth:`get_state` '''
+        if 'count' in state:
+            self.count = int(state['count'])
+    
+    def rfactor(self, table, path=None):
+        '''
+        Returns the R-factor of the theoretical beam `table`.
+        
+        Raises
+        ------
+        ValueError
+            If `table` lacks a beam of the control file, or no R-factor can
+            be calculated.
+        '''
+        for pair in self.group._pairs():
+            for beam in pair.index.beams:
+                if beam_key(beam) not in table:
+                    raise ValueError('beam {} missing from the theoretical '
+                                     'results'.format(beam_key(beam)))
+        self.group.set_theory(table, path)
+        if self.shift is not None:
+            return self.group.optimise_shift(self.shift, method=self.method,
+                                             **self.rfactor_kwargs)[1]
+        return self.group.calculate_rfactor(self.method, 
+                                            **self.rfactor_kwargs)
+    
+    def evaluate(self, points):
+        '''
+        Returns the R-factors of a batch of trial structures.
+        
+        All CLEED calculations of the batch which are not cached are 
+        submitted to the runner at once.
+        '''
+        if not os.path.isdir(self.scratch):
+            os.makedirs(self.scratch)
+        values = np.full(len(points), self.penalty, dtype=float)
+        jobs, keys, rows = [], [], []
+        for i, x in enumerate(points):
+            self.count += 1
+            name = 'trial{:06d}'.format(self.count)
+            inp_file = os.path.join(self.scratch, name + '.inp')
+            self.write_input(x, inp_file)
+            
+            key = self._cache_key(inp_file)
+            table = self.cache.get(key) if key is not None else None
+            if table is not None:
+                os.remove(inp_file)
+                try:
+                    values[i] = self.rfactor(table)
+                except ValueError:
+                    pass  # e.g. a corrupt entry - score the penalty
+                continue
+            jobs.append(leed_job(self.runner.environment, inp_file, 
+                                 self.bul_file, name=name))
+            keys.append(key)
+            rows.append(i)
+        
+        for i, key, result in zip(rows, keys, self.runner.run(jobs)):
+            values[i] = self._result_rfactor(result, key)
+        return values
+    
+    def _cache_key(self, inp_file):
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.key(inp_file, self.bul_file)
+        except IOError:
+            return None  # e.g. missing phase shifts - leave it to CLEED
+    
+    def _result_rfactor(self, result, key=None):
+        path = result.files.get(result.job.name + '.res')
+        try:
+            if result.ok and path:
+                table = read_res(path)
+                if key is not None:
+                    self.cache.put(key, table)
+                return self.rfactor(table, path)
+        except (IOError, ValueError):
+            pass
+        finally:
+            for inp_file in result.job.inputs.values():
+                if os.path.dirname(inp_file) == self.scratch:
+                    os.remove(inp_file)
+            if (not self.runner.output_dir and result.workdir and 
+                    os.path.isdir(result.workdir)):
+                shutil.rmtree(result.workdir, ignore_errors=True)
+        return self.penalty
@@ -35,9 +35,186 @@ from model import UnitCell, SuperStructure
 from index import MillerIndex
 
 from math import cos, sin, pi, sqrt 
+from collections import OrderedDict
 import numpy as np
 
+#: record layout of the spot arrays returned by ``spot_array()`` methods
+SPOT_DTYPE = np.dtype([('x', float), ('y', float), ('h', float), ('k', float)])
+
+#: number of radii for which the spots of a domain are kept
+SPOT_CACHE_SIZE = 8
+
+
+def lattice_points(v1, v2, r_max):
+    '''
+    Returns all points ``n1*v1 + n2*v2`` of a 2D lattice within `r_max`.
+    
+    Parameters
+    ----------
+    v1, v2 : array_like
+        Lattice vectors.
+    r_max : float
+        Radius about the origin to include points from.
+    
+    Returns
+    -------
+    tuple :
+        Arrays ``(n1, n2, x, y)`` with the integer coefficients and 
+        positions of each point.
+    
+    Notes
+    -----
+    The coefficient ranges follow from Cramer's rule (``|n1| <= r_max |v2| / 
+    |v1 x v2|`` and likewise for `n2`), so the grid evaluated covers only 
+    the bounding parallelogram of the circle.
+    '''
+    v1 = np.asarray(v1, dtype=float)[:2]
+    v2 = np.asarray(v2, dtype=float)[:2]
+    area = abs(v1[0]*v2[1] - v1[1]*v2[0])
+    if area < 1e-12:
+        raise ValueError('lattice vectors must not be parallel')
+    
+    n1_max = int(r_max * sqrt(v2.dot(v2)) / area)
+    n2_max = int(r_max * sqrt(v1.dot(v1)) / area)
+    n1, n2 = np.meshgrid(np.arange(-n1_max, n1_max + 1), 
+                         np.arange(-n2_max, n2_max + 1), indexing='ij')
+    n1 = n1.ravel()
+    n2 = n2.ravel()
+    x = n1*v1[0] + n2*v2[0]
+    y = n1*v1[1] + n2*v2[1]
+    mask = x*x + y*y <= r_max*r_max * (1. + 1e-9)
+    return (n1[mask], n2[mask], x[mask], y[mask])
+
+
+def spots_to_array(x, y, h, k):
+    ''' Packs spot positions and indices into a :data:`SPOT_DTYPE` array '''
+    spots = np.empty(np.size(x), dtype=SPOT_DTYPE)
+    spots['x'] = x
+    spots['y'] = y
+    spots['h'] = h
+    spots['k'] = k
+    return spots
+
+
+def _parse_operation(op):
+    ''' Returns (kind, value) for a symmetry operation such as 'R60' or 'Sx' '''
+    op = op.lstrip().split('#')[0].rstrip().lower()
+    if op.startswith('r'):
+        try:
+            return ('r', float(op[1:]))
+        except ValueError:
+            raise ValueError('Rotation angle must be a valid number')
+    elif op.startswith('s'):
+        if op[1:2] == 'x':
+            return ('s', 1.)
+        elif op[1:2] == 'y':
+            return ('s', -1.)
+        raise ValueError("Symmetry operation must be either 'x' or 'y'")
+    raise ValueError("Operation is not recognised - use either 'R' or 'S'")
+
+
+def operation_matrices(ops, basis):
+    '''
+    Returns the matrices of several symmetry operations.
+    
+    Parameters
+    ----------
+    ops : list of str
+        Operations as used in pattern files: ``'R<angle>'`` for a rotation 
+        by angle degrees or ``'Sx'``/``'Sy'`` for a mirror in the x or y 
+        axis.
+    basis : array_like
+        Real space substrate vectors a1 and a2.
+    
+    Returns
+    -------
+    ndarray :
+        Array of shape (len(ops), 2, 2). The superstructure matrix of the 
+        domain produced from a matrix M by operation ``i`` is 
+        ``M.dot(N[i])``.
+    '''
+    parsed = [_parse_operation(op) for op in ops]
+    kinds = np.array([kind for kind, value in parsed], dtype='U1')
+    values = np.array([value for kind, value in parsed], dtype=float)
+    
+    a1, a2 = np.asarray(basis, dtype=float)[:2, :2]
+    det = a1[0]*a2[1] - a1[1]*a2[0]
+    N = np.empty((len(parsed), 2, 2), dtype=float)
+    
+    rot = kinds == 'r'
+    phi = np.radians(values[rot])
+    c, s = np.cos(phi), np.sin(phi)
+    aux = a1.dot(a2) / det
+    N[rot] = np.array([[c - aux*s, s*a1.dot(a1)/det], 
+                       [-s*a2.dot(a2)/det, c + aux*s]]).transpose(2, 0, 1)
+    
+    mirror = kinds == 's'
+    aux = (a1[0]*a2[1] + a1[1]*a2[0]) / det
+    N[mirror] = np.multiply.outer(values[mirror], 
+                                  [[aux, -2*a1[0]*a1[1]/det], 
+                                   [2*a2[0]*a2[1]/det, -aux]])
+    return N
+
+
+def operation_matrix(op, basis):
+    ''' Returns the 2x2 matrix of a single operation (see 
+    :func:`operation_matrices`) '''
+    return operation_matrices([op], basis)[0]
+
+
+def unique_domains(matrices, atol=1e-4):
+    '''
+    Returns the positions of the distinct domains within `matrices`.
+    
+    Two superstructure matrices describe the same domain (and hence the 
+    same spots) if ``M_a = U M_b`` for an integer matrix U with a 
+    determinant of +/-1. The first matrix of each equivalent group is kept.
+    '''
+    M = np.asarray(matrices, dtype=float).reshape(-1, 2, 2)
+    U = np.einsum('aij,bjk->abik', M, np.linalg.inv(M))
+    integral = np.all(np.abs(U - np.round(U)) < atol, axis=(2, 3))
+    equivalent = integral & (np.abs(np.abs(np.linalg.det(U)) - 1.) < atol)
+    
+    keep = []
+    for i in range(len(M)):
+        if not equivalent[i, keep].any():
+            keep.append(i)
+    return keep
+
+
+def generate_domains(matrix, ops, basis, unique=True):
+    '''
+    Returns the superstructure matrices of the symmetry domains of `matrix`.
+    
+    Parameters
+    ----------
+    matrix : array_like
+        2x2 superstructure matrix of the initial domain.
+    ops : list of str
+        Symmetry operations (see :func:`operation_matrices`).
+    basis : array_like
+        Real space substrate vectors a1 and a2.
+    unique : bool
+        Drop domains equivalent to an earlier one (see 
+        :func:`unique_domains`).
+    
+    Returns
+    -------
+    ndarray :
+        Array of shape (k, 2, 2) with `matrix` followed by its image under 
+        each operation.
+    '''
+    matrix = np.asarray(matrix, dtype=float)[:2, :2]
+    domains = np.concatenate(([matrix], np.einsum('ij,njk->nik', matrix, 
+                                       operation_matrices(ops, basis))))
+    if unique:
+        domains = domains[unique_domains(domains)]
+    return domains
+
+
 class Spot(MillerIndex):
+    __slots__ = ('_x', '_y')
+    
     def __init__(self, x, y, h, k):
         MillerIndex.__init__(self, h, k)
         self.x = x
@@ -65,11 +242,28 @@ class Spot(MillerIndex):
         
     def pos(self):
         return (self._x, self._y)
+    
+    @classmethod
+    def from_array(cls, spots):
+        ''' Returns a list of :class:`Spot` for a :data:`SPOT_DTYPE` array '''
+        return [cls(*spot) for spot in spots.tolist()]
 
 
 class Domain(SuperStructure):
+    '''
+    Superstructure domain of a LEED pattern.
+    
+    Notes
+    -----
+    Spots are memoised per `r_max` together with the basis, superstructure 
+    matrix and radius they were calculated for, so redrawing an unchanged 
+    pattern does not recalculate them. The cache is cleared whenever the 
+    :attr:`M`, :attr:`basis` or :attr:`radius` setters are used and is 
+    also bypassed if the matrix is modified in place.
+    '''
     def __init__(self, matrix=np.identity(2, dtype=float), 
                  pattern=None, matrix_op=None, radius=1.):
+        self._spot_cache = OrderedDict()
         SuperStructure.__init__(self, super_matrix=matrix)
         self.pattern = pattern
         if isinstance(pattern, UnitCell):
@@ -102,6 +296,47 @@ class Domain(SuperStructure):
     @radius.setter
     def radius(self, radius):
         self._radius = float(radius) 
+        self.clear_spot_cache()
+    
+    @property
+    def M(self):
+        return SuperStructure.M.fget(self)
+    
+    @M.setter
+    def M(self, matrix):
+        SuperStructure.M.fset(self, matrix)
+        self.clear_spot_cache()
+    
+    @property
+    def basis(self):
+        return SuperStructure.basis.fget(self)
+    
+    @basis.setter
+    def basis(self, basis):
+        SuperStructure.basis.fset(self, basis)
+        self.clear_spot_cache()
+    
+    def clear_spot_cache(self):
+        ''' Discards all memoised spots of the domain '''
+        self._spot_cache = OrderedDict()
+    
+    def _spot_key(self, r_max):
+        return (float(r_max), self.radius, 
+                tuple(np.asarray(self.basis, dtype=float)[:2, :2].flatten()),
+                tuple(np.asarray(self.M, dtype=float).flatten()[:4]))
+    
+    def _cached_spots(self, r_max):
+        ''' Returns the [key, spot array, Spot list] cache entry for r_max '''
+        key = self._spot_key(r_max)
+        entry = self._spot_cache.pop(key[0], None)
+        if entry is None or entry[0] != key:
+            spots = self._calculate_spot_array(r_max)
+            spots.flags.writeable = False
+            entry = [key, spots, None]
+        self._spot_cache[key[0]] = entry
+        while len(self._spot_cache) > SPOT_CACHE_SIZE:
+            self._spot_cache.popitem(last=False)
+        return entry
 
     @property
     def commensurate(self):
@@ -111,135 +346,83 @@ class Domain(SuperStructure):
                      (abs(self.m22) - int(abs(self.m22) + 0.1) > 0.05) ) )
 
     def do_operation(self, op):
-        op = op.lstrip().split('#')[0].rstrip().lower()
-        value = float(op[1:])
-        M11, M12, M21, M22 = list(self.M[0] + self.M[1])
-        m11, m12, m21, m22 = list(self.M[0] + self.M[1])
-        if op[0] == 'r':
-            det = a1[0]*a2[1] - a1[1]*a2[0]
-            aux2 = (a1[0]*a2[0] + a1[1]*a2[1]) / det
-
-            N11 =  cos(phi) - aux2*sin(phi)
-            N12 =  sin(phi) * (a1[0]*a1[0] + a1[1]*a1[1]) / det
-            N21 = -sin(phi) * (a2[0]*a2[0] + a2[1]*a2[1]) / det
-            N22 =  cos(phi) + aux2*sin(phi)
-    
-            m11 = M11*N11 + M12*N21
-            m12 = M11*N12 + M12*N22
-            m21 = M21*N11 + M22*N21
-            m22 = M21*N12 + M22*N22
-    
-            M11 = m11 
-            M12 = m12 
-            M21 = m21 
-            M22 = m22
-
-        elif op[0] == 's':
-            det = a1[0]*a2[1] - a1[1]*a2[0]
-            aux2 = (a1[0]*a2[1] + a1[1]*a2[0]) / det
-
-            if line[1] == 'x':
-                N11 = aux2
-                N12 = -2 * a1[0]*a1[1] / det
-                N21 =  2 * a2[0]*a2[1] / det
-                N22 = -aux2
-            elif line[1] == 'y':
-                N11 = -aux2
-                N12 =  2 * a1[0]*a1[1] / det
-                N21 = -2 * a2[0]*a2[1] / det
-                N22 = aux2
-            else:
-                raise ValueError("Symmetry operation must be either 'x' or 'y'")
-
-            m11 = M11*N11 + M12*N21
-            m12 = M11*N12 + M12*N22
-            m21 = M21*N11 + M22*N21
-            m22 = M21*N12 + M22*N22
-
-            M11 = m11 
-            M12 = m12 
-            M21 = m21 
-            M22 = m22
-        else:
-            ValueError("Operation is not recognised - use either 'R' or 'S'")
-        
-        self.M = [[m11, m12], [m21, m22]]    
-        
+        ''' Applies the symmetry operation `op` (e.g. 'R90' or 'Sx') '''
+        self.M = np.dot(np.asarray(self.M, dtype=float)[:2, :2], 
+                        operation_matrix(op, self.basis))
         return self.M
     
-    def calculate_spots(self, r_max=10.):
-        pat = self
-        spots = []
-        
-        radius = self.radius
-        
-        # scale spot sizes by radius 
-        if (pat.basis[0][0]*pat.basis[0][0] + pat.basis[0][1]*pat.basis[0][1] > 
-            pat.basis[1][0]*pat.basis[1][0] + pat.basis[1][1]*pat.basis[0][1]):
-            radius *= sqrt(pat.basis[0][0]*pat.basis[0][0] + 
-                           pat.basis[0][1]*pat.basis[0][1])
-        else:
-            radius *= sqrt(pat.basis[1][0]*pat.basis[1][0] + 
-                           pat.basis[1][1]*pat.basis[1][1])
-  
+    def reciprocal_vectors(self, r_max=10.):
+        '''
+        Returns the substrate reciprocal lattice vectors (a1*, a2*), scaled 
+        so that `r_max` corresponds to :attr:`radius` times the longest of 
+        them.
+        '''
+        basis = np.asarray(self.basis, dtype=float)[:2, :2]
+        radius = self.radius * sqrt(max(basis[0].dot(basis[0]), 
+                                        basis[1].dot(basis[1])))
         radius = r_max / radius
-
-        # calculate GS vectors
-        a1 = (radius*pat.basis[1][1], -radius*pat.basis[1][0])
-        a2 = (-radius*pat.basis[0][1], radius*pat.basis[0][0])
-        
-        # define max. values */
-        h_max = 5 * int( r_max / sqrt(a1[0]*a1[0] + a1[1]*a1[1]) )
-        k_max = 5 * int( r_max / sqrt(a2[0]*a2[0] + a2[1]*a2[1]) )
-        
-        # SUPERSTRUCTURE SPOTS
-           
-        # set local superstructure matrix elements
-        m11, m12, m21, m22 = np.array(self.M).flatten()
+        a1 = radius * np.array((basis[1][1], -basis[1][0]))
+        a2 = radius * np.array((-basis[0][1], basis[0][0]))
+        return (a1, a2)
+    
+    def spot_array(self, r_max=10.):
+        '''
+        Returns the superstructure spots of the domain within `r_max`.
         
-        # determinant of matrix
-        det  = m11*m22 - m12*m21
-        aux1 = 1./det
-        det = abs(det)
+        Returns
+        -------
+        ndarray :
+            Read-only structured array of :data:`SPOT_DTYPE` with the 
+            position and (fractional) Miller index of each spot.
+            
+        Notes
+        -----
+        For incommensurate superstructures the multiple scattering spots 
+        about every substrate spot are included as well.
+        '''
+        return self._cached_spots(r_max)[1]
+    
+    def _calculate_spot_array(self, r_max):
+        a1, a2 = self.reciprocal_vectors(r_max)
         
-        # calculate SS vectors 
-        b1 = (aux1 *(m22*a1[0] - m21*a2[0]), aux1 *(m22*a1[1] - m21*a2[1]))
-        b2 = (aux1 *(m11*a2[0] - m12*a1[0]), aux1 *(m11*a2[1] - m12*a1[1]))
-           
-        # define max. values 
-        smax_1 = 5 * int(r_max / sqrt(b1[0]*b1[0] + b1[1]*b1[1]))
-        smax_2 = 5 * int(r_max / sqrt(b2[0]*b2[0] + b2[1]*b2[1]))
+        # superstructure reciprocal vectors from the inverse matrix
+        m11, m12, m21, m22 = np.array(self.M, dtype=float).flatten()[:4]
+        det = m11*m22 - m12*m21
+        b1 = (m22*a1 - m21*a2) / det
+        b2 = (m11*a2 - m12*a1) / det
         
-        # determine number of spots */
         if self.commensurate:
-            for s1 in range(-smax_1, smax_1):
-                for s2 in range(-smax_2, smax_2):
-                    x, y = (s1*b1[0] + s2*b2[0], s1*b1[1] + s2*b2[1])
-                    h, k = (s1*m22 - s2*m12, s2*m11 - s1*m21)
-                    if (x*x + y*y) <= r_max**2: 
-                      spots.append(Spot(x, y, h, k))
-             
+            s1, s2, x, y = lattice_points(b1, b2, r_max)
+            h = (s1*m22 - s2*m12) / det
+            k = (s2*m11 - s1*m21) / det
         else:
-            # If the Mii are not integer, the superstructure is incommensurate.
-            # In this case the multiple scattering spots must be calculated
-            # separately.
-
-            # add multiple scattering SS spots to list */
-            for h in range(-h_max, h_max+1):
-              for k in range(-k_max, k_max+1):
-                  if h != 0 or k != 0:
-                      xi = h*a1[0] + k*a2[0]
-                      yi = h*a1[1] + k*a2[1]
-                  
-                  if (xi*xi + yi*yi) <= r_max: 
-                    for s1 in range(-smax_1, smax_1):
-                      for s2 in range(-smax_2, smax_2):
-                          x = xi + s1*b1[0] + s2*b2[0]
-                          y = yi + s1*b1[1] + s2*b2[1]
-                      
-                          if (x*x + y*y) <= r_max**2 and (s1 != 0 or s2 != 0):
-                              spots.append(Spot(x, y, h, k))
-        return spots
+            # multiple scattering spots (s1, s2) != 0 about each substrate 
+            # spot (h, k); they can only lie within r_max if |s| <= 2 r_max
+            h0, k0, x0, y0 = lattice_points(a1, a2, r_max)
+            s1, s2, xs, ys = lattice_points(b1, b2, 2.*r_max)
+            keep = (s1 != 0) | (s2 != 0)
+            s1, s2, xs, ys = s1[keep], s2[keep], xs[keep], ys[keep]
+            x = np.add.outer(x0, xs).ravel()
+            y = np.add.outer(y0, ys).ravel()
+            h = np.add.outer(h0, (s1*m22 - s2*m12) / det).ravel()
+            k = np.add.outer(k0, (s2*m11 - s1*m21) / det).ravel()
+            mask = x*x + y*y <= r_max*r_max * (1. + 1e-9)
+            x, y, h, k = x[mask], y[mask], h[mask], k[mask]
+            
+            # different (h, k) + s can reach the same spot: keep it once
+            _, first = np.unique(np.round(np.column_stack((h, k)), 6), 
+                                 axis=0, return_index=True)
+            first.sort()
+            x, y, h, k = x[first], y[first], h[first], k[first]
+            
+        return spots_to_array(x, y, h, k)
+    
+    def calculate_spots(self, r_max=10.):
+        ''' Returns a list of :class:`Spot` for :meth:`spot_array` '''
+        entry = self._cached_spots(r_max)
+        if entry[2] is None:
+            entry[2] = Spot.from_array(entry[1])
+        return list(entry[2])
 
 
 class Pattern(Domain):
@@ -281,14 +464,6 @@ class Pattern(Domain):
     def title(self, title):
         self._title = str(title)
         
-    @property
-    def basis(self):
-        return UnitCell.basis
-    
-    @basis.setter
-    def basis(self, basis):
-        UnitCell.basis = basis
-    
     @property
     def domains(self):
         return self._domains
@@ -308,8 +483,31 @@ class Pattern(Domain):
         elif isinstance(domain, Domain):
             return self._domains.pop(self._domains.index(domain))
     
+    def add_symmetry_domains(self, matrix, ops, unique=True):
+        '''
+        Adds the domain of `matrix` and its images under each symmetry 
+        operation in `ops` (see :func:`generate_domains`).
+        
+        Returns
+        -------
+        list :
+            The new :class:`Domain` instances.
+        '''
+        domains = [Domain(matrix=m, pattern=self) 
+                   for m in generate_domains(matrix, ops, self.basis, unique)]
+        self._domains.extend(domains)
+        return domains
+    
+    def spot_arrays(self, r_max=10.):
+        '''
+        Returns the spot arrays of the substrate followed by those of each 
+        domain (see :meth:`Domain.spot_array`).
+        '''
+        return ([self.spot_array(r_max)] + 
+                [domain.spot_array(r_max) for domain in self.domains])
+    
     @classmethod
-    def read(cls, filename):
+    def read(cls, filename, unique=True):
         '''
         Returns a :class:`Pattern` instance read from file
         
@@ -317,6 +515,9 @@ class Pattern(Domain):
         ----------
         filename : str
             Path to read from.
+        unique : bool
+            Drop domains equivalent to an earlier one, which give identical 
+            spots (see :func:`unique_domains`).
             
         Returns
         -------
@@ -326,7 +527,7 @@ class Pattern(Domain):
         lines = []
         with open(filename, 'r') as f:
             lines = [line.split('#')[0].lstrip().rstrip() for line in f 
-                     if not line.lstrip().startswith('#') and line != '']
+                     if not line.lstrip().startswith('#') and line.strip()]
   
         pat = Pattern()
   
@@ -346,123 +547,76 @@ class Pattern(Domain):
         # rescale spot size
         pat.radius = float(lines.pop(0).split()[0])
 
-        # Domains   
+        # Domains: a matrix or a symmetry operation applied to the previous 
+        # domain
         n_domains = abs(int(lines.pop(0).split()[0]))
-        M11, M12, M21, M22 = (1., 0., 0., 1.)
+        entries = []
         for i in range(n_domains):
             line = lines.pop(0).lower()
-            if line.startswith('r'):
-                try:
-                    phi = float(line[1:]) * pi / 180.
-                except ValueError:
-                    raise ValueError('Rotation angle must be a valid number')
-                    continue
-                det = a1[0]*a2[1] - a1[1]*a2[0]
-                aux2 = (a1[0]*a2[0] + a1[1]*a2[1]) / det
-
-                N11 =  cos(phi) - aux2*sin(phi)
-                N12 =  sin(phi) * (a1[0]*a1[0] + a1[1]*a1[1]) / det
-                N21 = -sin(phi) * (a2[0]*a2[0] + a2[1]*a2[1]) / det
-                N22 =  cos(phi) + aux2*sin(phi)
-        
-                m11 = M11*N11 + M12*N21
-                m12 = M11*N12 + M12*N22
-                m21 = M21*N11 + M22*N21
-                m22 = M21*N12 + M22*N22
-        
-                M11 = m11 
-                M12 = m12 
-                M21 = m21 
-                M22 = m22
-
-            elif line.startswith('s'):
-                det = a1[0]*a2[1] - a1[1]*a2[0]
-                aux2 = (a1[0]*a2[1] + a1[1]*a2[0]) / det
-
-                if line[1] == 'x':
-                    N11 = aux2
-                    N12 = -2 * a1[0]*a1[1] / det
-                    N21 =  2 * a2[0]*a2[1] / det
-                    N22 = -aux2
-                elif line[1] == 'y':
-                    N11 = -aux2
-                    N12 =  2 * a1[0]*a1[1] / det
-                    N21 = -2 * a2[0]*a2[1] / det
-                    N22 = aux2
-                else:
-                    raise ValueError("Symmetry operation must be either 'x' or 'y'")
-                    continue
-
-                m11 = M11*N11 + M12*N21
-                m12 = M11*N12 + M12*N22
-                m21 = M21*N11 + M22*N21
-                m22 = M21*N12 + M22*N22
-
-                M11 = m11 
-                M12 = m12 
-                M21 = m21 
-                M22 = m22
-
+            if line.startswith('r') or line.startswith('s'):
+                entries.append(line)
             else:
                 try:
                     M11, M12 = [float(m) for m in line.split()[:2]]
                     M21, M22 = [float(m) for m in lines.pop(0).split()[:2]]
                 except ValueError:
                     raise ValueError('a1 and a2 must contain valid numbers')
-                    continue
                 except IndexError:
                     raise IndexError('a1 and a2 must have 2 components')
-
-                m11 = M11
-                m12 = M12
-                m21 = M21
-                m22 = M22
-                        
-                N11 = N22 = 1. 
-                N12 = N21 = 0.
-                
-            # add superstructure matrix
-            pat.domains.append(Domain(matrix=[[m11, m12], [m21, m22]], 
-                                      pattern=pat))
+                entries.append(np.array([[M11, M12], [M21, M22]]))
             if len(lines) == 0:
                 break
-  
-        return pat
-    
-    def calculate_spots(self, r_max=10.):
-        spots = []
-        pat = self
         
-        radius = self.radius
+        ops = [entry for entry in entries if not isinstance(entry, np.ndarray)]
+        N = iter(operation_matrices(ops, pat.basis))
+        matrices = []
+        matrix = np.identity(2)
+        for entry in entries:
+            if isinstance(entry, np.ndarray):
+                matrix = entry
+            else:
+                matrix = matrix.dot(next(N))
+            matrices.append(matrix)
         
-        # scale spot sizes by radius 
-        if (pat.basis[0][0]*pat.basis[0][0] + pat.basis[0][1]*pat.basis[0][1] > 
-            pat.basis[1][0]*pat.basis[1][0] + pat.basis[1][1]*pat.basis[0][1]):
-            radius *= sqrt(pat.basis[0][0]*pat.basis[0][0] + 
-                           pat.basis[0][1]*pat.basis[0][1])
-        else:
-            radius *= sqrt(pat.basis[1][0]*pat.basis[1][0] + 
-                           pat.basis[1][1]*pat.basis[1][1])
+        if unique and matrices:
+            matrices = [matrices[i] for i in unique_domains(matrices)]
+        pat.domains = [Domain(matrix=matrix, pattern=pat) 
+                       for matrix in matrices]
   
-        radius = r_max / radius
+        return pat
+    
+    def spot_array(self, r_max=10.):
+        '''
+        Returns the substrate spots of the pattern within `r_max` as a 
+        read-only structured array of :data:`SPOT_DTYPE`.
+        '''
+        return self._cached_spots(r_max)[1]
+    
+    def _calculate_spot_array(self, r_max):
+        a1, a2 = self.reciprocal_vectors(r_max)
+        h, k, x, y = lattice_points(a1, a2, r_max)
+        return spots_to_array(x, y, h, k)
 
-        # calculate GS vectors
-        a1 = (radius*pat.basis[1][1], -radius*pat.basis[1][0])
-        a2 = (-radius*pat.basis[0][1], radius*pat.basis[0][0])
-     
-        # define max. values
-        h_max = 5 * (int)( r_max / sqrt(a1[0]*a1[0] + a1[1]*a1[1]) )
-        k_max = 5 * (int)( r_max / sqrt(a2[0]*a2[0] + a2[1]*a2[1]) )
-      
-        # calculate substrate spots
-        for h in range(-h_max, h_max+1):
-            for k in range(-k_max, k_max+1):
-              xi = h * a1[0] + k * a2[0]
-              yi = h * a1[1] + k * a2[1]
-              if (xi*xi + yi*yi) <= r_max**2:
-                  spots.append(Spot(xi, yi, h, k))
-  
-        return spots
+
+def reduce_fractions(numerators, denominators):
+    '''
+    Returns the fractions numerators/denominators in lowest terms.
+    
+    Parameters
+    ----------
+    numerators, denominators : array_like of int
+        Fractions to reduce; the denominators must not be zero.
+    
+    Returns
+    -------
+    tuple :
+        Integer arrays ``(numerators, denominators)`` with positive 
+        denominators.
+    '''
+    numerators = np.asarray(numerators, dtype=np.int64)
+    denominators = np.asarray(denominators, dtype=np.int64)
+    divisor = np.gcd(numerators, denominators) * np.sign(denominators)
+    return (numerators // divisor, denominators // divisor)
 
 
 def is_fraction(numerator, denominator):
@@ -477,25 +631,83 @@ def is_fraction(numerator, denominator):
     '''
     if numerator == 0:
         return -1
+    numerator, denominator = reduce_fractions(numerator, denominator)
+    return 0 if denominator == 1 else 1
+
+
+#: labels of already formatted (numerator, denominator) pairs
+_FRACTION_LABELS = {}
+_FRACTION_LABELS_MAXSIZE = 4096
 
-    if denominator < 0:
-        number = -denominator/2;
-    else:
-        number = denominator/2;
 
-    ggt = 1
-    for i in range(2, number+1):
-        if (numerator % i == 0) and (denominator % i == 0): 
-            ggt = i
+def _fraction_label(numerator, denominator):
+    key = (numerator, denominator)
+    try:
+        return _FRACTION_LABELS[key]
+    except KeyError:
+        if len(_FRACTION_LABELS) >= _FRACTION_LABELS_MAXSIZE:
+            _FRACTION_LABELS.clear()
+        label = ('{}'.format(numerator) if denominator == 1 else 
+                 '{}/{}'.format(numerator, denominator))
+        _FRACTION_LABELS[key] = label
+        return label
 
-    numerator /= ggt
-    denominator /= ggt
 
-    if numerator % denominator == 0:
-        numerator /= denominator
-        return 0
-    else:
-        return 1
+def fraction_labels(values, max_denominator=12, atol=1e-3):
+    '''
+    Returns reduced rational labels (e.g. '-2/3') for an array of values.
+    
+    Parameters
+    ----------
+    values : array_like
+        Fractional indices to label.
+    max_denominator : int
+        Largest denominator tried; values which are not a fraction with a
+        denominator up to this are labelled with three decimals.
+    atol : float
+        Tolerance when matching values to fractions.
+    
+    Returns
+    -------
+    ndarray :
+        Array of label strings with the shape of `values`.
+    
+    Notes
+    -----
+    The smallest matching denominator of all values is found at once and 
+    only the distinct fractions are formatted (through a label cache), so 
+    labelling thousands of spots costs little more than labelling a few.
+    '''
+    values = np.asarray(values, dtype=float)
+    flat = values.ravel()
+    denominators = np.arange(1, int(max_denominator) + 1)
+    scaled = np.multiply.outer(flat, denominators)
+    matches = np.abs(scaled - np.round(scaled)) < atol * denominators
+    exact = matches.any(axis=1)
+    denominator = denominators[np.argmax(matches, axis=1)]
+    numerator = np.round(flat * denominator).astype(np.int64)
+    numerator, denominator = reduce_fractions(numerator, denominator)
+    numerator[~exact] = 0
+    denominator[~exact] = 0
+    
+    # encode each (numerator, denominator) pair as one integer key
+    base = int(max_denominator) + 1
+    keys, inverse = np.unique(numerator * base + denominator, 
+                              return_inverse=True)
+    labels = np.array([_fraction_label(*divmod(key, base)) 
+                       for key in keys.tolist()], dtype=object)
+    labels = labels[np.ravel(inverse)]
+    for i in np.flatnonzero(~exact):
+        labels[i] = '{:.3f}'.format(flat[i])
+    return labels.reshape(values.shape)
+
+
+def spot_labels(spots, max_denominator=12):
+    ''' Returns 'h,k' labels for a :data:`SPOT_DTYPE` array of spots '''
+    h = fraction_labels(spots['h'], max_denominator)
+    k = fraction_labels(spots['k'], max_denominator)
+    return np.array([hi + ',' + ki for hi, ki in zip(h.tolist(), k.tolist())],
+                    dtype=object)
     
 if __name__ == '__main__':
     filename = r"C:\\Users\\kss07698\\Dropbox\\Windows Tweaks\\CLEED_tools_win32\\cleed\\src\\CLEED\\examples\\patt\\bcc100.2x1_1.patt"
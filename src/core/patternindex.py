@@ -0,0 +1,254 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**patternindex.py** - searchable index of the LEED patterns of all 
+superstructures of a substrate.
+
+Every integer superstructure matrix up to a maximum determinant is 
+enumerated once (in Hermite normal form, so each superlattice appears a 
+single time), its pattern reduced to a fingerprint of spot counts in 
+(radius, angle) bins and the fingerprints stored in a KD-tree. Observed patterns are then matched by a 
+nearest-neighbour query, e.g.::
+
+    index = SuperstructureIndex(basis, max_det=12, ops=['R90', 'R180'])
+    for distance, matrix in index.query(observed_pattern, k=3):
+        print(distance, matrix.tolist())
+
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import numpy as np
+
+from pattern import Pattern, generate_domains
+
+
+def hermite_matrices(max_det, min_det=1):
+    '''
+    Returns all integer superstructure matrices with min_det <= det <= max_det
+    in Hermite normal form.
+    
+    Notes
+    -----
+    Matrices ``M`` and ``U M`` (with U an integer matrix of determinant 
+    +/-1) describe the same superlattice. Each superlattice has exactly one
+    upper triangular form ``[[a, b], [0, c]]`` with ``a, c > 0`` and 
+    ``0 <= b < c``, so the number of matrices of determinant n is the sum 
+    of the divisors of n.
+    
+    Returns
+    -------
+    ndarray :
+        Array of shape (n_matrices, 2, 2) ordered by determinant.
+    '''
+    matrices = []
+    for det in range(max(1, int(min_det)), int(max_det) + 1):
+        for a in range(1, det + 1):
+            if det % a:
+                continue
+            c = det // a
+            for b in range(c):
+                matrices.append(((a, b), (0, c)))
+    return np.array(matrices, dtype=float).reshape(-1, 2, 2)
+
+
+def fingerprint(pattern, n_bins=32, n_angles=24):
+    '''
+    Returns the fingerprint of all spots of `pattern`.
+    
+    Parameters
+    ----------
+    pattern : Pattern
+        Pattern including its superstructure domains.
+    n_bins : int
+        Number of radial bins.
+    n_angles : int
+        Number of angular bins.
+    
+    Returns
+    -------
+    ndarray :
+        The number of distinct spots in each (radius, angle) bin of the 
+        pattern area (``r_max = 1``) divided by the number of substrate 
+        spots, see :func:`fingerprint_spots`.
+    '''
+    spots = np.concatenate(pattern.spot_arrays(1.))
+    return fingerprint_spots(spots['x'], spots['y'], 
+                             len(pattern.spot_array(1.)), n_bins, n_angles)
+
+
+def fingerprint_spots(x, y, n_substrate, n_bins=32, n_angles=24):
+    '''
+    Returns the fingerprint of spots at positions (x, y).
+    
+    Parameters
+    ----------
+    x, y : array_like
+        Spot positions scaled to a unit pattern radius, including the 
+        substrate spots. Coinciding spots are counted once.
+    n_substrate : int
+        Number of substrate spots within the unit radius, which normalises
+        the fingerprint so that it depends on the spot density rather than 
+        on the size of the pattern.
+    n_bins : int
+        Number of radial bins.
+    n_angles : int
+        Number of angular bins over 180 degrees, centred on multiples of 
+        ``180 / n_angles`` degrees so that spots on the lattice directions
+        do not straddle bin edges.
+    
+    Returns
+    -------
+    ndarray :
+        Flattened (n_bins, n_angles) histogram. Patterns are symmetric 
+        under inversion, so angles are taken modulo 180 degrees; the 
+        angular bins distinguish rotated superstructures (e.g. p(2x1) and
+        p(1x2)) which share the same radial distribution.
+    '''
+    xy = np.unique(np.round(np.column_stack((x, y)), 6), axis=0)
+    r = np.hypot(xy[:, 0], xy[:, 1])
+    half_bin = np.pi / n_angles / 2.
+    theta = np.mod(np.arctan2(xy[:, 1], xy[:, 0]) + half_bin, np.pi)
+    inside = r <= 1.
+    counts = np.histogram2d(r[inside], theta[inside], bins=(n_bins, n_angles),
+                            range=((0., 1.), (0., np.pi)))[0]
+    return counts.ravel() / float(max(n_substrate, 1))
+
+
+class SuperstructureIndex(object):
+    '''
+    Nearest-pattern index over all superstructures of a substrate.
+    
+    Parameters
+    ----------
+    basis : array_like
+        Real space substrate vectors a1 and a2.
+    max_det : int
+        Largest superstructure determinant (unit cell area) to include.
+    ops : list of str, optional
+        Symmetry operations (e.g. ``['R90', 'R180', 'R270']``) generating 
+        the domains present in each pattern; see 
+        :func:`pattern.generate_domains`. Superstructures which are a 
+        domain of an earlier one are skipped.
+    radius : float
+        Pattern radius in units of the longest substrate reciprocal lattice
+        vector.
+    n_bins, n_angles : int
+        Number of radial and angular bins of the fingerprints.
+    
+    Attributes
+    ----------
+    matrices : ndarray
+        The (n, 2, 2) superstructure matrices indexed.
+    fingerprints : ndarray
+        The (n, n_bins * n_angles) fingerprint of each matrix.
+    '''
+    def __init__(self, basis, max_det=6, ops=(), radius=3., n_bins=32, 
+                 n_angles=24):
+        from scipy.spatial import cKDTree
+        
+        self.basis = np.asarray(basis, dtype=float)[:2, :2]
+        self.ops = list(ops)
+        self.radius = float(radius)
+        self.n_bins = int(n_bins)
+        self.n_angles = int(n_angles)
+        
+        matrices = []
+        fingerprints = []
+        inverses = np.empty((0, 2, 2))
+        for matrix in hermite_matrices(max_det):
+            if self._equivalent(matrix, inverses):
+                continue
+            pattern = self.pattern(matrix)
+            domains = np.array([np.asarray(domain.M, dtype=float)[:2, :2]
+                                for domain in pattern.domains])
+            inverses = np.concatenate((inverses, np.linalg.inv(domains)))
+            matrices.append(matrix)
+            fingerprints.append(fingerprint(pattern, self.n_bins, 
+                                            self.n_angles))
+        
+        self.matrices = np.array(matrices).reshape(-1, 2, 2)
+        self.fingerprints = np.array(fingerprints).reshape(
+                                        -1, self.n_bins * self.n_angles)
+        self.tree = cKDTree(self.fingerprints)
+    
+    def __len__(self):
+        return len(self.matrices)
+    
+    @staticmethod
+    def _equivalent(matrix, inverses, atol=1e-4):
+        ''' Returns True if `matrix` equals U M for any M of `inverses` '''
+        if not len(inverses):
+            return False
+        U = np.einsum('ij,njk->nik', matrix, inverses)
+        integral = np.all(np.abs(U - np.round(U)) < atol, axis=(1, 2))
+        unimodular = np.abs(np.abs(np.linalg.det(U)) - 1.) < atol
+        return bool(np.any(integral & unimodular))
+    
+    def pattern(self, matrix):
+        ''' Returns the :class:`pattern.Pattern` of a superstructure matrix '''
+        pattern = Pattern(radius=self.radius)
+        pattern.basis = self.basis.tolist()
+        pattern.add_symmetry_domains(matrix, self.ops)
+        return pattern
+    
+    def query(self, observed, k=5):
+        '''
+        Returns the superstructures whose patterns best match `observed`.
+        
+        Parameters
+        ----------
+        observed : Pattern or array_like
+            Either a pattern, or an (n, 2) array of observed spot positions 
+            scaled as in :meth:`Pattern.spot_array` with ``r_max = 1`` for 
+            this index's basis and radius.
+        k : int
+            Number of candidates to return.
+        
+        Returns
+        -------
+        list :
+            ``(distance, matrix)`` tuples, closest first.
+        '''
+        if isinstance(observed, Pattern):
+            vector = fingerprint(observed, self.n_bins, self.n_angles)
+        else:
+            xy = np.asarray(observed, dtype=float).reshape(-1, 2)
+            substrate = Pattern(radius=self.radius)
+            substrate.basis = self.basis.tolist()
+            vector = fingerprint_spots(xy[:, 0], xy[:, 1], 
+                                       len(substrate.spot_array(1.)), 
+                                       self.n_bins, self.n_angles)
+        
+        k = min(int(k), len(self))
+        distances, rows = self.tree.query(vector, k=k)
+        distances = np.atleast_1d(distances)
+        rows = np.atleast_1d(rows)
+        return [(float(distance), self.matrices[row]) 
+                for distance, row in zip(distances, rows)]
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# encoding: utf-8
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**render.py** - headless rendering of LEED patterns to image files.
+
+Patterns read from CLEED ``*.patt`` files are drawn with matplotlib's Agg
+canvas, so no Qt application (or display) is needed. Many files are
+rendered concurrently with a process pool, e.g.::
+
+    python src/core/render.py -o atlas -f svg -j 8 patterns/
+
+The script imports its sibling core modules, so it is run from the source
+tree rather than installed as a standalone script.
+
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import sys
+from glob import glob
+
+import numpy as np
+
+from pattern import Pattern, spot_labels
+
+#: output formats supported on the command line
+FORMATS = ('png', 'svg', 'pdf')
+
+#: colours cycled through for the superstructure domains
+DOMAIN_COLORS = ('#d62728', '#1f77b4', '#2ca02c', '#ff7f0e', '#9467bd', 
+                 '#8c564b', '#e377c2', '#17becf', '#bcbd22', '#7f7f7f')
+
+
+def render_pattern(pattern, filename, r_max=10., size=6., dpi=100, 
+                   labels=False, spot_size=20.):
+    '''
+    Draws a LEED pattern to an image file.
+    
+    Parameters
+    ----------
+    pattern : Pattern
+        The pattern to draw.
+    filename : str
+        Output file; its extension selects the format (e.g. png or svg).
+    r_max : float
+        Radius of the drawn area in spot coordinates.
+    size : float
+        Width and height of the image in inches.
+    dpi : int
+        Resolution of raster images.
+    labels : bool
+        Annotate each spot with its Miller index.
+    spot_size : float
+        Marker area of the substrate spots (in points^2); superstructure 
+        spots are drawn at half this size.
+    '''
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    fig = Figure(figsize=(size, size), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes((0., 0., 1., 1.))
+    ax.set_xlim(-r_max, r_max)
+    ax.set_ylim(-r_max, r_max)
+    ax.set_aspect('equal')
+    ax.set_axis_off()
+    
+    substrate = pattern.spot_array(r_max)
+    groups = [(substrate, 'k', spot_size, 3)]
+    for i, domain in enumerate(pattern.domains):
+        groups.append((domain.spot_array(r_max), 
+                       DOMAIN_COLORS[i % len(DOMAIN_COLORS)], spot_size / 2., 
+                       2))
+    
+    drawn = set()
+    for spots, color, area, zorder in groups:
+        ax.scatter(spots['x'], spots['y'], s=area, c=color, 
+                   edgecolors='none', zorder=zorder)
+        if labels:
+            for (x, y), label in zip(spots[['x', 'y']].tolist(), 
+                                     spot_labels(spots)):
+                position = (round(x, 6), round(y, 6))
+                if position not in drawn:
+                    drawn.add(position)
+                    ax.annotate(label, (x, y), color=color,
+                                fontsize=6, xytext=(2, 2), 
+                                textcoords='offset points')
+    
+    title = getattr(pattern, 'title', '').strip()
+    if title:
+        ax.text(0.01, 0.99, title, transform=ax.transAxes, 
+                va='top', ha='left', fontsize=8)
+    fig.savefig(filename)
+    return filename
+
+
+def _render_file(task):
+    ''' worker returning (i, (input, output, error)) for one pattern file '''
+    i, path, filename, options = task
+    try:
+        render_pattern(Pattern.read(path), filename, **options)
+        return i, (path, filename, None)
+    except Exception as err:
+        return i, (path, filename, 
+                   '{}: {}'.format(err.__class__.__name__, err))
+
+
+def output_filenames(paths, output_dir=None, fmt='png'):
+    '''
+    Returns an image filename for each of `paths`.
+    
+    Images are written to `output_dir` (or next to each input) with the 
+    input's basename; where two inputs would give the same image, e.g. 
+    ``a/x.patt`` and ``b/x.patt`` with a common `output_dir`, later ones 
+    get a numbered suffix (``x-2.png``) rather than overwriting the first.
+    '''
+    filenames = []
+    used = set()
+    for path in paths:
+        directory = output_dir or os.path.dirname(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        filename = os.path.join(directory, name + '.' + fmt)
+        n = 1
+        while os.path.normcase(os.path.abspath(filename)) in used:
+            n += 1
+            filename = os.path.join(directory, 
+                                    '{}-{}.{}'.format(name, n, fmt))
+        used.add(os.path.normcase(os.path.abspath(filename)))
+        filenames.append(filename)
+    return filenames
+
+
+def find_patterns(paths, pattern='*.patt'):
+    '''
+    Returns the pattern files in `paths`, expanding any directories and 
+    dropping files already listed.
+    '''
+    files = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(glob(os.path.join(path, pattern)))
+        else:
+            found = [path]
+        for filename in found:
+            key = os.path.normcase(os.path.abspath(filename))
+            if key not in seen:
+                seen.add(key)
+                files.append(filename)
+    return files
+
+
+def render_files(paths, output_dir=None, fmt='png', processes=None, 
+                 progress=None, **options):
+    '''
+    Renders many pattern files concurrently.
+    
+    Parameters
+    ----------
+    paths : list of str
+        Pattern files to render.
+    output_dir : str, optional
+        Directory for the images; defaults to the directory of each file. 
+        Clashing image names are made unique (see :func:`output_filenames`).
+    fmt : str
+        Image format and file extension.
+    processes : int, optional
+        Number of worker processes; defaults to the number of CPUs. With a 
+        single process the files are rendered in the calling process.
+    progress : callable, optional
+        Called as ``progress(n_done, n_total, path, filename, error)`` as 
+        each file is finished (in order of completion).
+    **options :
+        Passed to :func:`render_pattern`.
+    
+    Returns
+    -------
+    list :
+        ``(path, filename, error)`` tuples in the order of `paths` (one per 
+        entry, even if a path is repeated), where `error` is None if the 
+        file was rendered successfully.
+    '''
+    from multiprocessing import Pool, cpu_count
+    
+    tasks = [(i, path, filename, options) for i, (path, filename) in 
+             enumerate(zip(paths, output_filenames(paths, output_dir, fmt)))]
+    
+    processes = min(processes or cpu_count(), len(tasks))
+    if processes <= 1:
+        pool = None
+        results = (_render_file(task) for task in tasks)
+    else:
+        pool = Pool(processes)
+        results = pool.imap_unordered(_render_file, tasks)
+    
+    done = [None] * len(tasks)
+    try:
+        for n_done, (i, result) in enumerate(results, 1):
+            done[i] = result
+            if progress is not None:
+                progress(n_done, len(tasks), *result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return done
+
+
+def main(argv=None):
+    '''command line interface for batch rendering of pattern files'''
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Render LEED pattern '
+                                     '(*.patt) files to image files.')
+    parser.add_argument('inputs', nargs='+', 
+                        help='pattern files or directories of *.patt files')
+    parser.add_argument('-o', '--output', default=None,
+                        help='output directory (default: next to each input)')
+    parser.add_argument('-f', '--format', default='png', choices=FORMATS,
+                        help='image format')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes (default: all CPUs)')
+    parser.add_argument('-r', '--radius', type=float, default=10.,
+                        help='radius of the drawn area')
+    parser.add_argument('-s', '--size', type=float, default=6.,
+                        help='image size in inches')
+    parser.add_argument('-d', '--dpi', type=int, default=100,
+                        help='resolution of raster images')
+    parser.add_argument('-l', '--labels', action='store_true',
+                        help='label spots with their Miller indices')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='only report failures')
+    args = parser.parse_args(argv)
+    
+    paths = find_patterns(args.inputs)
+    if not paths:
+        parser.error('no pattern files found')
+    if args.output and not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    
+    def progress(n_done, n_total, path, filename, error):
+        if error is not None:
+            sys.stderr.write('{}: {}\n'.format(path, error))
+        elif not args.quiet:
+            print('[{}/{}] {}'.format(n_done, n_total, filename))
+    
+    results = render_files(paths, args.output, args.format, args.processes,
+                           progress, r_max=args.radius, size=args.size, 
+                           dpi=args.dpi, labels=args.labels)
+    return 1 if any(error for path, filename, error in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# encoding: utf-8
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**rfactor.py** - in-process R-factor calculations for LEED IV curves.
+
+The R-factors follow the definitions used by CLEED's ``crfac`` program:
+
+ - ``rp``: Pendry R-factor, based on the Y-function of the logarithmic
+   derivatives of the intensities.
+ - ``r1``: mean absolute deviation of the normalised intensities.
+ - ``r2``: mean squared deviation of the normalised intensities.
+ - ``rb``: Zanazzi-Jona R-factor, based on the first and second derivatives
+   of the intensities.
+
+All functions take experimental and theoretical intensities already
+interpolated onto the same, equidistant energy grid and reduce along the
+last axis, so that a stack of curves (or one curve evaluated for many trial
+parameters) is handled in a single call.
+
+Run from the source tree, the module also offers a basic ``crfac`` 
+replacement, e.g.::
+
+    python src/core/rfactor.py -c model.ctr -t model.res -r rp
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import numpy as np
+
+# Zanazzi-Jona normalisation constant
+ZJ_EPSILON = 0.027
+
+
+def _sum(a, mask=None):
+    '''sums `a` along the last axis, ignoring points outside `mask`'''
+    if mask is not None:
+        a = np.where(mask, a, 0.)
+    return a.sum(axis=-1)
+
+
+def _ratio(numerator, denominator):
+    '''element-wise division returning 0 where the denominator vanishes'''
+    denominator = np.asarray(denominator, dtype=float)
+    safe = np.where(denominator != 0., denominator, 1.)
+    return np.where(denominator != 0., numerator / safe, 0.)
+
+
+def _normalisation(ie, it, mask=None):
+    '''scaling factor bringing theoretical onto experimental intensities'''
+    return _ratio(_sum(ie, mask), _sum(it, mask))[..., np.newaxis]
+
+
+def r1(ie, it, mask=None, **kwargs):
+    '''
+    Returns the R1 R-factor ``sum|Ie - c*It| / sum|Ie|``.
+
+    Parameters
+    ----------
+    ie, it : array_like
+        Experimental and theoretical intensities on the same energies.
+    mask : array_like, optional
+        Boolean array flagging the points to include.
+    '''
+    ie, it = np.asarray(ie, dtype=float), np.asarray(it, dtype=float)
+    c = _normalisation(ie, it, mask)
+    return _ratio(_sum(np.abs(ie - c*it), mask), _sum(np.abs(ie), mask))
+
+
+def r2(ie, it, mask=None, **kwargs):
+    '''
+    Returns the R2 R-factor ``sum(Ie - c*It)**2 / sum(Ie**2)``.
+
+    See :func:`r1` for a description of the parameters.
+    '''
+    ie, it = np.asarray(ie, dtype=float), np.asarray(it, dtype=float)
+    c = _normalisation(ie, it, mask)
+    return _ratio(_sum((ie - c*it)**2, mask), _sum(ie*ie, mask))
+
+
+def rb(ie, it, e_step=1., mask=None, die=None, dit=None, **kwargs):
+    '''
+    Returns the Zanazzi-Jona R-factor.
+
+    Parameters
+    ----------
+    ie, it : array_like
+        Experimental and theoretical intensities on the same energies.
+    e_step : float
+        Energy step of the grid (eV).
+    mask : array_like, optional
+        Boolean array flagging the points to include.
+    die, dit : array_like, optional
+        Precomputed first derivatives of `ie` and `it` (e.g. from a spline).
+
+    Notes
+    -----
+    ``R = sum(w * |c*It' - Ie'|) / (0.027 * sum Ie)`` with the weights
+    ``w = |c*It'' - Ie''| / (|Ie'| + max|Ie'|)``.
+    '''
+    ie, it = np.asarray(ie, dtype=float), np.asarray(it, dtype=float)
+    die = np.gradient(ie, e_step, axis=-1) if die is None else die
+    dit = np.gradient(it, e_step, axis=-1) if dit is None else dit
+    d2ie = np.gradient(die, e_step, axis=-1)
+    d2it = np.gradient(dit, e_step, axis=-1)
+    c = _normalisation(ie, it, mask)
+
+    abs_die = np.abs(die)
+    if mask is not None:
+        abs_die = np.where(mask, abs_die, 0.)
+    weight = np.abs(c*d2it - d2ie) / (abs_die + 
+                                      abs_die.max(axis=-1)[..., np.newaxis])
+    return _ratio(_sum(weight * np.abs(c*dit - die), mask), 
+                  ZJ_EPSILON * _sum(ie, mask))
+
+
+def pendry_y(intensity, derivative, vi=4.):
+    '''
+    Returns Pendry's Y-function ``L / (1 + vi**2 * L**2)`` with ``L = I'/I``.
+
+    The equivalent form ``I*I' / (I**2 + vi**2 * I'**2)`` is used so that
+    vanishing intensities do not cause a division by zero.
+    '''
+    return _ratio(intensity * derivative, 
+                  intensity**2 + (vi * derivative)**2)
+
+
+def rp(ie, it, e_step=1., vi=4., mask=None, die=None, dit=None, **kwargs):
+    '''
+    Returns the Pendry R-factor ``sum(Ye - Yt)**2 / sum(Ye**2 + Yt**2)``.
+
+    Parameters
+    ----------
+    ie, it : array_like
+        Experimental and theoretical intensities on the same energies.
+    e_step : float
+        Energy step of the grid (eV).
+    vi : float
+        Imaginary part of the optical potential (eV).
+    mask : array_like, optional
+        Boolean array flagging the points to include.
+    die, dit : array_like, optional
+        Precomputed first derivatives of `ie` and `it` (e.g. from a spline).
+    '''
+    ie, it = np.asarray(ie, dtype=float), np.asarray(it, dtype=float)
+    die = np.gradient(ie, e_step, axis=-1) if die is None else die
+    dit = np.gradient(it, e_step, axis=-1) if dit is None else dit
+    ye = pendry_y(ie, die, vi)
+    yt = pendry_y(it, dit, vi)
+    return _ratio(_sum((ye - yt)**2, mask), _sum(ye*ye + yt*yt, mask))
+
+
+RFACTORS = {'rp': rp, 'r1': r1, 'r2': r2, 'rb': rb, 'zj': rb}
+
+
+def get_rfactor(method='rp'):
+    ''' Returns the R-factor function for the `method` name '''
+    try:
+        return RFACTORS[method.lower()]
+    except KeyError:
+        raise ValueError("R-factor must be one of {} - got '{}'"
+                         "".format(', '.join(sorted(RFACTORS)), method))
+
+
+def compare(energies, ie, it, method='rp', **kwargs):
+    '''
+    Returns the R-factor of two IV curves sampled at the same `energies`.
+
+    Parameters
+    ----------
+    energies : array_like
+        Common, equidistant energies (eV).
+    ie, it : array_like
+        Experimental and theoretical intensities.
+    method : str
+        One of 'rp', 'r1', 'r2' or 'rb'.
+    **kwargs :
+        Passed to the R-factor function, e.g. `vi`.
+    '''
+    energies = np.asarray(energies, dtype=float)
+    if len(energies) < 2:
+        raise ValueError('at least two energies are needed')
+    kwargs.setdefault('e_step', energies[1] - energies[0])
+    return float(get_rfactor(method)(ie, it, **kwargs))
+
+
+def average(rfactors, weights, energy_ranges):
+    '''
+    Returns the weighted average of the R-factors of several beams.
+
+    Each beam is weighted by its control file weight times the energy range
+    it contributes, as in ``crfac``.
+    '''
+    weights = np.asarray(weights, dtype=float) * np.asarray(energy_ranges)
+    total = weights.sum(axis=-1)
+    return _ratio((np.asarray(rfactors) * weights).sum(axis=-1), total)
+
+
+def main(argv=None):
+    '''command line interface mirroring a basic ``crfac`` run'''
+    import argparse
+    from iv import IVCurveGroup
+
+    parser = argparse.ArgumentParser(description='Calculate the R-factor '
+                                     'between experimental and theoretical '
+                                     'LEED IV curves.')
+    parser.add_argument('-c', '--control', required=True,
+                        help='control (*.ctr) file')
+    parser.add_argument('-t', '--theory', default=None,
+                        help='theoretical results (*.res) file')
+    parser.add_argument('-r', '--rfactor', default='rp',
+                        choices=sorted(RFACTORS), help='R-factor type')
+    parser.add_argument('-v', '--vi', type=float, default=4.,
+                        help='imaginary part of optical potential (eV)')
+    args = parser.parse_args(argv)
+
+    group = IVCurveGroup.load(args.control, args.theory)
+    total = group.calculate_rfactor(args.rfactor, vi=args.vi)
+    for pair in group._pairs():
+        if pair.rfactor is not None:
+            print('{:>30} {:8.4f}'.format(str(pair.index), pair.rfactor))
+    print('{:>30} {:8.4f}'.format('total', total))
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,320 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**searchlog.py** - readers for the output files of ``csearch``.
+
+``csearch`` writes two kinds of progress files:
+
+ - vertex files (``*.ver`` and the backup ``*.vbk``), rewritten after each
+   iteration, holding the current simplex. After optional ``#`` comment 
+   lines a header line gives the number of parameters and vertices, 
+   followed by one line per vertex with its R-factor and parameters.
+ - log files (``*.log``), to which a line is appended for every R-factor 
+   evaluation, giving the R-factor (``rfac = ...``, ``rmin: ...``, ...) 
+   followed by the parameter vector after a ``par`` keyword.
+
+:func:`read_vertex` and :func:`read_log` load either file into arrays of 
+R-factors and parameters. A :class:`SearchTail` follows a file of a running
+search, reading only the bytes appended since its last update, so that the 
+convergence of the search can be plotted live without re-parsing the 
+whole log on every refresh::
+
+    tail = SearchTail('Ni111_2x2O.log')
+    ...
+    if tail.update():
+        curve.set_data(np.arange(len(tail)), tail.rfactors)
+
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import re
+
+import numpy as np
+
+LOG_EXTENSIONS = ('.log', )
+VERTEX_EXTENSIONS = ('.ver', '.vbk')
+
+_FLOAT = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eEdD][-+]?\d+)?'
+
+# R-factor of a log line, e.g. 'rfac = 0.4231' or 'rmin: 0.35'
+RFACTOR_PATTERN = re.compile(r'\br(?:_?fac(?:tor)?|_?min|[p12b])?\s*[=:]\s*'
+                             r'(' + _FLOAT + r')', re.IGNORECASE)
+
+# parameters of a log line, i.e. the numbers following 'par'
+PARAMETER_PATTERN = re.compile(r'\bpar(?:ameters?|s)?\s*[=:]?\s*(.*)$',
+                               re.IGNORECASE)
+
+_NUMBERS = re.compile(_FLOAT)
+
+
+def _floats(text):
+    return [float(x.replace('d', 'e').replace('D', 'e')) 
+            for x in _NUMBERS.findall(text)]
+
+
+def _stack(rows, n_parameters=None):
+    ''' Returns `rows` of unequal length as a NaN padded 2D array '''
+    if n_parameters is None:
+        n_parameters = max([len(row) for row in rows] or [0])
+    array = np.full((len(rows), n_parameters), np.nan)
+    for i, row in enumerate(rows):
+        array[i, :len(row)] = row[:n_parameters]
+    return array
+
+
+def parse_log_line(line):
+    '''
+    Returns the ``(rfactor, parameters)`` of a log line, or None if the 
+    line holds no R-factor.
+    '''
+    match = RFACTOR_PATTERN.search(line)
+    if match is None:
+        return None
+    rfactor = float(match.group(1).replace('d', 'e').replace('D', 'e'))
+    match = PARAMETER_PATTERN.search(line, match.end())
+    return (rfactor, _floats(match.group(1)) if match else [])
+
+
+def parse_log(lines):
+    '''
+    Returns the R-factors and parameters of every evaluation in `lines`.
+    
+    Returns
+    -------
+    tuple :
+        ``(rfactors, parameters)`` - arrays of shapes (n,) and (n, n_par); 
+        missing parameters are NaN.
+    '''
+    records = [record for record in (parse_log_line(line) for line in lines)
+               if record is not None]
+    rfactors = np.array([record[0] for record in records], dtype=float)
+    return (rfactors, _stack([record[1] for record in records]))
+
+
+def parse_vertex(lines):
+    '''
+    Returns the R-factors and parameters of the vertices in `lines`.
+    
+    Returns
+    -------
+    tuple :
+        ``(rfactors, parameters)`` - arrays of shapes (n_vertices,) and 
+        (n_vertices, n_par).
+    
+    Raises
+    ------
+    ValueError
+        If the vertices contradict the header line, e.g. because the file 
+        is still being written.
+    '''
+    rows = []
+    n_parameters = n_vertices = None
+    for line in lines:
+        line = line.split('#')[0].strip()
+        if not line:
+            continue
+        tokens = line.split()
+        if n_parameters is None and len(tokens) >= 2 and all(
+                token.isdigit() for token in tokens[:2]) and not rows:
+            n_parameters, n_vertices = int(tokens[0]), int(tokens[1])
+            continue
+        rows.append(_floats(line))
+    
+    if n_parameters is None:
+        n_parameters = max([len(row) - 1 for row in rows] or [0])
+    elif any(len(row) != n_parameters + 1 for row in rows):
+        raise ValueError('vertex lines must hold an R-factor and {} '
+                         'parameters'.format(n_parameters))
+    if n_vertices is not None and len(rows) != n_vertices:
+        raise ValueError('expected {} vertices - got {}'
+                         ''.format(n_vertices, len(rows)))
+    array = _stack(rows, n_parameters + 1)
+    return (array[:, 0], array[:, 1:])
+
+
+def read_log(filename):
+    ''' Returns the ``(rfactors, parameters)`` read from a log file '''
+    with open(filename, 'r') as f:
+        return parse_log(f)
+
+
+def read_vertex(filename):
+    ''' Returns the ``(rfactors, parameters)`` read from a vertex file '''
+    with open(filename, 'r') as f:
+        return parse_vertex(f)
+
+
+def read_search_file(filename):
+    '''
+    Returns the ``(rfactors, parameters)`` of a ``csearch`` log or vertex 
+    file, chosen by its extension.
+    '''
+    if os.path.splitext(filename)[1].lower() in VERTEX_EXTENSIONS:
+        return read_vertex(filename)
+    return read_log(filename)
+
+
+class SearchTail(object):
+    '''
+    Incremental reader of a ``csearch`` file which is still being written.
+    
+    Parameters
+    ----------
+    filename : str
+        Path of the log or vertex file; it need not exist yet.
+    
+    Attributes
+    ----------
+    rfactors : ndarray
+        R-factors read so far.
+    parameters : ndarray
+        NaN padded (n, n_par) array of the parameters read so far.
+    offset : int
+        Number of bytes of the file read so far.
+    
+    Notes
+    -----
+    Log files are only ever appended to, so each :meth:`update` reads just
+    the bytes after :attr:`offset`; an incomplete last line is buffered 
+    until the rest of it has been written. A file which has shrunk, been
+    replaced or whose beginning has changed (e.g. a restarted search) is 
+    read again from the start.
+    
+    Vertex files are rewritten rather than appended to, so they are read 
+    again completely whenever they change; they only hold one line per 
+    vertex. A vertex file caught half written (not ending in a newline or 
+    holding fewer vertices than its header announces) keeps the previous 
+    records until it is complete.
+    '''
+    HEAD_SIZE = 64
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self.vertex = (os.path.splitext(filename)[1].lower() 
+                       in VERTEX_EXTENSIONS)
+        self.reset()
+    
+    def __repr__(self):
+        return ("SearchTail(filename='{}', n_records={}, offset={})"
+                "".format(self.filename, len(self), self.offset))
+    
+    def __len__(self):
+        return len(self.rfactors)
+    
+    def reset(self):
+        ''' Forgets everything read so far '''
+        self.offset = 0
+        self._stamp = None
+        self._head = b''
+        self._partial = b''
+        self.rfactors = np.empty(0)
+        self.parameters = np.empty((0, 0))
+    
+    @property
+    def best(self):
+        ''' Returns the ``(rfactor, parameters)`` of the best record '''
+        if not len(self.rfactors):
+            return None
+        i = np.nanargmin(self.rfactors)
+        return (self.rfactors[i], self.parameters[i])
+    
+    def _append(self, rfactors, parameters):
+        # pad the parameter columns of both blocks to the same width
+        width = max(self.parameters.shape[1], parameters.shape[1])
+        blocks = []
+        for block in (self.parameters, parameters):
+            if block.shape[1] < width:
+                block = np.hstack((block, np.full((len(block), width - 
+                                                   block.shape[1]), np.nan)))
+            blocks.append(block)
+        self.rfactors = np.concatenate((self.rfactors, rfactors))
+        self.parameters = np.vstack(blocks)
+    
+    def update(self):
+        '''
+        Reads whatever has been written since the last update.
+        
+        Returns
+        -------
+        int :
+            Number of new records; for vertex files the number of vertices 
+            if the file has changed, otherwise 0.
+        '''
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            if self.offset or len(self):
+                self.reset()
+            return 0
+        
+        stamp = (stat.st_dev, stat.st_ino, stat.st_mtime, stat.st_size)
+        if stamp == self._stamp:
+            return 0
+        
+        with open(self.filename, 'rb') as f:
+            head = f.read(self.HEAD_SIZE)
+            if self.vertex:
+                data = head + f.read()
+            else:
+                replaced = (self._stamp is not None and 
+                            stamp[:2] != self._stamp[:2])
+                if (replaced or stat.st_size < self.offset or 
+                        head[:len(self._head)] != self._head):
+                    self.reset()
+                f.seek(self.offset)
+                data = f.read()
+        
+        if self.vertex:
+            if not data.endswith(b'\n'):
+                return 0  # caught mid-rewrite: retry on the next update
+            try:
+                rfactors, parameters = parse_vertex(
+                                    data.decode('ascii', 'replace').splitlines())
+            except ValueError:
+                return 0
+            self.reset()
+            self.rfactors, self.parameters = rfactors, parameters
+            self._stamp = stamp
+            self._head = head
+            self.offset = len(data)
+            return len(self.rfactors)
+        
+        self._stamp = stamp
+        self._head = head
+        self.offset += len(data)
+        
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        rfactors, parameters = parse_log(line.decode('ascii', 'replace') 
+                                         for line in lines)
+        if len(rfactors):
+            self._append(rfactors, parameters)
+        return len(rfactors)
@@ -0,0 +1,261 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**smoothing.py** - vectorized smoothing routines for LEED IV curves.
+
+All routines operate along the last axis so that a single curve (1-D) or a
+stack of equal-length curves (2-D) can be smoothed in one call.
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+from math import sqrt
+
+import numpy as np
+
+# relative intensity at which the Lorentzian tails are cut off (as in crfac)
+LORENTZ_CUTOFF = 0.001
+
+# use the FFT path once n_energies * kernel_size exceeds this number
+FFT_THRESHOLD = 2**15
+
+_lorentz_kernels = {}
+
+
+def lorentz_kernel(vi, e_step):
+    '''
+    Returns the one-sided Lorentzian prefactors used by CLEED's ``crfac``.
+
+    Parameters
+    ----------
+    vi : float
+        Imaginary part of the optical potential (eV), i.e. the half width of
+        the Lorentzian.
+    e_step : float
+        Energy step of the equidistant IV curve (eV).
+
+    Returns
+    -------
+    ndarray :
+        Read-only array ``prefac[i] = e_step*vi / ((e_step*i)**2 + vi**2)``
+        for ``0 <= i < n_range``.
+
+    Notes
+    -----
+    Kernels are cached on (`vi`, `e_step`) since the same handful of values
+    are used for every curve of a dataset.
+    '''
+    if vi < LORENTZ_CUTOFF:
+        raise ValueError('vi is too small')
+    if e_step <= 0.:
+        raise ValueError('energy step is too small')
+
+    key = (float(vi), float(e_step))
+    try:
+        return _lorentz_kernels[key]
+    except KeyError:
+        pass
+
+    n_range = max(int(vi * sqrt(1. / LORENTZ_CUTOFF - 1.) / e_step), 1)
+    de = e_step * np.arange(n_range, dtype=float)
+    prefac = e_step * vi / (de*de + vi*vi)
+    prefac.flags.writeable = False
+    _lorentz_kernels[key] = prefac
+    return prefac
+
+
+def _convolve_direct(y, prefac):
+    '''symmetric convolution of `y` with `prefac` along the last axis'''
+    result = y * prefac[0]
+    n = y.shape[-1]
+    for i in range(1, min(len(prefac), n)):
+        result[..., i:] += prefac[i] * y[..., :-i]
+        result[..., :-i] += prefac[i] * y[..., i:]
+    return result
+
+
+def _convolve_fft(y, prefac):
+    '''symmetric convolution of `y` with `prefac` along the last axis'''
+    n = y.shape[-1]
+    m = len(prefac)
+    kernel = np.concatenate((prefac[:0:-1], prefac))
+    size = 1
+    while size < n + 2*m - 2:
+        size *= 2
+    yf = np.fft.rfft(y, size, axis=-1)
+    kf = np.fft.rfft(kernel, size)
+    return np.fft.irfft(yf * kf, size, axis=-1)[..., m-1:m-1+n]
+
+
+def lorentz(y, e_step, vi=4., mask=None, fft=None, out=None):
+    '''
+    Smooths equidistant IV curve(s) by convolution with a Lorentzian.
+
+    Parameters
+    ----------
+    y : array_like
+        Intensities; either a single curve or a 2-D stack of curves sharing
+        the same energy step.
+    e_step : float
+        Energy step (eV).
+    vi : float
+        Imaginary part of the optical potential (eV).
+    mask : array_like, optional
+        Boolean array broadcastable to `y` flagging valid data points. Masked
+        points neither contribute to nor are normalised over, which allows
+        zero-padded stacks of curves with different lengths.
+    fft : bool, optional
+        Force (True) or forbid (False) the FFT path. By default the FFT is
+        used for long curves with wide kernels.
+    out : ndarray, optional
+        Array to write the result to; may be `y` itself for in-place
+        smoothing.
+
+    Returns
+    -------
+    ndarray :
+        Smoothed intensities with the same shape as `y`.
+
+    Notes
+    -----
+    This reproduces the integral of ``crfac``: each intensity is replaced by
+    the Lorentzian weighted mean of its neighbours within the cut-off range,
+    with the weights renormalised at the ends of the curve.
+    '''
+    y = np.asarray(y, dtype=float)
+    prefac = lorentz_kernel(vi, e_step)
+    if fft is None:
+        fft = y.shape[-1] * len(prefac) > FFT_THRESHOLD
+    convolve = _convolve_fft if fft else _convolve_direct
+
+    if mask is None:
+        weights = np.ones(y.shape[-1])
+        values = y
+    else:
+        weights = np.broadcast_to(mask, y.shape).astype(float)
+        values = y * weights
+
+    norm = convolve(weights, prefac)
+    result = convolve(values, prefac)
+    result /= np.where(norm > 0., norm, 1.)
+    if mask is not None:
+        result *= weights
+
+    if out is not None:
+        out[...] = result
+        return out
+    return result
+
+
+def fft_lowpass(y, cutoff=4, tailoff=0):
+    '''
+    Smooths IV curve(s) by discarding Fourier components above `cutoff`.
+
+    Parameters
+    ----------
+    y : array_like
+        Intensities of one curve or a 2-D stack of equal-length curves.
+    cutoff : int
+        Number of low frequency components to keep.
+    tailoff : int
+        Number of the highest frequency components to keep.
+
+    Returns
+    -------
+    ndarray :
+        Smoothed intensities with the same shape as `y`.
+    '''
+    y = np.asarray(y, dtype=float)
+    n = y.shape[-1]
+    rft = np.fft.rfft(y, axis=-1)
+    rft[..., cutoff:rft.shape[-1] - tailoff] = 0.
+    return np.fft.irfft(rft, n, axis=-1)
+
+
+def savitzky_golay(y, window_length=7, polyorder=3, **kwargs):
+    '''
+    Smooths IV curve(s) with a Savitzky-Golay filter along the last axis.
+
+    See :func:`scipy.signal.savgol_filter` for the available keywords.
+    '''
+    from scipy.signal import savgol_filter
+    kwargs['axis'] = -1
+    return savgol_filter(np.asarray(y, dtype=float),
+                         window_length, polyorder, **kwargs)
+
+
+METHODS = {'fft': fft_lowpass,
+           'savitzky-golay': savitzky_golay,
+           'lorentz': lorentz}
+
+
+def buckets(curves, pad=False, decimals=6):
+    '''
+    Groups IV curves into stacks which can be smoothed in a single call.
+
+    Parameters
+    ----------
+    curves : list of IVCurve
+        Curves to group.
+    pad : bool
+        If False, curves are grouped by length so each bucket is a dense
+        (n_curves, n_energies) stack. If True, curves sharing an energy step
+        are grouped together and zero padded to the longest member.
+    decimals : int
+        Number of decimals used when comparing energy steps.
+
+    Returns
+    -------
+    list of tuple :
+        ``(members, e_step, y, mask)`` for each bucket, where `members` are the
+        positions in `curves`, `e_step` the shared energy step (None unless
+        padding), `y` the stacked intensities and `mask` flags valid
+        (non-padded) points or is None for dense buckets.
+    '''
+    groups = {}
+    for i, curve in enumerate(curves):
+        x = curve.x
+        e_step = round(float(x[1] - x[0]), decimals) if len(x) > 1 else 0.
+        key = e_step if pad else len(curve)
+        groups.setdefault(key, []).append(i)
+
+    result = []
+    for key in sorted(groups):
+        members = groups[key]
+        lengths = np.array([len(curves[i]) for i in members])
+        e_step = key if pad else None
+        if lengths.min() == lengths.max():
+            y = np.vstack([curves[i].y for i in members])
+            mask = None
+        else:
+            y = np.zeros((len(members), lengths.max()))
+            mask = np.arange(lengths.max()) < lengths[:, np.newaxis]
+            y[mask] = np.concatenate([curves[i].y for i in members])
+        result.append((members, e_step, y, mask))
+    return result
@@ -0,0 +1,343 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**theory.py** - reading and writing of CLEED theoretical results (*.res).
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import threading
+import warnings
+from collections import Mapping, OrderedDict
+
+import numpy as np
+
+
+def beam_key(index):
+    '''
+    Returns a hashable (h, k) key for `index`.
+
+    The components are rounded to three decimals, the precision used when
+    printing Miller indices, so that e.g. ``(0.333, 0.333)`` and the
+    ``(0.333333, 0.333333)`` of a *.res file refer to the same beam.
+    '''
+    if hasattr(index, 'h') and hasattr(index, 'k'):
+        index = (index.h, index.k)
+    return tuple(round(float(i), 3) + 0. for i in tuple(index)[:2])
+
+
+class BeamTable(Mapping):
+    '''
+    Array-backed table of theoretical beam intensities.
+
+    Parameters
+    ----------
+    energies : array_like
+        Energies (eV) common to all beams.
+    intensities : array_like
+        Array of shape (n_beams, n_energies).
+    indices : list of tuple
+        (h, k) index of each row of `intensities`.
+    sets : array_like, optional
+        CLEED beam set of each beam.
+    header : dict, optional
+        Remaining ``#xx`` header fields of the file, keyed on ``xx``.
+
+    Notes
+    -----
+    The table behaves as a read-only mapping from (h, k) to an
+    ``(energies, intensities)`` tuple so that it can be used wherever the
+    dictionary of beams returned by the old reader was expected.
+    '''
+    def __init__(self, energies, intensities, indices, sets=None, header=None):
+        self.energies = np.ascontiguousarray(energies, dtype=float)
+        self.intensities = np.ascontiguousarray(np.atleast_2d(intensities),
+                                                dtype=float)
+        self.indices = [beam_key(index) for index in indices]
+        if self.intensities.shape != (len(self.indices), len(self.energies)):
+            raise ValueError('intensities must have a shape of '
+                             '(n_beams, n_energies) = ({}, {}) - got {}'
+                             ''.format(len(self.indices), len(self.energies),
+                                       self.intensities.shape))
+        self.sets = (np.zeros(len(self.indices), dtype=int) if sets is None
+                     else np.asarray(sets, dtype=int))
+        self.header = dict(header or {})
+        self._rows = dict((index, i) for i, index in enumerate(self.indices))
+
+    def __repr__(self):
+        return ('BeamTable(n_beams={}, n_energies={})'
+                ''.format(len(self.indices), len(self.energies)))
+
+    def __getitem__(self, index):
+        row = self._rows[beam_key(index)]
+        return (self.energies, self.intensities[row])
+
+    def __contains__(self, index):
+        try:
+            return beam_key(index) in self._rows
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        return iter(self.indices)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def row(self, index):
+        ''' Returns the row of `intensities` holding the beam `index` '''
+        return self._rows[beam_key(index)]
+
+    def rows(self, indices):
+        ''' Returns an array with the rows of each beam in `indices` '''
+        return np.array([self._rows[beam_key(index)] for index in indices],
+                        dtype=int)
+
+
+def read_res(filename):
+    '''
+    Reads a CLEED *.res file in a single pass.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the *.res file.
+
+    Returns
+    -------
+    BeamTable :
+        The theoretical intensities of all beams.
+
+    Notes
+    -----
+    The ``#bn``, ``#bi`` and ``#en`` header lines are parsed line by line;
+    the numeric block following them is read with a single call to
+    :func:`numpy.fromfile`. Only if that fails (e.g. because of comments
+    inside the block) is the block re-read with :func:`numpy.loadtxt`.
+    '''
+    header = {}
+    beams = {}
+    with open(filename, 'rb') as f:
+        first = b''
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if not stripped.startswith(b'#'):
+                first = stripped
+                f.seek(pos)
+                break
+
+            tokens = stripped.decode('ascii', 'replace').split()
+            tag = tokens[0][1:]
+            if tag == 'bi' and len(tokens) >= 4:
+                number = int(tokens[1])
+                beams[number] = ((float(tokens[2]), float(tokens[3])),
+                                 int(tokens[4]) if len(tokens) > 4 else 0)
+            elif tag and len(tag) == 2:
+                header[tag] = ' '.join(tokens[1:])
+
+        n_cols = len(first.split())
+        if not n_cols:
+            data = np.empty((0, len(beams) + 1))
+        else:
+            try:
+                # a partially read block is signalled by a warning
+                with warnings.catch_warnings():
+                    warnings.simplefilter('error')
+                    data = np.fromfile(f, dtype=float, sep=' ')
+                if data.size % n_cols:
+                    raise ValueError('incomplete rows')
+            except (ValueError, DeprecationWarning):
+                f.seek(pos)
+                data = np.loadtxt(f, dtype=float, comments='#', ndmin=2)
+            data = data.reshape(-1, n_cols)
+
+    n_beams = data.shape[1] - 1
+    if 'bn' in header and int(header['bn'].split()[0]) != n_beams:
+        raise ValueError("'{}' has {} intensity columns but {} beams"
+                         "".format(filename, n_beams, header['bn']))
+    if sorted(beams) != list(range(n_beams)):
+        raise ValueError("'{}' does not describe each beam with a '#bi' line"
+                         "".format(filename))
+
+    data = data.T
+    return BeamTable(data[0], data[1:],
+                     [beams[i][0] for i in range(n_beams)],
+                     sets=[beams[i][1] for i in range(n_beams)],
+                     header=header)
+
+
+def write_res(table, filename, fmt='%.6e'):
+    '''
+    Writes `table` to `filename` in the CLEED *.res format.
+
+    Parameters
+    ----------
+    table : BeamTable
+        Theoretical intensities to write.
+    filename : str
+        Output path.
+    fmt : str
+        Format of the intensities.
+    '''
+    energies = table.energies
+    with open(filename, 'w') as f:
+        for tag in sorted(table.header):
+            if tag not in ('bn', 'en'):
+                f.write('#{} {}\n'.format(tag, table.header[tag]))
+        f.write('#bn {}\n'.format(len(table)))
+        for i, (h, k) in enumerate(table.indices):
+            f.write('#bi {} {:f} {:f} {}\n'.format(i, h, k, table.sets[i]))
+        if len(energies):
+            e_step = energies[1] - energies[0] if len(energies) > 1 else 0.
+            f.write('#en {} {:f} {:f} {:f}\n'.format(len(energies),
+                                                     energies[0],
+                                                     energies[-1], e_step))
+        data = np.vstack((energies, table.intensities)).T
+        np.savetxt(f, data, fmt=['%.4f'] + [fmt] * len(table))
+
+
+class TheoryCache(object):
+    '''
+    Least recently used cache of :class:`BeamTable` instances read from disk.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of tables kept in memory.
+
+    Notes
+    -----
+    Entries are keyed on the absolute path, size, inode and modification 
+    and change times of the file (in nanoseconds where available), so that
+    a *.res file rewritten by CLEED is read again even when its size is 
+    unchanged and it is rewritten within the resolution of the modification
+    time, while unchanged files are only ever parsed once. The cached tables are shared
+    and therefore made read-only. The cache is thread safe.
+    '''
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tables = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return ('TheoryCache(maxsize={}, size={}, hits={}, misses={})'
+                ''.format(self.maxsize, len(self), self.hits, self.misses))
+
+    def __len__(self):
+        return len(self._tables)
+
+    def __contains__(self, filename):
+        try:
+            return self._key(filename) in self._tables
+        except OSError:
+            return False
+
+    @staticmethod
+    def _path(filename):
+        return os.path.abspath(os.path.expanduser(os.path.expandvars(filename)))
+
+    def _key(self, filename):
+        path = self._path(filename)
+        stat = os.stat(path)
+        # nanosecond times are only available from Python 3.3
+        mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+        ctime = getattr(stat, 'st_ctime_ns', stat.st_ctime)
+        return (path, mtime, ctime, stat.st_size, stat.st_ino)
+
+    def load(self, filename):
+        '''
+        Returns the :class:`BeamTable` of `filename`, reading it if needed.
+
+        Raises
+        ------
+        IOError :
+            If the file does not exist or cannot be read.
+        '''
+        try:
+            key = self._key(filename)
+        except OSError as err:
+            raise IOError("Unable to read LEED results file '{}': {}"
+                          "".format(filename, err))
+
+        with self._lock:
+            table = self._tables.pop(key, None)
+            if table is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.invalidate(key[0])  # drop outdated versions of the file
+                table = read_res(key[0])
+                table.energies.flags.writeable = False
+                table.intensities.flags.writeable = False
+            self._tables[key] = table  # (re)insert as most recently used
+            while len(self._tables) > max(self.maxsize, 0):
+                self._tables.popitem(last=False)
+            return table
+
+    def invalidate(self, filename=None):
+        '''
+        Removes `filename` from the cache, or every entry if it is None.
+        '''
+        with self._lock:
+            if filename is None:
+                self._tables.clear()
+                return
+            path = self._path(filename)
+            for key in [key for key in self._tables if key[0] == path]:
+                del self._tables[key]
+
+
+# process-wide cache used for all beam construction
+THEORY_CACHE = TheoryCache()
+
+
+def load_theory(filename, cache=True):
+    '''
+    Returns the :class:`BeamTable` of a *.res file.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the *.res file.
+    cache : bool
+        If True (default) the process-wide :data:`THEORY_CACHE` is used, so
+        the file is only parsed again after it has changed on disk.
+    '''
+    if cache:
+        return THEORY_CACHE.load(filename)
+    return read_res(filename)
@@ -0,0 +1,336 @@
+##############################################################################
+# Author: Liam Deacon                                                        #
+#                                                                            #
+# Contact: liam.deacon@diamond.ac.uk                                         #
+#                                                                            #
+# Copyright: Copyright (C) 2014-2015 Liam Deacon                             #
+#                                                                            #
+# License: MIT License                                                       #
+#                                                                            #
+# Permission is hereby granted, free of charge, to any person obtaining a    #
+# copy of this software and associated documentation files (the "Software"), #
+# to deal in the Software without restriction, including without limitation  #
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,   #
+# and/or sell copies of the Software, and to permit persons to whom the      #
+# Software is furnished to do so, subject to the following conditions:       #
+#                                                                            #
+# The above copyright notice and this permission notice shall be included in #
+# all copies or substantial portions of the Software.                        #
+#                                                                            #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR #
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   #
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    #
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER #
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING    #
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER        #
+# DEALINGS IN THE SOFTWARE.                                                  #
+#                                                                            #
+##############################################################################
+'''
+**jobqueue.py** - runs CLEED jobs from the Qt event loop.
+
+A :class:`JobQueue` executes :class:`jobs.Job` descriptions (as created by 
+:func:`jobs.leed_job` and :func:`jobs.rfac_job`) with :class:`QProcess` so 
+that LEED, R-factor and search calculations never block the user interface.
+Any number of jobs may be queued; at most ``maxProcesses`` run at once. The 
+output of each program is streamed line by line through an 
+:class:`OutputInterceptor`, and progress is reported with Qt signals, e.g.::
+
+    queue = JobQueue(self, environment=env, outputDir='scan')
+    queue.progress.connect(self.jobProgress)
+    queue.jobFinished.connect(self.jobFinished)
+    for name, inp in inputs:
+        queue.submit(jobs.leed_job(env, inp, 'model.bul', name=name))
+
+'''
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import shutil
+import signal
+import sys
+import time
+from collections import deque
+from functools import partial
+from multiprocessing import cpu_count
+
+from qtbackend import QtCore
+from interceptor import OutputInterceptor
+
+try:
+    from core import jobs
+except ImportError:
+    module_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    module_path = os.path.join(module_path, 'core')
+    sys.path.insert(0, module_path)
+    import jobs
+
+
+class _Process(QtCore.QProcess):
+    '''
+    QProcess starting its program in a new session, so that killing the
+    process group also stops the programs it starts itself (e.g. ``cleed``
+    run by a wrapper script)
+    '''
+    def setupChildProcess(self):
+        if os.name == 'posix':
+            os.setsid()
+    
+    def killGroup(self):
+        '''Kills the process together with its process group'''
+        pid = self.pid()
+        if os.name == 'posix' and pid:
+            try:
+                os.killpg(int(pid), signal.SIGKILL)
+            except OSError:
+                pass  # already finished
+        self.kill()
+
+
+class _RunningJob(object):
+    '''State of a job whilst its process is running'''
+    def __init__(self, job, result, timer=None):
+        self.job = job
+        self.result = result
+        self.timer = timer
+        self.start = time.time()
+        self.partial = {'stdout': '', 'stderr': ''}
+
+
+class JobQueue(QtCore.QObject):
+    '''
+    Queue of :class:`jobs.Job` instances run asynchronously with 
+    :class:`QProcess`.
+    
+    Parameters
+    ----------
+    parent : QObject, optional
+        Parent object of the queue and its processes.
+    environment : Environment, optional
+        Supplies additional environment variables for all jobs.
+    maxProcesses : int, optional
+        Maximum number of concurrently running jobs (default: CPU count).
+    root : str, optional
+        Directory for the temporary working directories of the jobs.
+    outputDir : str, optional
+        Directory into which the result files of each job are moved; if 
+        not given the files are left in the working directory.
+    keep : bool, optional
+        Keep working directories even when the results have been moved.
+    timeout : float, optional
+        Default timeout in seconds for jobs without their own.
+    stream : OutputInterceptor, optional
+        Stream receiving the program output (default: intercepts 
+        ``sys.stdout`` and logs to the 'jobs' logger).
+    
+    Signals
+    -------
+    jobStarted(str)
+        Name of a job whose process has started.
+    output(str, str)
+        Job name and a chunk of its standard output or error.
+    progress(int, int)
+        Number of finished jobs and total number of submitted jobs.
+    jobFinished(object)
+        :class:`jobs.JobResult` of a finished, failed or cancelled job.
+    allFinished()
+        Emitted when the last queued job has finished.
+    '''
+    jobStarted = QtCore.pyqtSignal(str)
+    output = QtCore.pyqtSignal(str, str)
+    progress = QtCore.pyqtSignal(int, int)
+    jobFinished = QtCore.pyqtSignal(object)
+    allFinished = QtCore.pyqtSignal()
+    
+    def __init__(self, parent=None, environment=None, maxProcesses=None, 
+                 root=None, outputDir=None, keep=False, timeout=None, 
+                 stream=None):
+        super(JobQueue, self).__init__(parent)
+        self.environment = environment
+        self.maxProcesses = maxProcesses or cpu_count()
+        self.root = root
+        self.outputDir = outputDir
+        self.keep = keep
+        self.timeout = timeout
+        self.stream = stream or OutputInterceptor('jobs', sys.stdout)
+        self._queue = deque()
+        self._running = {}
+        self._done = 0
+        self._total = 0
+    
+    def __len__(self):
+        return len(self._queue) + len(self._running)
+    
+    @property
+    def pending(self):
+        '''Jobs waiting for a free process'''
+        return list(self._queue)
+    
+    @property
+    def running(self):
+        '''Jobs whose process is running'''
+        return [state.job for state in self._running.values()]
+    
+    def pids(self):
+        '''Returns the process ids of the running jobs'''
+        return [process.pid() for process in self._running]
+    
+    def submit(self, job):
+        '''Queues `job` and starts it as soon as a process is free'''
+        self._queue.append(job)
+        self._total += 1
+        self.progress.emit(self._done, self._total)
+        self._startNext()
+        return job
+    
+    def submitAll(self, jobs):
+        '''Queues each job of `jobs`'''
+        return [self.submit(job) for job in jobs]
+    
+    def cancel(self, name):
+        '''
+        Removes the job called `name` from the queue, or kills its process
+        if it is already running.
+        
+        Returns
+        -------
+        bool :
+            True if the job was found.
+        '''
+        for job in list(self._queue):
+            if job.name == name:
+                self._queue.remove(job)
+                result = jobs.JobResult(job, error=RuntimeError('cancelled'))
+                self._complete(result)
+                return True
+        for process, state in list(self._running.items()):
+            if state.job.name == name:
+                state.result.error = RuntimeError('cancelled')
+                process.killGroup()
+                return True
+        return False
+    
+    def cancelAll(self):
+        '''Cancels all queued and running jobs'''
+        for job in list(self._queue) + self.running:
+            self.cancel(job.name)
+    
+    def _startNext(self):
+        while self._queue and len(self._running) < self.maxProcesses:
+            self._start(self._queue.popleft())
+        if not self._queue and not self._running and self._total:
+            self._done = self._total = 0
+            self.allFinished.emit()
+    
+    def _start(self, job):
+        result = jobs.JobResult(job)
+        try:
+            result.workdir = jobs.prepare_workdir(job, self.root)
+        except (OSError, IOError) as err:
+            result.error = err
+            self._complete(result)
+            return
+        
+        process = _Process(self)
+        process.setWorkingDirectory(result.workdir)
+        env = QtCore.QProcessEnvironment()
+        for key, value in jobs.job_environment(job, 
+                                               self.environment).items():
+            env.insert(key, value)
+        process.setProcessEnvironment(env)
+        
+        state = _RunningJob(job, result)
+        timeout = job.timeout if job.timeout is not None else self.timeout
+        if timeout is not None:
+            state.timer = QtCore.QTimer(process)
+            state.timer.setSingleShot(True)
+            state.timer.timeout.connect(partial(self._expire, process))
+            state.timer.start(int(timeout * 1000))
+        self._running[process] = state
+        
+        process.readyReadStandardOutput.connect(
+            partial(self._read, process, 'stdout'))
+        process.readyReadStandardError.connect(
+            partial(self._read, process, 'stderr'))
+        process.error.connect(partial(self._error, process))
+        process.finished.connect(partial(self._finished, process))
+        
+        process.start(job.args[0], job.args[1:])
+        if job.stdin is not None:
+            process.write(QtCore.QByteArray(job.stdin.encode('utf-8')))
+            process.closeWriteChannel()
+        self.jobStarted.emit(job.name)
+    
+    def _read(self, process, channel):
+        state = self._running.get(process)
+        if state is None:
+            return
+        if channel == 'stdout':
+            data = process.readAllStandardOutput()
+        else:
+            data = process.readAllStandardError()
+        text = bytes(data).decode('utf-8', 'replace')
+        if not text:
+            return
+        setattr(state.result, channel, getattr(state.result, channel) + text)
+        self.output.emit(state.job.name, text)
+        
+        # only pass complete lines on to the log
+        lines = (state.partial[channel] + text).split('\n')
+        state.partial[channel] = lines.pop()
+        for line in lines:
+            self._write(state.job.name, line)
+    
+    def _write(self, name, line):
+        if line.strip():
+            self.stream.write('[{}] {}\n'.format(name, line.rstrip()))
+    
+    def _expire(self, process):
+        state = self._running.get(process)
+        if state is not None:
+            state.result.timed_out = True
+            process.killGroup()
+    
+    def _error(self, process, error):
+        # a process which failed to start never emits finished()
+        if error == QtCore.QProcess.FailedToStart:
+            state = self._running.get(process)
+            if state is not None:
+                state.result.error = OSError(process.errorString())
+                self._finished(process)
+    
+    def _finished(self, process, exitCode=None, exitStatus=None):
+        if process not in self._running:
+            return
+        self._read(process, 'stdout')
+        self._read(process, 'stderr')
+        state = self._running.pop(process)
+        if state.timer is not None:
+            state.timer.stop()
+        for channel, line in state.partial.items():
+            self._write(state.job.name, line)
+        
+        result = state.result
+        result.elapsed = time.time() - state.start
+        if result.error is None:
+            if process.exitStatus() == QtCore.QProcess.NormalExit:
+                result.returncode = process.exitCode()
+            else:
+                result.returncode = -1
+            try:
+                result.files = jobs.collect_results(state.job, result.workdir,
+                                                    self.outputDir)
+            except (OSError, IOError) as err:
+                result.error = err
+        if (self.outputDir and not self.keep and 
+                os.path.isdir(result.workdir)):
+            shutil.rmtree(result.workdir, ignore_errors=True)
+        process.deleteLater()
+        self._complete(result)
+    
+    def _complete(self, result):
+        self._done += 1
+        self.jobFinished.emit(result)
+        self.progress.emit(self._done, self._total)
+        self._startNext()
@@ -45,6 +45,7 @@ from qtbackend import QtCore, QtGui, QtLoadUI, variant as __QT_TYPE__
 
 # import package modules
 from interceptor import OutputInterceptor
+from jobqueue import JobQueue
 from mdichild import MdiChild
 from projectexplorer import ProjectTreeWidget, ProjectItem, ModelItem
 
@@ -306,6 +307,13 @@ class MainWindow(QtGui.QMainWindow):
         sys.stderr = OutputInterceptor('stderr', sys.stderr)
         sys.stdout = OutputInterceptor('stdout', sys.stdout)
         
+        # queue for running CLEED programs without blocking the GUI
+        self.jobQueue = JobQueue(self, stream=OutputInterceptor(
+                                    __APP_NAME__ + '.jobs', sys.stdout))
+        self.jobQueue.output.connect(self.readStdOutput)
+        self.jobQueue.progress.connect(self.jobProgress)
+        self.jobQueue.jobFinished.connect(self.jobFinished)
+        
         # other variables
         self.projects = {}
         self.models = {}
@@ -508,6 +516,7 @@ class MainWindow(QtGui.QMainWindow):
                 event.ignore()
             else:
                 self.writeSettings()
+                self.jobQueue.cancelAll()
                 event.accept()
                 sys.exit(0)  # force app to exit
 
@@ -766,14 +775,34 @@ class MainWindow(QtGui.QMainWindow):
     
     @property
     def processes(self):
-        import psutil 
         pid = os.getpid()
-        children = psutil.Process().get_children(recursive=False)
-        pids = {'main_pid': pid, 'sub_processes': children}
+        pids = {'main_pid': pid, 'sub_processes': self.jobQueue.pids()}
         return pids
     
-    def readStdOutput(self):
-        self.ui.textEditLog.append(str(self.readAllStandardOutput()))
+    def runJobs(self, jobs):
+        '''queue CLEED jobs to run in the background'''
+        return self.jobQueue.submitAll(jobs)
+    
+    def jobProgress(self, done, total):
+        '''show progress of the job queue'''
+        self.statusBar().showMessage("Jobs: %i/%i finished" % (done, total))
+    
+    def jobFinished(self, result):
+        '''log the outcome of a background job'''
+        if result.ok:
+            self.logger.info("Job '%s' finished in %.1fs" % (result.job.name,
+                                                              result.elapsed))
+        elif result.timed_out:
+            self.logger.warning("Job '%s' timed out" % result.job.name)
+        else:
+            self.logger.error("Job '%s' failed: %s" % (result.job.name, 
+                              result.error or result.returncode))
+    
+    def readStdOutput(self, name, text):
+        '''show the latest output line of job `name`'''
+        lines = [line for line in text.splitlines() if line.strip()]
+        if lines:
+            self.statusBar().showMessage("[%s] %s" % (name, lines[-1]), 2000)
     
     def save(self):
         '''save current window'''
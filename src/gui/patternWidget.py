@@ -28,10 +28,12 @@
 ##############################################################################
 from __future__ import division, with_statement, unicode_literals
 
+import os
+
+import numpy as np
+
 from PyQt4 import QtCore, QtGui
 import res_rc
-from PySide.QtGui import QGraphicsItem
-from operator import isCallable
 
 try:
     from core import pattern
@@ -71,6 +73,91 @@ class HexagonItem(QtGui.QGraphicsPolygonItem):
     def __init__(self, parent=None):
         super(HexagonItem, self).__init__(parent)
 
+class SpotItem(QtGui.QGraphicsItem):
+    '''
+    Draws a whole set of LEED spots as a single scene item.
+    
+    The spots are painted from one cached :class:`QtGui.QPainterPath` (or, 
+    once they are smaller than a couple of pixels, as points), so the scene
+    holds one item per domain rather than one per spot. Index labels are 
+    only drawn once the level of detail exceeds `labelDetail` and then only
+    for the spots inside the exposed rectangle.
+    '''
+    def __init__(self, spots, color, size, labelDetail=1.5, labelSize=9, 
+                 parent=None):
+        super(SpotItem, self).__init__(parent)
+        self.setFlag(QtGui.QGraphicsItem.ItemUsesExtendedStyleOption)
+        
+        # scene y-axis points down
+        self._x = np.array(spots['x'], dtype=float)
+        self._y = -np.array(spots['y'], dtype=float)
+        self._spots = spots
+        self._labels = None
+        self.color = QtGui.QColor(color)
+        self.size = float(size)
+        self.labelDetail = labelDetail
+        self.labelSize = labelSize
+        
+        radius = self.size / 2.
+        self._path = QtGui.QPainterPath()
+        self._points = QtGui.QPolygonF()
+        for x, y in zip(self._x.tolist(), self._y.tolist()):
+            self._path.addEllipse(QtCore.QPointF(x, y), radius, radius)
+            self._points.append(QtCore.QPointF(x, y))
+        
+        if len(self._x):
+            margin = 4 * self.size
+            self._rect = QtCore.QRectF(self._x.min() - margin, 
+                                       self._y.min() - margin,
+                                       np.ptp(self._x) + 2*margin, 
+                                       np.ptp(self._y) + 2*margin)
+        else:
+            self._rect = QtCore.QRectF()
+    
+    def boundingRect(self):
+        return self._rect
+    
+    @property
+    def labels(self):
+        ''' Reduced fractional labels of the spots, created on first use '''
+        if self._labels is None:
+            self._labels = pattern.spot_labels(self._spots)
+        return self._labels
+    
+    def paint(self, painter, option, widget=None):
+        detail = option.levelOfDetailFromTransform(painter.worldTransform())
+        
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.setBrush(QtGui.QBrush(self.color))
+        if self.size * detail < 2.:
+            painter.setPen(QtGui.QPen(self.color, 0))
+            painter.drawPoints(self._points)
+            return
+        painter.drawPath(self._path)
+        
+        if detail < self.labelDetail:
+            return
+        
+        # label only the spots which are exposed
+        exposed = option.exposedRect
+        visible = np.flatnonzero((self._x >= exposed.left()) & 
+                                 (self._x <= exposed.right()) & 
+                                 (self._y >= exposed.top()) & 
+                                 (self._y <= exposed.bottom()))
+        if not len(visible):
+            return
+        
+        font = QtGui.QFont("Times")
+        font.setPointSizeF(max(self.labelSize / detail, 0.1))
+        painter.setFont(font)
+        painter.setPen(QtGui.QPen(self.color))
+        offset = self.size / 2.
+        labels = self.labels
+        for i in visible.tolist():
+            painter.drawText(QtCore.QPointF(self._x[i] + offset, 
+                                            self._y[i] - offset), labels[i])
+
+
 class PatternScene(QtGui.QGraphicsScene):
     def _init__(self, parent=None):
         super(PatternScene, self).__init__(parent)
@@ -91,9 +178,14 @@ class PatternWidget(QtGui.QGraphicsView):
         self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.setFocus()
         self.setRenderHint(QtGui.QPainter.Antialiasing)
+        self.setViewportUpdateMode(QtGui.QGraphicsView.SmartViewportUpdate)
+        self.setTransformationAnchor(QtGui.QGraphicsView.AnchorUnderMouse)
+        self.setOptimizationFlag(QtGui.QGraphicsView.DontSavePainterState)
         self.centerOn(0, 0)
         
         self.spotSize = 30
+        self.sceneRadius = 1000.
+        self.zoom = 1.
         
         brush = QtGui.QBrush(QtGui.QColor(self.colorSequence[0]), 
                              QtCore.Qt.NoBrush)
@@ -110,10 +202,8 @@ class PatternWidget(QtGui.QGraphicsView):
                                        scene=scene)
         text.setPos(0, 0)
         
-        # handles for grouped items
-        self.spots = {'substrate': [], 'superstructures': [[]]}
-        self.indices = {'substrate': [], 'superstructures': [[]]}
-        self.vectors = {'substrate': [], 'superstructures': [[]]}
+        # one SpotItem for the substrate followed by one per domain
+        self.spotItems = []
         
         self.pattern = pattern.Pattern()
         
@@ -179,37 +269,28 @@ class PatternWidget(QtGui.QGraphicsView):
             
     
     def draw(self):
-        spots = {'substrate': self.pattern.calculate_spots(), 
-                 'superstructures': [dom.calculate_spots() 
-                                    for dom in self.pattern.domains]}
-        
-        try:
-            self.scene().removeItem(self.spots['substrate'])
-        except:
-            pass
-        for group in ['spots', 'indices', 'vectors']:
-            for domainGroup in eval("self.{}['superstructures']".format(group)):
-                try:
-                    self.scene().removeItem(domainGroup)
-                    # maybe forcibly delete domainGroup here
-                    # rather than relying on Python's garbage collection
-                except:
-                    continue
-        
-        # create new groups
-        for group in ['spots', 'indices', 'vectors']:
-            obj = eval('self.{}'.format(group))
-            obj['substrate'] = QtGui.QGraphicsItemGroup(self, self.scene())
-            obj['superstructures'] = [QtGui.QGraphicsItemGroup(self, self.scene())
-                                      for item in spots['superstructrues']]
-        
-        QtGui.QPainterPath
-        for spot in spots['substrate']:
-            self.indices['substrate'].addToGroup(self.draw_label(spot))
+        ''' Redraws the pattern with one :class:`SpotItem` per domain '''
+        scene = self.scene()
+        for item in self.spotItems:
+            scene.removeItem(item)
+        self.spotItems = []
+        
+        spot_arrays = self.pattern.spot_arrays(self.sceneRadius)
+        for i, spots in enumerate(spot_arrays):
+            color = self.colorSequence[i % len(self.colorSequence)]
+            size = self.spotSize if i == 0 else self.spotSize / 2.
+            item = SpotItem(spots, color, size)
+            item.setZValue(len(spot_arrays) - i)
+            scene.addItem(item)
+            self.spotItems.append(item)
+        
+        radius = self.sceneRadius + self.spotSize
+        scene.setSceneRect(-radius, -radius, 2*radius, 2*radius)
             
     
     def draw_label(self, spot, pen=None, brush=None, font=None, **kwargs):
-        label = QtGui.QGraphicsTextItem('{},{}'.format(*spot.index()))
+        label = QtGui.QGraphicsTextItem(','.join(
+                            pattern.fraction_labels((spot.h, spot.k))))
         label.setPos(*spot.pos())
         label.setFlag(QtGui.QGraphicsItem.ItemIsSelectable)
         label.setFlag(QtGui.QGraphicsItem.ItemIsMovable)
@@ -232,7 +313,7 @@ class PatternWidget(QtGui.QGraphicsView):
             return
             
         # perform zoom 
-        scaling = 1.1 if delta > 0 else 0.9.
+        scaling = 1.1 if delta > 0 else 0.9
         self.scale(scaling, scaling)
         self.zoom *= scaling 
 
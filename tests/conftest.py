@@ -0,0 +1,11 @@
+'''
+pytest configuration - makes the modules of ``src/core`` and ``src/gui`` 
+importable the same way they import each other.
+'''
+import os
+import sys
+
+_src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    'src')
+sys.path.insert(0, os.path.join(_src, 'gui'))
+sys.path.insert(0, os.path.join(_src, 'core'))
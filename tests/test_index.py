@@ -0,0 +1,90 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import numpy as np
+import pytest
+
+from index import MillerIndex, MillerIndexSet, parse_index
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('(1, 0)', (1., 0.)), ('[1/2 1/2 1]', (0.5, 0.5, 1.)),
+    (' -1/3,2/3 ', (-1. / 3., 2. / 3.))])
+def test_parse_index(text, expected):
+    assert parse_index(text) == expected
+
+
+@pytest.mark.parametrize('text', ['(1)', '(a, b)', '(1/0, 1)',
+                                  '__import__("os")'])
+def test_parse_index_rejects(text):
+    with pytest.raises(ValueError):
+        parse_index(text)
+
+
+def test_equality_and_hash():
+    assert MillerIndex(1. / 3., 0.) == MillerIndex(1. / 3., 0.)
+    assert MillerIndex(1., 0.) != MillerIndex(1., 0., 0.)
+    # hashes agree to the three decimals printed
+    assert hash(MillerIndex(1. / 3., 0.)) == hash(MillerIndex(0.3333, 0.))
+    index = MillerIndex(1., 0.)
+    before = hash(index)
+    index.h = 2.
+    assert hash(index) != before
+
+
+def test_index_keeps_explicit_zero_l():
+    assert MillerIndex(1., 0.).index() == (1., 0.)
+    assert MillerIndex(1., 0., 0.).index() == (1., 0., 0.)
+    assert MillerIndex(0.5, 0., 1.).index() == (0.5, 0., 1.)
+
+
+def test_interned_indices_are_shared_and_read_only():
+    index = MillerIndex.intern(1. / 3., 1. / 3.)
+    assert MillerIndex.intern(0.333, 0.333) is index
+    for attr in ('h', 'k', 'l'):
+        with pytest.raises(AttributeError):
+            setattr(index, attr, 2.)
+    assert index.h == 1. / 3. and index.l is None
+    assert MillerIndex(1., 0.).h == 1.  # other instances stay writable
+
+
+def test_set_keeps_first_order_and_drops_duplicates():
+    indices = MillerIndexSet(['(1, 0)', (0.5, 0.5), MillerIndex(1., 0.),
+                              (0.5004, 0.4996), (-1, 1)])
+    assert [index.index() for index in indices] == [(1., 0.), (0.5, 0.5),
+                                                    (-1., 1.)]
+    assert len(indices) == 3
+    assert list(indices.order()) == [1., 1., 2.]
+    assert list(indices.order(round=True)) == [1, 1, 2]
+    with pytest.raises(ValueError):
+        indices.array[0, 0] = 2.
+
+
+def test_set_membership():
+    indices = MillerIndexSet([(1, 0), (1. / 3., 2. / 3.), (0, 1, 2)])
+    assert (1., 0.) in indices
+    assert '(1/3, 2/3)' in indices
+    assert MillerIndex(0., 1., 2.) in indices
+    assert (0., 1.) not in indices  # l differs
+    assert 'nonsense' not in indices
+    assert list(indices.isin([(0, 1, 2), (5, 5)])) == [False, False, True]
+    planar = MillerIndexSet([(1, 0), (1, 1), (1. / 3., 2. / 3.)])
+    assert list(planar.subset(planar.order() < 1.5)) == [
+                        MillerIndex(1., 0.), MillerIndex(1. / 3., 2. / 3.)]
+
+
+def test_set_equality():
+    a = MillerIndexSet([(1, 0), (0, 1)])
+    b = MillerIndexSet(np.array([[0., 1.], [1., 0.]]))
+    assert a == b and hash(a) == hash(b)
+    assert a != MillerIndexSet([(1, 0)])
+    assert MillerIndexSet([]) == MillerIndexSet(np.empty((0, 2)))
+
+
+def test_iterated_indices_cannot_corrupt_the_set():
+    indices = MillerIndexSet([(1, 0), (0, 1)])
+    index = next(iter(indices))
+    with pytest.raises(AttributeError):
+        index.h = 5.
+    assert (1., 0.) in indices
+    assert MillerIndex.intern(1., 0.).h == 1.
@@ -0,0 +1,164 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import numpy as np
+import pytest
+
+from index import MillerIndex
+from iv import IVCurve, IVCurvePair, IVCurveGroup, load_curves
+
+
+def _curve(energies, centre, kind):
+    y = np.exp(-((energies - centre) / 6.)**2) + 0.05
+    return IVCurve(data=(energies, y), type=kind)
+
+
+def _pair():
+    energies = np.arange(50., 200.1, 1.)
+    return IVCurvePair(_curve(energies, 100., IVCurve.EXPERIMENTAL_IV),
+                       _curve(energies, 100., IVCurve.THEORETICAL_IV),
+                       index=MillerIndex(1, 0))
+
+
+def test_spline_refit_after_inplace_theory_smooth():
+    pair = _pair()
+    assert pair.calculate_rfactor('r2') < 1e-12
+    
+    group = IVCurveGroup()
+    group[pair.index] = pair
+    group.smooth('lorentz', which='theory', inplace=True, vi=8.)
+    
+    fresh = IVCurvePair(pair.experiment, 
+                        IVCurve(data=pair.theory.data.copy(), 
+                                type=IVCurve.THEORETICAL_IV),
+                        index=MillerIndex(1, 0))
+    expected = fresh.calculate_rfactor('r2')
+    assert expected > 1e-3
+    assert np.isclose(pair.calculate_rfactor('r2'), expected)
+
+
+def test_spline_refit_after_lorentz_smooth():
+    pair = _pair()
+    pair.calculate_rfactor('r2')
+    version = pair.theory.version
+    pair.theory._lorentz_smooth(vi=8.)
+    assert pair.theory.version > version
+    assert pair.calculate_rfactor('r2') > 1e-3
+
+
+def test_items_are_rows():
+    curve = IVCurve(data=([60., 62., 64.], [1., 2., 3.]))
+    assert np.array_equal(curve[0], [60., 62., 64.])
+    assert np.array_equal(curve[1], [1., 2., 3.])
+    assert curve[62.] == 2.
+    version = curve.version
+    curve[1] = [3., 2., 1.]
+    assert np.array_equal(curve.y, [3., 2., 1.])
+    assert curve.version > version
+    with pytest.raises((AttributeError, TypeError)):
+        del curve[1]
+
+
+def test_delete_point():
+    curve = IVCurve(data=([60., 62., 64., 66.], [1., 2., 3., 4.]))
+    version = curve.version
+    curve.delete_point(1)
+    assert np.array_equal(curve.data, [[60., 64., 66.], [1., 3., 4.]])
+    curve.delete_point(66.)
+    assert np.array_equal(curve.data, [[60., 64.], [1., 3.]])
+    assert curve.version > version
+    assert curve.data.flags['C_CONTIGUOUS']
+    with pytest.raises(KeyError):
+        curve.delete_point(70.)
+
+
+def test_smoothed_copies_are_marked_modified():
+    pair = _pair()
+    group = IVCurveGroup()
+    group[pair.index] = pair
+    smoothed = group.smooth('fft', which='theory')
+    curve = smoothed._pairs()[0].theory
+    assert curve is not pair.theory
+    assert not np.array_equal(curve.y, pair.theory.y)
+    assert curve.version != pair.theory.version
+
+
+def test_group_smooth_rejects_unknown_methods():
+    group = IVCurveGroup()
+    pair = _pair()
+    group[pair.index] = pair
+    with pytest.raises(ValueError):
+        group.smooth('savitsky-golay')
+
+
+def _write_curves(tmpdir, n):
+    paths = []
+    for i in range(n):
+        path = tmpdir.join('beam{}.dat'.format(i))
+        path.write(''.join('{} {}\n'.format(60. + 2. * j, i + j) 
+                           for j in range(5)))
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize('workers, processes', 
+                         [(1, False), (4, False), (2, True)])
+def test_load_curves(tmpdir, workers, processes):
+    paths = _write_curves(tmpdir, 6)
+    paths.insert(2, str(tmpdir.join('missing.dat')))
+    calls = []
+    data, errors = load_curves(paths, workers=workers, processes=processes, 
+                               progress=lambda *args: calls.append(args))
+    
+    assert len(data) == len(paths)
+    assert data[2] is None
+    for i, curve in enumerate(data[:2] + data[3:]):
+        assert np.allclose(curve, [60. + 2. * np.arange(5), i + np.arange(5)])
+    assert list(errors) == [paths[2]]
+    assert isinstance(errors[paths[2]], (IOError, OSError))
+    assert calls == [(i + 1, len(paths), path) for i, path in enumerate(paths)]
+
+
+def test_load_curves_progress_cancels(tmpdir):
+    paths = _write_curves(tmpdir, 8)
+    
+    def progress(n_done, n_total, path):
+        if n_done == 3:
+            raise KeyboardInterrupt
+    
+    with pytest.raises(KeyboardInterrupt):
+        load_curves(paths, workers=2, progress=progress)
+
+
+def test_load_curves_empty():
+    assert load_curves([]) == ([], {})
+
+
+def _shifted_group(shift):
+    energies = np.arange(50., 200.1, 1.)
+    group = IVCurveGroup()
+    for i, centre in enumerate((90., 130.)):
+        pair = IVCurvePair(
+            _curve(energies, centre, IVCurve.EXPERIMENTAL_IV),
+            _curve(energies, centre - shift, IVCurve.THEORETICAL_IV),
+            index=MillerIndex(i, 0))
+        group[pair.index] = pair
+    return group
+
+
+@pytest.mark.parametrize('method', ['rp', 'r2'])
+def test_optimise_shift(method):
+    group = _shifted_group(3.4)
+    r = group.shift_scan([-2., 0., 3.4, 6.], method)
+    assert np.argmin(r) == 2 and r[2] < 1e-3
+    shift, r_min = group.optimise_shift((-10., 10.), 1., method)
+    assert abs(shift - 3.4) < 0.05 and r_min < 1e-3
+    shift, r_min = group.optimise_shift((-10., 10.), None, method)
+    assert abs(shift - 3.4) < 0.05
+
+
+def test_shift_scan_without_overlap():
+    group = _shifted_group(0.)
+    assert np.isinf(group.shift_scan([500.])[0])
+    assert np.allclose(group.shift_scan(0., 'r2'), 
+                       group.calculate_rfactor('r2'), atol=1e-9)
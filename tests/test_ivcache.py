@@ -0,0 +1,55 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+
+import numpy as np
+
+from iv import IVCurveGroup
+from ivcache import IVCache, cache_filename
+
+
+def test_paths_are_expanded(tmpdir, monkeypatch):
+    monkeypatch.setenv('IVDATA', str(tmpdir))
+    path = tmpdir.join('beam10.dat')
+    path.write('60. 1.\n')
+    data = np.array([[60., 62.], [1., 2.]])
+    
+    cache = IVCache(str(tmpdir.join('model.ctr.ivcache.npz')))
+    cache.put(os.path.join('$IVDATA', 'beam10.dat'), data)
+    assert np.array_equal(cache.get(str(path)), data)
+    cache.prune([os.path.join('$IVDATA', 'beam10.dat')])
+    assert len(cache) == 1
+
+
+def test_put_ignores_missing_files(tmpdir):
+    cache = IVCache(str(tmpdir.join('model.ctr.ivcache.npz')))
+    cache.put(str(tmpdir.join('missing.dat')), np.zeros((2, 3)))
+    assert len(cache) == 0
+    assert not cache.dirty
+
+
+def test_load_reports_cache_hits(tmpdir):
+    for name in ('b1.dat', 'b2.dat'):
+        tmpdir.join(name).write('60. 1.\n62. 2.\n64. 3.\n')
+    ctr = tmpdir.join('model.ctr')
+    ctr.write(''.join('ef={}:ti=({}):id={}:wt=1\n'.format(
+                          tmpdir.join(name), index, i) 
+                      for i, (name, index) in enumerate(
+                          [('b1.dat', '1,0'), ('missing.dat', '0,1'), 
+                           ('b2.dat', '1,1')], 1)))
+    
+    calls = []
+    progress = lambda *args: calls.append(args)
+    IVCurveGroup.load(str(ctr), cache=True, workers=1, progress=progress)
+    assert [call[:2] for call in calls] == [(1, 3), (2, 3), (3, 3)]
+    assert len(IVCache(cache_filename(str(ctr)))) == 2
+    
+    del calls[:]
+    tmpdir.join('b2.dat').write('60. 4.\n62. 5.\n')  # invalidates b2
+    ivs = IVCurveGroup.load(str(ctr), cache=True, workers=1, 
+                            progress=progress)
+    assert calls == [(1, 3, str(tmpdir.join('b1.dat'))), 
+                     (2, 3, str(tmpdir.join('missing.dat'))), 
+                     (3, 3, str(tmpdir.join('b2.dat')))]
+    assert list(ivs.load_errors) == [str(tmpdir.join('missing.dat'))]
@@ -0,0 +1,62 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import time
+
+import pytest
+
+qtbackend = pytest.importorskip('qtbackend')
+
+from jobs import Job
+from jobqueue import JobQueue
+
+QtCore = qtbackend.QtCore
+
+
+@pytest.fixture(scope='module')
+def app():
+    return (QtCore.QCoreApplication.instance() or 
+            QtCore.QCoreApplication([]))
+
+
+def run(queue, jobs, timeout=10.):
+    results = []
+    loop = QtCore.QEventLoop()
+    queue.jobFinished.connect(results.append)
+    queue.allFinished.connect(loop.quit)
+    QtCore.QTimer.singleShot(int(timeout * 1000), loop.quit)
+    queue.submitAll(jobs)
+    loop.exec_()
+    return results
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def test_runs_jobs(app, tmpdir):
+    queue = JobQueue(maxProcesses=2, root=str(tmpdir))
+    results = run(queue, [Job(['sh', '-c', 'echo {}'.format(i)], 
+                              name='echo{}'.format(i)) for i in range(3)])
+    assert sorted(result.stdout.strip() for result in results) == ['0', '1', 
+                                                                   '2']
+    assert all(result.returncode == 0 for result in results)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='requires a POSIX shell')
+def test_timeout_kills_grandchildren(app, tmpdir):
+    pid_file = str(tmpdir.join('pid'))
+    job = Job(['sh', '-c', 'sleep 30 & echo $! > {}; wait'.format(pid_file)], 
+              timeout=0.5)
+    start = time.time()
+    result, = run(JobQueue(root=str(tmpdir)), [job])
+    assert result.timed_out
+    assert time.time() - start < 5.
+    time.sleep(0.1)
+    with open(pid_file) as f:
+        assert not alive(int(f.read()))
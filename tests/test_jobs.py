@@ -0,0 +1,42 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import time
+
+import pytest
+
+from jobs import Job, JobRunner, prepare_workdir, rfac_job
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='requires a POSIX shell')
+def test_timeout_kills_grandchildren():
+    runner = JobRunner(workers=1)
+    start = time.time()
+    result = runner.execute(Job(['sh', '-c', 'sleep 5; echo late'], 
+                                timeout=0.5))
+    assert result.timed_out
+    assert not result.ok
+    assert time.time() - start < 3.
+
+
+def test_rfac_job_rewrites_experiment_paths(tmpdir):
+    class Environment(object):
+        rfac_exe = 'crfac'
+    
+    exp = tmpdir.mkdir('exp').join('beam10.dat')
+    exp.write('60. 1.\n')
+    ctr = tmpdir.mkdir('ctr').join('model.ctr')
+    ctr.write('ef=../exp/beam10.dat:ti=(1.00,0.00):id=1:wt=1.\n'
+              '#ef=/data/beam01.dat:ti=(0.00,1.00):id=2:wt=1.\n')
+    res = tmpdir.join('model.res')
+    res.write('')
+    
+    job = rfac_job(Environment(), str(ctr), str(res))
+    workdir = prepare_workdir(job, str(tmpdir.join('work')))
+    with open(os.path.join(workdir, 'model.ctr')) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 'ef={}:ti=(1.00,0.00):id=1:wt=1.'.format(exp)
+    assert lines[1].startswith('#ef=/data/beam01.dat:')
+    assert job.args[1:] == ['-c', 'model.ctr', '-t', 'model.res']
+    assert os.path.isfile(os.path.join(workdir, 'model.res'))
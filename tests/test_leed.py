@@ -0,0 +1,20 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import numpy as np
+
+from leed import BeamSet
+
+
+def test_matrix_follows_inplace_changes():
+    beams = BeamSet(beams='(1,0)+(0,1)')
+    for beam in beams.beams:
+        beam.data = ([60., 62., 64.], [1., 2., 3.])
+    energies, intensities = beams.matrix()
+    assert np.array_equal(intensities, [[1., 2., 3.], [1., 2., 3.]])
+    
+    beams.beams[0].y[:] *= 2.
+    beams.beams[0].modified()
+    beams.beams[1][1] = [5., 5., 5.]
+    energies, intensities = beams.matrix()
+    assert np.array_equal(intensities, [[2., 4., 6.], [5., 5., 5.]])
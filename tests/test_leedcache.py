@@ -0,0 +1,138 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+from leedcache import LEEDCache, canonical_lines, phase_tags
+from theory import BeamTable
+
+BULK = '''# bulk
+c: Ni(111)
+a1: 0.0 -1.2450 2.1564
+a2: 0.0  1.2450 2.1564
+a3: -2.0330 0.0 0.0
+m1: 2.0 0.0
+m2: 0.0 2.0
+pb: Ni_B 0.0 0.0 -2.0330 dr1 0.1
+ei: 50.0
+ef: 250.0
+'''
+
+OVERLAYER = '''po: O_H 0.0 0.0 1.2000 dr1 0.05
+po: Ni_S 0.0 0.0 0.0000 dr1 0.05
+'''
+
+
+def _write(tmpdir, name, text):
+    path = tmpdir.join(name)
+    path.write(text)
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmpdir):
+    phase_dir = tmpdir.mkdir('phase')
+    for tag in ('Ni_B', 'Ni_S', 'O_H'):
+        phase_dir.join(tag + '.phs').write(tag + ' phase shifts\n')
+    return LEEDCache(str(tmpdir.join('cache')), phase_dir=str(phase_dir))
+
+
+def _table(seed=0, n_energies=50):
+    energies = np.linspace(50., 250., n_energies)
+    rs = np.random.RandomState(seed)
+    return BeamTable(energies, rs.rand(2, n_energies), [(1., 0.), (0.5, 0.5)],
+                     header={'vr': '-13.0'})
+
+
+def test_canonical_lines():
+    lines = ['# comment\n', 'c: title\n', '\n', 'vr: -13.00  # potential\n',
+             'po: O_H 0.0 0.0 1.2 dr1 0.05\n', 'pb: Ni_B 0 -0.0 -2.033\n', 
+             'po: Ni_S 0.0 0.0 0.0\n']
+    assert canonical_lines(lines) == [
+                'vr: -13.000000',
+                'pb: Ni_B 0.000000 0.000000 -2.033000',
+                'po: Ni_S 0.000000 0.000000 0.000000',
+                'po: O_H 0.000000 0.000000 1.200000 dr1 0.050000']
+    assert phase_tags(lines) == ['Ni_B', 'Ni_S', 'O_H']
+
+
+def test_key_ignores_formatting_and_atom_order(cache, tmpdir):
+    bul = _write(tmpdir, 'model.bul', BULK)
+    inp = _write(tmpdir, 'a.inp', OVERLAYER)
+    same = _write(tmpdir, 'b.inp', '# reordered\n' + 
+                  '\n'.join(reversed(OVERLAYER.replace('1.2000', '1.2')
+                                     .splitlines())))
+    assert cache.key(inp, bul) == cache.key(same, bul)
+
+
+@pytest.mark.parametrize('old, new', [('1.2000', '1.2100'),  # coordinates
+                                      ('m1: 2.0', 'm1: 3.0'),  # superstructure
+                                      ('a3: -2.0330', 'a3: -2.0'),  # cell
+                                      ('pb: Ni_B', 'po: Ni_B')])  # bulk atom
+def test_key_changes_with_the_structure(cache, tmpdir, old, new):
+    bul = _write(tmpdir, 'model.bul', BULK)
+    inp = _write(tmpdir, 'model.inp', OVERLAYER)
+    key = cache.key(inp, bul)
+    bul2 = _write(tmpdir, 'other.bul', BULK.replace(old, new))
+    inp2 = _write(tmpdir, 'other.inp', OVERLAYER.replace(old, new))
+    assert cache.key(inp2, bul2) != key
+
+
+def test_key_changes_with_the_phase_shifts(cache, tmpdir):
+    bul = _write(tmpdir, 'model.bul', BULK)
+    inp = _write(tmpdir, 'model.inp', OVERLAYER)
+    key = cache.key(inp, bul)
+    tmpdir.join('phase', 'O_H.phs').write('other phase shifts\n')
+    assert cache.key(inp, bul) != key
+    tmpdir.join('phase', 'O_H.phs').remove()
+    with pytest.raises(IOError):
+        cache.key(inp, bul)
+
+
+def test_get_put_round_trip(cache, tmpdir):
+    key = cache.key(_write(tmpdir, 'model.inp', OVERLAYER), 
+                    _write(tmpdir, 'model.bul', BULK))
+    assert cache.get(key) is None
+    table = _table()
+    cache.put(key, table)
+    assert key in cache and len(cache) == 1
+    result = cache.get(key)
+    assert np.array_equal(result.energies, table.energies)
+    assert np.array_equal(result.intensities, table.intensities)
+    assert result.indices == table.indices
+    assert result.header == table.header
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used(cache):
+    cache.put('aa01', _table(1))
+    size = cache.size
+    cache.maxsize = 2 * size
+    cache.put('bb02', _table(2))
+    past = time.time() - 100.
+    os.utime(cache._path('aa01'), (past, past))
+    os.utime(cache._path('bb02'), (past + 1., past + 1.))
+    assert cache.get('aa01') is not None  # now the most recently used
+    cache.put('cc03', _table(3))
+    assert 'aa01' in cache and 'cc03' in cache and 'bb02' not in cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_shared_directory_is_bounded(cache):
+    other = LEEDCache(cache.directory, phase_dir=cache.phase_dir)
+    assert len(cache) == len(other) == 0
+    other.put('aa01', _table(1))
+    size = other.size
+    other.clear()
+    cache.maxsize = other.maxsize = int(2.5 * size)
+    for i in range(3):
+        cache.put('a{}'.format(i), _table(i))
+        other.put('b{}'.format(i), _table(i))
+    on_disk = LEEDCache(cache.directory)
+    assert len(on_disk) == 2
+    assert on_disk.size <= cache.maxsize
@@ -0,0 +1,274 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pytest
+
+from jobs import JobResult
+from optimise import (DifferentialEvolution, InputTemplate, LEEDObjective, 
+                      NelderMead, get_optimiser, minimise)
+from theory import BeamTable, write_res
+
+BOUNDS = [(-2., 2.), (-1., 3.), (0., 4.)]
+MINIMUM = np.array([0.5, 1., 2.5])
+METHODS = ['nelder-mead', 'de', 'pso']
+
+ENERGIES = np.arange(40., 200.1, 2.)
+INDICES = [(1., 0.), (1., 1.)]
+
+
+def quadratic(x):
+    return float(np.sum((np.asarray(x) - MINIMUM) ** 2))
+
+
+class Counter(object):
+    ''' Objective with a checkpointed state like LEEDObjective '''
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, x):
+        self.count += 1
+        return quadratic(x)
+    
+    def get_state(self):
+        return {'count': self.count}
+    
+    def set_state(self, state):
+        self.count = int(state['count'])
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_resume_matches_uninterrupted_run(tmpdir, method):
+    checkpoint = str(tmpdir.join('search.npz'))
+    cls = get_optimiser(method)
+    
+    expected = cls(quadratic, BOUNDS, seed=3)
+    expected.run(max_iter=8)
+    
+    cls(quadratic, BOUNDS, seed=3).run(max_iter=3, checkpoint=checkpoint)
+    resumed = cls(quadratic, BOUNDS, seed=99)
+    result = resumed.run(max_iter=8, checkpoint=checkpoint)
+    
+    assert resumed.nit == expected.nit == 8
+    assert np.array_equal(result.history, expected.history)
+    assert np.array_equal(resumed.points, expected.points)
+    assert np.array_equal(resumed.values, expected.values)
+    assert np.array_equal(result.x, expected.x_best)
+
+
+def test_resume_restores_objective_state(tmpdir):
+    checkpoint = str(tmpdir.join('search.npz'))
+    first = Counter()
+    optimiser = DifferentialEvolution(first, BOUNDS, seed=1)
+    optimiser.run(max_iter=2, checkpoint=checkpoint)
+    
+    second = Counter()
+    DifferentialEvolution(second, BOUNDS, seed=1).load_checkpoint(checkpoint)
+    assert second.count == first.count == optimiser.nfev
+
+
+@pytest.mark.parametrize('method, option', [('de', 'popsize'), 
+                                            ('pso', 'swarmsize')])
+def test_resume_rejects_other_population_size(tmpdir, method, option):
+    checkpoint = str(tmpdir.join('search.npz'))
+    cls = get_optimiser(method)
+    cls(quadratic, BOUNDS, seed=1, **{option: 5}).run(max_iter=1, 
+                                                    checkpoint=checkpoint)
+    with pytest.raises(ValueError, match='shape'):
+        cls(quadratic, BOUNDS, seed=1, **{option: 20}).run(
+                                            max_iter=2, checkpoint=checkpoint)
+
+
+def test_resume_rejects_other_method_or_bounds(tmpdir):
+    checkpoint = str(tmpdir.join('search.npz'))
+    get_optimiser('de')(quadratic, BOUNDS, seed=1).run(max_iter=1, 
+                                                       checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        get_optimiser('pso')(quadratic, BOUNDS).load_checkpoint(checkpoint)
+    with pytest.raises(ValueError):
+        get_optimiser('de')(quadratic, BOUNDS[:2]).load_checkpoint(checkpoint)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_converges_on_quadratic(method):
+    result = minimise(quadratic, BOUNDS, method=method, seed=0, max_iter=500,
+                      tol=1e-10)
+    assert result.converged
+    assert np.allclose(result.x, MINIMUM, atol=1e-3)
+    assert result.fun < 1e-6
+    assert len(result.history) == result.nit
+    assert np.all(np.diff(result.history) <= 0.)
+
+
+def test_minimum_on_the_bounds():
+    result = minimise(quadratic, [(-2., 0.), (-1., 3.), (0., 4.)], 
+                      method='nelder-mead', max_iter=500, tol=1e-10)
+    assert np.allclose(result.x, [0., 1., 2.5], atol=1e-3)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_workers_use_a_pool(method):
+    serial = get_optimiser(method)(quadratic, BOUNDS, seed=2)
+    serial.run(max_iter=5)
+    parallel = get_optimiser(method)(quadratic, BOUNDS, seed=2, workers=4)
+    parallel.run(max_iter=5)
+    assert np.array_equal(parallel.points, serial.points)
+    assert np.array_equal(parallel.values, serial.values)
+    assert parallel._pool is None  # its own pool is closed again
+
+
+def test_given_pool_is_used():
+    calls = []
+    class Pool(ThreadPool):
+        def map(self, func, iterable):
+            calls.append(len(iterable))
+            return ThreadPool.map(self, func, iterable)
+    pool = Pool(2)
+    try:
+        optimiser = NelderMead(quadratic, BOUNDS, pool=pool)
+        optimiser.run(max_iter=3)
+    finally:
+        pool.close()
+    assert sum(calls) == optimiser.nfev
+
+
+def test_batch_objective_is_evaluated_whole():
+    batches = []
+    class Batch(object):
+        def evaluate(self, points):
+            batches.append(len(points))
+            return [quadratic(x) if x[0] < 1.5 else np.nan for x in points]
+    optimiser = DifferentialEvolution(Batch(), BOUNDS, seed=1, workers=4)
+    optimiser.run(max_iter=2)
+    assert batches == [optimiser.popsize] * 3
+    assert np.all(optimiser.values[optimiser.points[:, 0] >= 1.5] == np.inf)
+
+
+def test_input_template(tmpdir):
+    filename = str(tmpdir.join('trial.inp'))
+    InputTemplate('po: O_H 0.0 0.0 {0:.4f}\nvi: {1:.1f}\n')([1.23456, 4], 
+                                                             filename)
+    with open(filename) as f:
+        assert f.read() == 'po: O_H 0.0 0.0 1.2346\nvi: 4.0\n'
+
+
+def _curve(energies, i):
+    return 1e-3 * (1.5 + np.sin(energies / 10. + i))
+
+
+class StubRunner(object):
+    '''
+    Runner writing the result file of each trial in-process: the last 
+    number of the parameter file shifts the intensities in energy.
+    '''
+    environment = type(str('Environment'), (object, ), {'leed_exe': 'cleed'})
+    output_dir = None
+    
+    def __init__(self, root, fail=()):
+        self.root = root
+        self.fail = fail
+        self.names = []
+    
+    def run(self, jobs):
+        for job in jobs:
+            self.names.append(job.name)
+            inp = [path for name, path in job.inputs.items() 
+                   if name.endswith('.inp')][0]
+            with open(inp) as f:
+                shift = float(f.read().split()[-1])
+            workdir = os.path.join(self.root, job.name)
+            os.makedirs(workdir)
+            if shift in self.fail:
+                yield JobResult(job, returncode=1, workdir=workdir)
+                continue
+            res_file = os.path.join(workdir, job.name + '.res')
+            write_res(BeamTable(ENERGIES, 
+                                [_curve(ENERGIES + shift, i) 
+                                 for i in range(len(INDICES))], INDICES), 
+                      res_file)
+            yield JobResult(job, returncode=0, workdir=workdir,
+                            files={job.name + '.res': res_file})
+
+
+class StubCache(object):
+    def __init__(self):
+        self.tables = {}
+    
+    def key(self, inp_file, bul_file):
+        with open(inp_file) as f:
+            return f.read()
+    
+    def get(self, key):
+        return self.tables.get(key)
+    
+    def put(self, key, table):
+        self.tables[key] = table
+
+
+@pytest.fixture
+def objective(tmpdir):
+    for i, index in enumerate(INDICES):
+        np.savetxt(str(tmpdir.join('beam{}.dat'.format(i))), 
+                   np.column_stack((ENERGIES, _curve(ENERGIES, i))))
+    ctr = tmpdir.join('model.ctr')
+    ctr.write(''.join('ef=beam{}.dat:ti=({:.2f},{:.2f}):id={}:wt=1.\n'
+                      ''.format(i, h, k, i + 1) 
+                      for i, (h, k) in enumerate(INDICES)))
+    bul = tmpdir.join('model.bul')
+    bul.write('a1: 1.0 0.0 0.0\n')
+    runner = StubRunner(str(tmpdir.mkdir('work')), fail=(7., ))
+    return LEEDObjective(InputTemplate('po: O_H 0.0 0.0 {0:.4f}\n'), 
+                         str(bul), str(ctr), runner, penalty=5.,
+                         scratch=str(tmpdir.join('scratch')))
+
+
+def test_leed_objective_scores_trials(objective):
+    values = objective.evaluate(np.array([[0.], [3.], [7.]]))
+    assert values[0] < 1e-9
+    assert 0. < values[1] < 1.
+    assert values[2] == 5.  # failed calculation
+    assert objective.runner.names == ['trial000001', 'trial000002', 
+                                      'trial000003']
+    # parameter files and working directories are removed
+    assert not os.listdir(objective.scratch)
+    assert not os.listdir(objective.runner.root)
+    assert objective(np.array([3.])) == values[1]
+
+
+def test_leed_objective_rejects_missing_beams(objective):
+    # the theory of the previous trial must not be used for missing beams
+    objective.evaluate(np.array([[0.]]))
+    table = BeamTable(ENERGIES, [_curve(ENERGIES, 0)], INDICES[:1])
+    with pytest.raises(ValueError):
+        objective.rfactor(table)
+
+
+def test_leed_objective_uses_cache(objective):
+    objective.cache = StubCache()
+    first = objective.evaluate(np.array([[0.], [3.]]))
+    second = objective.evaluate(np.array([[3.], [0.]]))
+    assert np.array_equal(second, first[::-1])
+    assert len(objective.runner.names) == 2
+    assert not os.listdir(objective.scratch)
+    
+    # a corrupt entry scores the penalty instead of aborting the batch
+    for key in objective.cache.tables:
+        objective.cache.tables[key] = BeamTable(ENERGIES + 1000., 
+                                                np.ones((2, len(ENERGIES))),
+                                                INDICES)
+    assert np.array_equal(objective.evaluate(np.array([[0.], [3.]])), 
+                          [5., 5.])
+
+
+def test_leed_objective_search_resumes_trial_count(objective, tmpdir):
+    checkpoint = str(tmpdir.join('search.npz'))
+    NelderMead(objective, [(-5., 5.)]).run(max_iter=2, checkpoint=checkpoint)
+    count = objective.count
+    objective.count = 0
+    NelderMead(objective, [(-5., 5.)]).run(max_iter=3, checkpoint=checkpoint)
+    names = objective.runner.names
+    assert len(set(names)) == len(names)
+    assert int(names[count][len('trial'):]) == count + 1
@@ -0,0 +1,192 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+pytest.importorskip('phaseshifts')
+
+from pattern import (SPOT_CACHE_SIZE, Domain, Pattern, fraction_labels, 
+                     generate_domains, is_fraction, lattice_points, 
+                     operation_matrices, reduce_fractions, spot_labels, 
+                     spots_to_array, unique_domains)
+
+HEXAGONAL = [[1., 0.], [0.5, np.sqrt(3.) / 2.]]
+
+
+def _positions_match_indices(domain, spots, r_max=10.):
+    a1, a2 = domain.reciprocal_vectors(r_max)
+    assert np.allclose(spots['x'], spots['h'] * a1[0] + spots['k'] * a2[0])
+    assert np.allclose(spots['y'], spots['h'] * a1[1] + spots['k'] * a2[1])
+
+
+def test_lattice_points_against_loops():
+    v1, v2, r_max = (1.3, 0.2), (-0.4, 0.9), 5.
+    expected = set()
+    for n1 in range(-20, 21):
+        for n2 in range(-20, 21):
+            x, y = n1*v1[0] + n2*v2[0], n1*v1[1] + n2*v2[1]
+            if x*x + y*y <= r_max*r_max:
+                expected.add((n1, n2))
+    n1, n2, x, y = lattice_points(v1, v2, r_max)
+    assert set(zip(n1.tolist(), n2.tolist())) == expected
+    assert len(n1) == len(expected)
+    with pytest.raises(ValueError):
+        lattice_points((1., 0.), (2., 0.), 1.)
+
+
+@pytest.mark.parametrize('matrix, n_spots', [
+    ([[1, 0], [0, 1]], 5),     # (1x1)
+    ([[2, 0], [0, 1]], 7),     # p(2x1)
+    ([[2, 0], [0, 2]], 13),    # p(2x2)
+    ([[1, 1], [-1, 1]], 9),    # c(2x2)
+    ([[3, 0], [0, 3]], 29)])   # p(3x3)
+def test_commensurate_spot_counts(matrix, n_spots):
+    domain = Domain(matrix)
+    spots = domain.spot_array()
+    assert len(spots) == n_spots
+    _positions_match_indices(domain, spots)
+    assert len(domain.calculate_spots()) == n_spots
+
+
+def test_substrate_spots():
+    spots = Pattern().spot_array()
+    assert sorted(zip(spots['h'], spots['k'])) == [(-1, 0), (0, -1), (0, 0),
+                                                   (0, 1), (1, 0)]
+
+
+@pytest.mark.parametrize('radius', [1., 2.])
+def test_incommensurate_spots_are_unique(radius):
+    domain = Domain([[1.1, 0.], [0., 1.]], radius=radius)
+    spots = domain.spot_array()
+    positions = np.round(np.column_stack((spots['x'], spots['y'])), 6)
+    assert len(np.unique(positions, axis=0)) == len(spots)
+    _positions_match_indices(domain, spots)
+    assert np.all(spots['x']**2 + spots['y']**2 <= 100. * (1. + 1e-9))
+    # e.g. the spots b1 = a1 / 1.1 and a1 - b1 about the origin
+    for h in (1. / 1.1, 1. - 1. / 1.1):
+        assert np.any(np.isclose(spots['h'], h) & (spots['k'] == 0))
+
+
+def test_spots_are_cached():
+    domain = Domain([[2., 0.], [0., 1.]])
+    spots = domain.spot_array()
+    assert domain.spot_array() is spots
+    assert not spots.flags.writeable
+    assert domain.calculate_spots() == domain.calculate_spots()
+    assert domain.spot_array(5.) is not spots
+    assert domain.spot_array() is spots
+    
+    for r_max in range(1, SPOT_CACHE_SIZE + 2):
+        domain.spot_array(float(r_max))
+    assert domain.spot_array() is not spots  # least recently used
+
+
+@pytest.mark.parametrize('attr, value', [
+    ('M', [[2., 0.], [0., 2.]]), ('basis', [[2., 0.], [0., 1.]]), 
+    ('radius', 2.)])
+def test_spot_cache_is_cleared_by_setters(attr, value):
+    domain = Domain([[2., 0.], [0., 1.]])
+    spots = domain.spot_array()
+    setattr(domain, attr, value)
+    new = domain.spot_array()
+    assert not np.array_equal(new, spots)
+    fresh = Domain([[2., 0.], [0., 1.]])
+    setattr(fresh, attr, value)
+    fresh.clear_spot_cache()
+    assert np.array_equal(new, fresh.spot_array())
+
+
+def test_spot_cache_sees_inplace_matrix_changes():
+    domain = Domain([[2., 0.], [0., 1.]])
+    assert len(domain.spot_array()) == 7
+    domain.M[1][1] = 2.
+    assert len(domain.spot_array()) == 13
+
+
+@pytest.mark.parametrize('basis', [np.identity(2), HEXAGONAL, 
+                                   [[1.3, 0.2], [-0.4, 0.9]]])
+def test_operation_matrices_transform_real_space_vectors(basis):
+    basis = np.asarray(basis)
+    ops = ['R60', 'R-90', 'Sx', 'Sy']
+    phi = np.radians([60., -90.])
+    expected = [np.array([[np.cos(a), -np.sin(a)], [np.sin(a), np.cos(a)]]).T 
+                for a in phi] + [np.diag([1., -1.]), np.diag([-1., 1.])]
+    for N, R in zip(operation_matrices(ops, basis), expected):
+        # rows of M.dot(N).dot(basis) are those of M.dot(basis) transformed
+        assert np.allclose(N.dot(basis), basis.dot(R))
+    with pytest.raises(ValueError):
+        operation_matrices(['Q90'], basis)
+
+
+@pytest.mark.parametrize('matrix, ops, basis, n_unique', [
+    ([[2, 0], [0, 1]], ['R90', 'R180', 'R270'], np.identity(2), 2), 
+    ([[2, 0], [0, 2]], ['R90', 'Sx'], np.identity(2), 1), 
+    ([[2, 0], [0, 1]], ['R60', 'R120'], HEXAGONAL, 3), 
+    ([[2, 1], [-1, 2]], ['Sx'], np.identity(2), 2)])  # (r5xr5)R26.6
+def test_generate_domains(matrix, ops, basis, n_unique):
+    domains = generate_domains(matrix, ops, basis, unique=False)
+    assert domains.shape == (len(ops) + 1, 2, 2)
+    assert np.array_equal(domains[0], matrix)
+    unique = generate_domains(matrix, ops, basis)
+    assert len(unique) == n_unique
+    assert np.array_equal(unique, domains[unique_domains(domains)])
+    
+    # equivalent matrices give identical spots
+    distinct = set()
+    for M in domains:
+        domain = Domain(M)
+        domain.basis = basis
+        spots = domain.spot_array()
+        distinct.add(frozenset(zip(np.round(spots['x'], 6).tolist(), 
+                                   np.round(spots['y'], 6).tolist())))
+    assert len(distinct) == n_unique
+
+
+def test_add_symmetry_domains():
+    pattern = Pattern()
+    added = pattern.add_symmetry_domains([[2, 0], [0, 1]], ['R90', 'R180'])
+    assert len(added) == 2 and pattern.domains == added
+    assert all(domain.pattern is pattern for domain in added)
+    assert np.allclose(np.abs(added[1].M), [[0, 2], [1, 0]])
+    pattern.add_symmetry_domains([[2, 0], [0, 1]], ['R90'], unique=False)
+    assert len(pattern.domains) == 4
+
+
+def test_reduce_fractions():
+    numerators, denominators = reduce_fractions([2, -4, 3, 0, 6], 
+                                                [4, 6, -9, 5, -3])
+    assert numerators.tolist() == [1, -2, -1, 0, -2]
+    assert denominators.tolist() == [2, 3, 3, 1, 1]
+
+
+@pytest.mark.parametrize('numerator, denominator, expected', [
+    (0, 3, -1), (4, 2, 0), (-6, 3, 0), (2, 4, 1), (1, -3, 1)])
+def test_is_fraction(numerator, denominator, expected):
+    assert is_fraction(numerator, denominator) == expected
+
+
+def test_fraction_labels():
+    values = np.array([[0., 1., -2. / 3.], [0.5, 1. / 12., 0.4999], 
+                       [2.5, np.sqrt(2.), -0.]])
+    assert fraction_labels(values).tolist() == [
+        ['0', '1', '-2/3'], ['1/2', '1/12', '1/2'], ['5/2', '1.414', '0']]
+    assert fraction_labels([1. / 7.], max_denominator=6).tolist() == ['0.143']
+    assert fraction_labels(np.empty(0)).shape == (0,)
+
+
+def test_spot_labels():
+    spots = spots_to_array([0., 1., 2.], [0., 1., 2.], 
+                           [0., 0.5, -1. / 3.], [1., -2., 2. / 3.])
+    assert spot_labels(spots).tolist() == ['0,1', '1/2,-2', '-1/3,2/3']
+    
+    domain = Domain([[3., 0.], [0., 3.]])
+    spots = domain.spot_array()
+    labels = spot_labels(spots).tolist()
+    assert len(set(labels)) == len(labels) == 29
+    assert labels == ['{},{}'.format(Fraction(h).limit_denominator(12), 
+                                     Fraction(k).limit_denominator(12)) 
+                      for h, k in zip(spots['h'].tolist(), 
+                                      spots['k'].tolist())]
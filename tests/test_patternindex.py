@@ -0,0 +1,34 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+pytest.importorskip('phaseshifts')
+
+from patternindex import SuperstructureIndex
+
+SQUARE = [[1., 0.], [0., 1.]]
+HEXAGONAL = [[1., 0.], [-0.5, np.sqrt(3) / 2.]]
+
+
+@pytest.mark.parametrize('basis', [SQUARE, HEXAGONAL])
+def test_fingerprints_are_distinct(basis):
+    index = SuperstructureIndex(basis, max_det=8)
+    fingerprints = np.round(index.fingerprints, 9)
+    assert len(np.unique(fingerprints, axis=0)) == len(index)
+
+
+@pytest.mark.parametrize('matrix', [[[2, 0], [0, 1]], [[1, 0], [0, 2]]])
+def test_query_ranks_own_pattern_first(matrix):
+    index = SuperstructureIndex(SQUARE, max_det=8)
+    pattern = index.pattern(matrix)
+    
+    distance, best = index.query(pattern, k=3)[0]
+    assert distance == 0.
+    assert np.array_equal(best, matrix)
+    
+    spots = np.concatenate(pattern.spot_arrays(1.))
+    xy = np.column_stack((spots['x'], spots['y']))
+    assert np.array_equal(index.query(xy, k=3)[0][1], matrix)
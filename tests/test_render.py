@@ -0,0 +1,81 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+
+import pytest
+
+pytest.importorskip('phaseshifts')
+pytest.importorskip('matplotlib')
+
+from render import find_patterns, main, output_filenames, render_files
+
+PATTERN = '''c: {title}
+1.0 0.0    # a1
+0.0 1.0    # a2
+2.5        # radius
+1          # number of domains
+2.0 0.0    # M1
+0.0 1.0    # M2
+'''
+
+
+def _write(path, title='test'):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(PATTERN.format(title=title))
+    return path
+
+
+def test_output_filenames_are_unique():
+    paths = [os.path.join('a', 'x.patt'), os.path.join('b', 'x.patt'), 
+             os.path.join('c', 'y.patt'), os.path.join('a', 'x.patt')]
+    assert output_filenames(paths, 'out', 'svg') == [
+        os.path.join('out', 'x.svg'), os.path.join('out', 'x-2.svg'), 
+        os.path.join('out', 'y.svg'), os.path.join('out', 'x-3.svg')]
+    assert output_filenames(paths[:3]) == [
+        os.path.join('a', 'x.png'), os.path.join('b', 'x.png'), 
+        os.path.join('c', 'y.png')]
+
+
+def test_find_patterns(tmpdir):
+    a = _write(str(tmpdir.join('p', 'a.patt')))
+    b = _write(str(tmpdir.join('p', 'b.patt')))
+    tmpdir.join('p', 'notes.txt').write('')
+    assert find_patterns([str(tmpdir.join('p')), a]) == [a, b]
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_render_files(tmpdir, processes):
+    a = _write(str(tmpdir.join('one', 'x.patt')), 'one')
+    b = _write(str(tmpdir.join('two', 'x.patt')), 'two')
+    bad = str(tmpdir.join('missing.patt'))
+    out = str(tmpdir.join('out'))
+    os.makedirs(out)
+    calls = []
+    results = render_files([a, bad, b, a], out, 'svg', processes, 
+                           lambda *args: calls.append(args), r_max=3.)
+    
+    assert [(path, os.path.basename(filename)) 
+            for path, filename, error in results] == [
+        (a, 'x.svg'), (bad, 'missing.svg'), (b, 'x-2.svg'), (a, 'x-3.svg')]
+    assert [error is None for path, filename, error in results] == [
+        True, False, True, True]
+    assert 'missing.patt' in results[1][2]
+    assert sorted(os.listdir(out)) == ['x-2.svg', 'x-3.svg', 'x.svg']
+    with open(os.path.join(out, 'x-2.svg')) as f:
+        assert 'two' in f.read()
+    
+    assert [call[:2] for call in calls] == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert sorted(call[3] for call in calls) == sorted(
+        filename for path, filename, error in results)
+
+
+def test_main(tmpdir, capsys):
+    _write(str(tmpdir.join('p', 'a.patt')))
+    out = str(tmpdir.join('images'))
+    assert main([str(tmpdir.join('p')), '-o', out, '-j', '1', '-q']) == 0
+    assert os.listdir(out) == ['a.png']
+    assert main([str(tmpdir.join('nothing.patt')), '-o', out, '-j', '1']) == 1
+    assert 'nothing.patt' in capsys.readouterr().err
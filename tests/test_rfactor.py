@@ -0,0 +1,112 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import numpy as np
+import pytest
+
+import rfactor
+from theory import BeamTable, write_res
+
+ENERGIES = np.arange(50., 150.1, 0.5)
+
+
+def _pendry_reference(ie, it, e_step, vi):
+    # explicit loops in the manner of crfac's rf_rp()
+    def y(i):
+        d = np.gradient(i, e_step)
+        return [(i[k] * d[k] / (i[k]**2 + vi**2 * d[k]**2)) 
+                for k in range(len(i))]
+    ye, yt = y(ie), y(it)
+    num = den = 0.
+    for a, b in zip(ye, yt):
+        num += (a - b)**2
+        den += a * a + b * b
+    return num / den
+
+
+def test_known_values():
+    ie, it = [1., 2., 3.], [3., 2., 1.]
+    assert np.isclose(rfactor.r1(ie, it), 2. / 3.)
+    assert np.isclose(rfactor.r2(ie, it), 4. / 7.)
+
+
+def test_pendry_of_exponentials():
+    # L = I'/I is constant for exponentials, so Y and R_P are analytic
+    vi, a, b = 4., 0.05, -0.02
+    ie, it = np.exp(a * ENERGIES), np.exp(b * ENERGIES)
+    ye, yt = a / (1. + (vi * a)**2), b / (1. + (vi * b)**2)
+    assert np.isclose(rfactor.pendry_y(ie, a * ie, vi), ye).all()
+    assert np.isclose(rfactor.rp(ie, it, vi=vi, die=a * ie, dit=b * it), 
+                      (ye - yt)**2 / (ye**2 + yt**2))
+
+
+@pytest.mark.parametrize('method', ['rp', 'r1', 'r2', 'rb'])
+def test_identical_and_scaled_curves(method):
+    ie = 1.5 + np.sin(ENERGIES / 7.)
+    func = rfactor.get_rfactor(method)
+    assert func(ie, ie, e_step=0.5) < 1e-12
+    assert func(ie, 3. * ie, e_step=0.5) < 1e-12
+
+
+def test_pendry_against_reference():
+    ie = 1.5 + np.sin(ENERGIES / 7.)
+    it = 1.5 + np.sin(ENERGIES / 7. + 0.3)
+    expected = _pendry_reference(ie, it, 0.5, 4.)
+    assert np.isclose(rfactor.compare(ENERGIES, ie, it, 'rp', vi=4.), 
+                      expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('method', ['rp', 'r1', 'r2', 'rb'])
+def test_stacks_and_masks(method):
+    ie = 1.5 + np.sin(ENERGIES / 7.)
+    shifts = np.array([0., 0.2, 0.5, 1.])
+    it = 1.5 + np.sin(ENERGIES / 7. + shifts[:, np.newaxis])
+    func = rfactor.get_rfactor(method)
+    stacked = func(ie, it, e_step=0.5)
+    assert stacked.shape == (len(shifts), )
+    assert np.allclose(stacked, [func(ie, row, e_step=0.5) for row in it])
+    assert np.all(np.diff(stacked) > 0.)
+    
+    # masked points do not contribute (the derivatives are taken from the 
+    # whole curves, as those of a spline would be)
+    mask = ENERGIES < 100.
+    noisy = np.where(mask, it[1], 10.)
+    die, dit = np.gradient(ie, 0.5), np.gradient(it[1], 0.5)
+    if method != 'rb':  # second derivatives reach across the mask edge
+        assert np.isclose(func(ie, noisy, e_step=0.5, mask=mask, 
+                               die=die, dit=dit), 
+                          func(ie[mask], it[1][mask], e_step=0.5, 
+                               die=die[mask], dit=dit[mask]))
+
+
+def test_average_weights_by_energy_range():
+    assert np.isclose(rfactor.average([0.2, 0.4], [1., 1.], [100., 300.]),
+                      0.35)
+    assert rfactor.average([0.2], [0.], [100.]) == 0.
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        rfactor.get_rfactor('rx')
+    with pytest.raises(ValueError):
+        rfactor.compare([50.], [1.], [1.])
+
+
+def test_main(tmpdir, capsys):
+    indices = [(1., 0.), (0., 1.)]
+    for i in range(len(indices)):
+        np.savetxt(str(tmpdir.join('beam{}.dat'.format(i))), 
+                   np.column_stack((ENERGIES, 
+                                    1.5 + np.sin(ENERGIES / 7. + i))))
+    ctr = tmpdir.join('model.ctr')
+    ctr.write(''.join('ef=beam{}.dat:ti=({:.2f},{:.2f}):id={}:wt=1.\n'
+                      ''.format(i, h, k, i + 1) 
+                      for i, (h, k) in enumerate(indices)))
+    res = str(tmpdir.join('model.res'))
+    write_res(BeamTable(ENERGIES, [1.5 + np.sin(ENERGIES / 7. + i) 
+                                   for i in range(len(indices))], indices), 
+              res)
+    assert rfactor.main(['-c', str(ctr), '-t', res, '-r', 'r2']) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3
+    assert lines[-1].split() == ['total', '0.0000']
@@ -0,0 +1,95 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+
+import numpy as np
+import pytest
+
+from searchlog import SearchTail, parse_vertex
+
+VERTICES = '2 3\n0.40 1.0 2.0\n0.30 1.1 2.1\n0.35 1.2 2.2\n'
+
+
+def log_line(rfactor, *parameters):
+    return 'rfac = {} par: {}\n'.format(rfactor, 
+                                        ' '.join(str(p) for p in parameters))
+
+
+# cut short at the end, within a number and at a line boundary
+@pytest.mark.parametrize('text', [VERTICES[:-1], VERTICES[:-6], 
+                                  VERTICES[:-13]])
+def test_half_written_vertex_file_is_retried(tmpdir, text):
+    path = tmpdir.join('model.ver')
+    path.write(VERTICES)
+    tail = SearchTail(str(path))
+    assert tail.update() == 3
+    
+    path.write(text)
+    assert tail.update() == 0
+    assert np.array_equal(tail.rfactors, [0.40, 0.30, 0.35])
+    
+    path.write(VERTICES.replace('0.40', '0.20'))
+    assert tail.update() == 3
+    assert np.array_equal(tail.rfactors, [0.20, 0.30, 0.35])
+    assert tail.best[0] == 0.20
+
+
+def test_vertex_count_must_match_header():
+    with pytest.raises(ValueError):
+        parse_vertex(VERTICES.splitlines()[:-1])
+
+
+def test_log_is_read_incrementally(tmpdir):
+    path = tmpdir.join('model.log')
+    tail = SearchTail(str(path))
+    assert tail.update() == 0
+    
+    path.write(log_line(0.5, 1.0, 2.0) + 'rfac = 0.4 par: 1.1')
+    assert tail.update() == 1
+    offset = tail.offset
+    
+    with open(str(path), 'a') as f:
+        f.write(' 2.1\n' + log_line(0.3, 1.2, 2.2))
+    assert tail.update() == 2
+    assert tail.offset > offset
+    assert np.array_equal(tail.rfactors, [0.5, 0.4, 0.3])
+    assert np.array_equal(tail.parameters, [[1.0, 2.0], [1.1, 2.1], 
+                                            [1.2, 2.2]])
+    assert tail.update() == 0
+
+
+def test_truncated_log_is_read_again(tmpdir):
+    path = tmpdir.join('model.log')
+    path.write(log_line(0.5, 1.0) + log_line(0.4, 1.1))
+    tail = SearchTail(str(path))
+    assert tail.update() == 2
+    
+    path.write(log_line(0.6, 0.9))
+    assert tail.update() == 1
+    assert np.array_equal(tail.rfactors, [0.6])
+
+
+def test_replaced_log_is_read_again(tmpdir):
+    first = log_line(0.5, *range(20))
+    path = tmpdir.join('model.log')
+    path.write(first + log_line(0.4, 1.0))
+    tail = SearchTail(str(path))
+    assert tail.update() == 2
+    
+    # same size and head, but a new file
+    tmp = tmpdir.join('model.tmp')
+    tmp.write(first + log_line(0.2, 1.5))
+    os.rename(str(tmp), str(path))
+    assert tail.update() == 2
+    assert np.array_equal(tail.rfactors, [0.5, 0.2])
+
+
+def test_removed_log_resets(tmpdir):
+    path = tmpdir.join('model.log')
+    path.write(log_line(0.5, 1.0))
+    tail = SearchTail(str(path))
+    assert tail.update() == 1
+    path.remove()
+    assert tail.update() == 0
+    assert len(tail) == 0 and tail.offset == 0
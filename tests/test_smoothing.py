@@ -0,0 +1,79 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+from math import sqrt
+
+import numpy as np
+
+from smoothing import LORENTZ_CUTOFF, lorentz, lorentz_kernel
+
+# smoothed intensities must agree with crfac to this relative tolerance
+RTOL = 1e-9
+
+
+def crfac_lorentz(y, e_step, vi):
+    '''port of the smoothing loop of crfac's rf_lorentz()'''
+    n_range = max(int(vi * sqrt(1. / LORENTZ_CUTOFF - 1.) / e_step), 1)
+    prefac = [e_step * vi / ((e_step * i)**2 + vi * vi) 
+              for i in range(n_range)]
+    n = len(y)
+    result = []
+    for i in range(n):
+        l_int = norm = 0.
+        j, k = i, 0
+        while j >= 0 and k < n_range:
+            l_int += y[j] * prefac[k]
+            norm += prefac[k]
+            j, k = j - 1, k + 1
+        j, k = i + 1, 1
+        while j < n and k < n_range:
+            l_int += y[j] * prefac[k]
+            norm += prefac[k]
+            j, k = j + 1, k + 1
+        result.append(l_int / norm)
+    return np.array(result)
+
+
+def _curve(n, seed=0):
+    rs = np.random.RandomState(seed)
+    energies = np.arange(n) * 0.5
+    return (np.exp(-((energies - 40.) / 5.)**2) + 
+            0.5 * np.exp(-((energies - 90.) / 8.)**2) + 
+            0.05 * rs.rand(n))
+
+
+def test_kernel():
+    prefac = lorentz_kernel(4., 0.5)
+    assert np.isclose(prefac[0], 0.5 * 4. / 16.)
+    assert np.isclose(prefac[-1] / prefac[0], LORENTZ_CUTOFF, rtol=0.05)
+
+
+def test_direct_matches_crfac():
+    y = _curve(300)
+    expected = crfac_lorentz(y, 0.5, 4.)
+    assert np.allclose(lorentz(y, 0.5, 4., fft=False), expected, 
+                       rtol=RTOL, atol=0.)
+
+
+def test_fft_matches_crfac():
+    y = _curve(300)
+    expected = crfac_lorentz(y, 0.5, 4.)
+    assert np.allclose(lorentz(y, 0.5, 4., fft=True), expected, 
+                       rtol=RTOL, atol=0.)
+
+
+def test_masked_stack_matches_crfac():
+    lengths = (300, 220, 97)
+    curves = [_curve(n, seed) for seed, n in enumerate(lengths)]
+    stack = np.zeros((len(curves), max(lengths)))
+    mask = np.zeros(stack.shape, dtype=bool)
+    for row, y in enumerate(curves):
+        stack[row, :len(y)] = y
+        mask[row, :len(y)] = True
+    
+    for fft in (False, True):
+        result = lorentz(stack, 0.5, 4., mask=mask, fft=fft)
+        for row, y in enumerate(curves):
+            assert np.allclose(result[row, :len(y)], 
+                               crfac_lorentz(y, 0.5, 4.), rtol=RTOL, atol=0.)
+            assert not result[row, len(y):].any()
@@ -0,0 +1,83 @@
+from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, division, with_statement
+
+import os
+
+import numpy as np
+
+from theory import BeamTable, TheoryCache, beam_key, read_res, write_res
+
+
+def _table():
+    energies = np.arange(50., 80.1, 2.)
+    indices = [(0., 1.), (1./3., 1./3.), (-2./3., 1./3.), (0.5, -1.5)]
+    intensities = np.random.RandomState(1).rand(len(indices), len(energies))
+    return BeamTable(energies, intensities * 1e-3, indices, sets=[0, 1, 1, 2],
+                     header={'vr': '-13.0', 'vi': '4.0'})
+
+
+def _assert_equal(table, expected):
+    assert np.allclose(table.energies, expected.energies)
+    assert np.allclose(table.intensities, expected.intensities, rtol=1e-6)
+    assert table.indices == expected.indices
+    assert list(table.sets) == list(expected.sets)
+    assert table.header['vr'] == expected.header['vr']
+
+
+def test_round_trip(tmpdir):
+    table = _table()
+    filename = str(tmpdir.join('model.res'))
+    write_res(table, filename)
+    result = read_res(filename)
+    _assert_equal(result, table)
+    
+    # indices written with six decimals find the same beams
+    assert (1./3., 1./3.) in result
+    assert result.row((0.333333, 0.333333)) == 1
+    assert beam_key((-0.6666667, 0.3333333)) == result.indices[2]
+    assert np.array_equal(result[(0.5, -1.5)][1], result.intensities[3])
+
+
+def test_round_trip_with_comments_in_block(tmpdir, monkeypatch):
+    calls = []
+    loadtxt = np.loadtxt
+    def counting_loadtxt(*args, **kwargs):
+        calls.append(args)
+        return loadtxt(*args, **kwargs)
+    monkeypatch.setattr(np, 'loadtxt', counting_loadtxt)
+    
+    table = _table()
+    filename = str(tmpdir.join('model.res'))
+    write_res(table, filename)
+    with open(filename) as f:
+        lines = f.readlines()
+    first = next(i for i, line in enumerate(lines) if not line.startswith('#'))
+    lines.insert(first + 3, '# interrupted block\n')
+    with open(filename, 'w') as f:
+        f.writelines(lines)
+    
+    _assert_equal(read_res(filename), table)
+    assert calls  # the np.fromfile fast path must have been abandoned
+
+
+def test_cache_reads_rewritten_file_of_same_size_and_mtime(tmpdir):
+    cache = TheoryCache()
+    filename = str(tmpdir.join('model.res'))
+    table = _table()
+    write_res(table, filename)
+    stat = os.stat(filename)
+    assert np.allclose(cache.load(filename).intensities, table.intensities,
+                       rtol=1e-6)
+    
+    # CLEED writing the next iteration within the mtime resolution
+    other = _table()
+    other.intensities[:] = other.intensities[::-1]
+    tmp = str(tmpdir.join('model.tmp'))
+    write_res(other, tmp)
+    assert os.path.getsize(tmp) == stat.st_size
+    os.rename(tmp, filename)
+    os.utime(filename, (stat.st_atime, stat.st_mtime))
+    
+    assert np.allclose(cache.load(filename).intensities, other.intensities,
+                       rtol=1e-6)
+    assert cache.load(filename) is cache.load(filename)